@@ -19,12 +19,115 @@ class Settings:
     # Model
     MODEL_NAME = "fraud_detection_model"
     MODEL_PATH = MODEL_DIR / f"{MODEL_NAME}.pkl"
+    PCA_DETECTOR_PATH = MODEL_DIR / "pca_fraud_detector.joblib"
+    # TensorFlow-free exports of the two artifacts above, published for serving
+    MODEL_SERVING_PATH = MODEL_DIR / f"{MODEL_NAME}.serving.pkl"
+    PCA_DETECTOR_SERVING_PATH = MODEL_DIR / "pca_fraud_detector.serving.joblib"
+    # Scaler and PCA used by TransactionFeatureEngineer (see scripts/create_transformers.py)
+    SCALER_PATH = MODEL_DIR / "scaler.joblib"
+    PCA_PATH = MODEL_DIR / "pca.joblib"
     THRESHOLD = 0.5
     
+    # Ensemble training: members train in TRAINING_WORKERS spawned processes (0 means one per
+    # CPU up to one per member, 1 trains in-process) sharing TRAINING_CPUS cores (0 means all).
+    # Finished members are kept under TRAINING_CHECKPOINT_DIR so a rerun on the same data skips them
+    TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", 0))
+    TRAINING_CPUS = int(os.getenv("TRAINING_CPUS", 0))
+    TRAINING_CHECKPOINT_DIR = MODEL_DIR / "checkpoints"
+    
+    # High-cardinality identifiers a newly fitted PCA transformer hashes into HASH_BUCKETS
+    # indicator columns each. Off by default, since the training data must then have these
+    # columns; enable per deployment, e.g.
+    # HASHED_FEATURES=merchant_id,device_fingerprint,ip_asn,card_issuer,user_email_domain
+    HASHED_FEATURES = [col for col in os.getenv("HASHED_FEATURES", "").split(",") if col]
+    HASH_BUCKETS = int(os.getenv("HASH_BUCKETS", 128))
+    
+    # Rows per chunk when fitting the PCA transformer out of core
+    PCA_FIT_CHUNKSIZE = int(os.getenv("PCA_FIT_CHUNKSIZE", 100_000))
+    
+    # Versioned artifacts; MODEL_PATH/PCA_DETECTOR_PATH serve until a version is published
+    MODEL_REGISTRY_DIR = MODEL_DIR / "registry"
+    MODEL_RELOAD_INTERVAL_S = float(os.getenv("MODEL_RELOAD_INTERVAL_S", 30))
+    # Token required in X-Admin-Token by operator endpoints such as model reloads;
+    # those endpoints are disabled while it is unset
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+    
     # API
     API_PREFIX = "/api"
     HOST = os.getenv("HOST", "0.0.0.0")
     PORT = int(os.getenv("PORT", 8000))
+    MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 10000))
+    WORKERS = int(os.getenv("WORKERS", 2))
+    MEMORY_REPORT_INTERVAL_S = float(os.getenv("MEMORY_REPORT_INTERVAL_S", 60))
+    # scripts/serve_model.py restarts a crashed worker after WORKER_RESTART_BACKOFF_S, doubling per
+    # consecutive crash up to WORKER_RESTART_MAX_BACKOFF_S. A worker that exits within WORKER_STABLE_S
+    # of starting WORKER_MAX_CRASHES times in a row stops the server
+    WORKER_RESTART_BACKOFF_S = float(os.getenv("WORKER_RESTART_BACKOFF_S", 0.5))
+    WORKER_RESTART_MAX_BACKOFF_S = float(os.getenv("WORKER_RESTART_MAX_BACKOFF_S", 30))
+    WORKER_STABLE_S = float(os.getenv("WORKER_STABLE_S", 60))
+    WORKER_MAX_CRASHES = int(os.getenv("WORKER_MAX_CRASHES", 5))
+    
+    # Micro-batching of concurrent single-row requests
+    ENABLE_MICRO_BATCHING = os.getenv("ENABLE_MICRO_BATCHING", "true").lower() == "true"
+    BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 2.0))
+    BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 64))
+    
+    # Inference executor ("thread" or "process"); 0 workers means one per CPU
+    INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")
+    INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 0))
+    INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", 256))
+    DISCONNECT_POLL_MS = float(os.getenv("DISCONNECT_POLL_MS", 50))
+    
+    # NDJSON streaming
+    STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 1024))
+    STREAM_MAX_PENDING_CHUNKS = int(os.getenv("STREAM_MAX_PENDING_CHUNKS", 4))
+    STREAM_MAX_LINE_BYTES = int(os.getenv("STREAM_MAX_LINE_BYTES", 65536))
+    STREAM_RETRY_MS = float(os.getenv("STREAM_RETRY_MS", 5))
+    
+    # Synthetic warm-up passes per model at startup; 0 disables warm-up
+    WARMUP_ROUNDS = int(os.getenv("WARMUP_ROUNDS", 2))
+    
+    # Idempotent scoring cache for retried transactions
+    ENABLE_SCORE_CACHE = os.getenv("ENABLE_SCORE_CACHE", "true").lower() == "true"
+    SCORE_CACHE_TTL_S = float(os.getenv("SCORE_CACHE_TTL_S", 300))
+    SCORE_CACHE_MAX_BYTES = int(os.getenv("SCORE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    
+    # Background self-test behind /readyz
+    SELF_TEST_INTERVAL_S = float(os.getenv("SELF_TEST_INTERVAL_S", 30))
+    SELF_TEST_TIMEOUT_S = float(os.getenv("SELF_TEST_TIMEOUT_S", 5))
+    
+    # WebSocket scoring channel
+    WS_MAX_INFLIGHT = int(os.getenv("WS_MAX_INFLIGHT", 256))
+    
+    # Serve RF/XGBoost/LightGBM members from compiled node tables ("numpy" or "numba")
+    COMPILE_TREE_MEMBERS = os.getenv("COMPILE_TREE_MEMBERS", "true").lower() == "true"
+    TREE_ENGINE = os.getenv("TREE_ENGINE", "numpy")
+    # Serve the raw-transaction PCA pipeline as one precomputed float32 affine map
+    COMPILE_PCA_TRANSFORM = os.getenv("COMPILE_PCA_TRANSFORM", "true").lower() == "true"
+    # Serve Keras MLP members of artifacts that were not exported with a NumPy forward pass
+    COMPILE_MLP_MEMBERS = os.getenv("COMPILE_MLP_MEMBERS", "true").lower() == "true"
+    
+    # Evaluate ensemble members concurrently on MEMBER_POOL_SIZE dedicated threads for
+    # batches of at least PARALLEL_MEMBERS_MIN_ROWS rows. MEMBER_THREADS ("rf:1,xgb:2")
+    # caps each member's own threads; with PARALLEL_MEMBERS, unlisted members share the CPUs
+    PARALLEL_MEMBERS = os.getenv("PARALLEL_MEMBERS", "false").lower() == "true"
+    PARALLEL_MEMBERS_MIN_ROWS = int(os.getenv("PARALLEL_MEMBERS_MIN_ROWS", 256))
+    MEMBER_POOL_SIZE = int(os.getenv("MEMBER_POOL_SIZE", 4))
+    MEMBER_THREADS = {
+        name: int(threads) for name, _, threads in
+        (item.partition(":") for item in os.getenv("MEMBER_THREADS", "").split(",") if item)
+    }
+    
+    # Cascaded early-exit scoring: cheapest member first; later members only see rows
+    # whose running score is within CASCADE_BAND of THRESHOLD
+    ENABLE_CASCADE = os.getenv("ENABLE_CASCADE", "false").lower() == "true"
+    CASCADE_ORDER = os.getenv("CASCADE_ORDER", "xgb,lgb,rf,mlp").split(",")
+    CASCADE_BAND = float(os.getenv("CASCADE_BAND", 0.3))
+    
+    # Deadline-aware admission control; 0 disables deadlines unless a request sends one
+    REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", 1000))
+    ENABLE_DEGRADED_SCORING = os.getenv("ENABLE_DEGRADED_SCORING", "true").lower() == "true"
+    DEGRADED_MEMBERS = os.getenv("DEGRADED_MEMBERS", "lgb").split(",")
     
     # Monitoring
     MONITORING_WINDOW_SIZE = 1000
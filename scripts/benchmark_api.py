@@ -0,0 +1,342 @@
+# scripts/benchmark_api.py
+#
+# Load test /api/predict and /api/predict_raw with payloads built from
+# generate_sample_data, report throughput and latency percentiles, and save
+# the run as JSON so later runs can be compared against it.
+#
+# By default the app is driven in-process over ASGI (no network, same event
+# loop); pass --url to benchmark a running server such as scripts/serve_model.py.
+#
+# Usage: python scripts/benchmark_api.py [--url http://127.0.0.1:8000] [--endpoints predict predict_raw]
+#            [--requests 2000] [--concurrency 16] [--rate 200] [--output run.json] [--baseline previous.json]
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, get_args
+import numpy as np
+import pandas as pd
+sys.path.append(str(Path(__file__).parent.parent))  # Add project root to path
+
+from config.settings import settings
+from scripts.create_sample_data import generate_sample_data
+
+logging.basicConfig(level=logging.INFO)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = {
+    "predict": "/api/predict",
+    "predict_raw": "/api/predict_raw",
+}
+
+PERCENTILES = (50, 95, 99, 99.9)
+
+# Latency regressions smaller than this fraction are treated as noise
+DEFAULT_TOLERANCE = 0.10
+
+
+def _jsonable(value):
+    """Plain Python value for a pandas/numpy cell, with NaN as None"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def raw_payloads(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """/api/predict_raw bodies: the sample columns the request model accepts"""
+    from src.api.endpoints.predict import RawTransaction
+    fields = {name: field for name, field in RawTransaction.__fields__.items() if name in df.columns}
+    # Some generated columns are fractional where the request model wants an int
+    int_fields = {name for name, field in fields.items() if int in (field.annotation, *get_args(field.annotation))}
+    payloads = []
+    for row in df[list(fields)].itertuples(index=False, name=None):
+        payload = {name: _jsonable(value) for name, value in zip(fields, row)}
+        for name in int_fields:
+            if isinstance(payload[name], float):
+                payload[name] = round(payload[name])
+        payloads.append(payload)
+    return payloads
+
+
+def pca_payloads(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """/api/predict bodies: the samples projected to V1-V28 by the served PCA transformer.
+
+    Time is seconds since the earliest sample, as in creditcard.csv. If the
+    detector artifact cannot be loaded, V1-V28 fall back to standard normal
+    draws so the benchmark still runs.
+    """
+    timestamps = pd.to_datetime(df["timestamp"])
+    seconds = (timestamps - timestamps.min()).dt.total_seconds().to_numpy()
+    try:
+        from src.models.pca_fraud_detector import PCAFraudDetector
+        components = PCAFraudDetector.load().pca_transformer.transform(df).to_numpy()
+    except Exception as e:
+        logger.warning(f"Using random V1-V28, the PCA transformer is unavailable: {str(e)}")
+        components = np.random.default_rng(42).standard_normal((len(df), 28))
+
+    payloads = []
+    for t, amount, row in zip(seconds, df["amount"].to_numpy(), components):
+        payload = {"Time": float(t)}
+        payload.update({f"V{i}": float(v) for i, v in enumerate(row, start=1)})
+        payload["Amount"] = float(amount)
+        payloads.append(payload)
+    return payloads
+
+
+def build_payloads(endpoint: str, num_samples: int) -> List[Dict[str, Any]]:
+    df = generate_sample_data(num_samples=num_samples)
+    return raw_payloads(df) if endpoint == "predict_raw" else pca_payloads(df)
+
+
+def percentile_summary(latencies_ms: List[float]) -> Dict[str, float]:
+    if not latencies_ms:
+        return {}
+    values = np.asarray(latencies_ms)
+    summary = {"mean": float(values.mean()), "min": float(values.min()), "max": float(values.max())}
+    for p in PERCENTILES:
+        summary[f"p{p:g}"] = float(np.percentile(values, p))
+    return {name: round(value, 3) for name, value in summary.items()}
+
+
+async def run_load(client, path: str, payloads: List[Dict[str, Any]], num_requests: int,
+                   concurrency: int, rate: Optional[float], unique_ids: bool = True) -> Dict[str, Any]:
+    """Send ``num_requests`` POSTs and record the latency of each.
+
+    Without ``rate`` this is a closed loop: ``concurrency`` clients each send
+    their next request as soon as the previous one returns. With ``rate`` it
+    is an open loop with Poisson arrivals at ``rate`` requests/s and at most
+    ``concurrency`` outstanding; latency is then measured from each
+    request's scheduled arrival, so queueing behind a slow server is counted
+    instead of hidden (coordinated omission).
+    """
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors: Dict[str, int] = {}
+
+    def body(i: int) -> Dict[str, Any]:
+        payload = payloads[i % len(payloads)]
+        if unique_ids and "transaction_id" in payload:
+            # Fresh ids keep repeats from being answered by the score cache
+            payload = dict(payload, transaction_id=f"{payload['transaction_id']}-{i}")
+        return payload
+
+    async def send(i: int, scheduled: float) -> None:
+        try:
+            response = await client.post(path, json=body(i))
+            if response.status_code == 200:
+                latencies.append((time.perf_counter() - scheduled) * 1000.0)
+            key = str(response.status_code)
+            statuses[key] = statuses.get(key, 0) + 1
+        except Exception as e:
+            name = type(e).__name__
+            errors[name] = errors.get(name, 0) + 1
+
+    start = time.perf_counter()
+    if rate:
+        semaphore = asyncio.Semaphore(concurrency)
+        rng = random.Random(42)
+        tasks = []
+        arrival = start
+
+        async def bounded(i: int, scheduled: float) -> None:
+            async with semaphore:
+                await send(i, scheduled)
+
+        for i in range(num_requests):
+            arrival += rng.expovariate(rate)
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(bounded(i, arrival)))
+        await asyncio.gather(*tasks)
+    else:
+        counter = iter(range(num_requests))
+
+        async def client_loop() -> None:
+            for i in counter:
+                await send(i, time.perf_counter())
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ok = statuses.get("200", 0)
+    return {
+        "requests": num_requests,
+        "ok": ok,
+        "statuses": statuses,
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 1) if elapsed else 0.0,
+        # Successful responses only; failures are counted in statuses/errors
+        "latency_ms": percentile_summary(latencies),
+    }
+
+
+@asynccontextmanager
+async def open_client(url: Optional[str], timeout_s: float):
+    """HTTP client for a running server, or for the app in this process"""
+    import httpx
+    timeout = httpx.Timeout(timeout_s)
+    if url:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+            yield client
+        return
+
+    from src.api.app import app
+    # ASGITransport does not send lifespan events, so run startup here
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=timeout) as client:
+            yield client
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=settings.BASE_DIR, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[Dict[str, Any]]:
+    """Relative change of each endpoint's throughput and percentiles against ``baseline``.
+
+    A change counts as a regression when throughput drops, or a latency
+    percentile rises, by more than ``tolerance``.
+    """
+    rows = []
+    for endpoint, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if not previous:
+            continue
+        metrics = [("throughput_rps", current["throughput_rps"], previous["throughput_rps"], -1)]
+        metrics += [
+            (name, current["latency_ms"].get(name), previous["latency_ms"].get(name), 1)
+            for name in [f"p{p:g}" for p in PERCENTILES]
+        ]
+        for name, now, before, direction in metrics:
+            if now is None or not before:
+                continue
+            change = (now - before) / before
+            rows.append({
+                "endpoint": endpoint,
+                "metric": name,
+                "baseline": before,
+                "current": now,
+                "change": round(change, 4),
+                "regression": change * direction > tolerance,
+            })
+    return rows
+
+
+def print_report(results: Dict[str, Any], comparison: List[Dict[str, Any]] = None) -> None:
+    print(f"\n{'endpoint':<14}{'ok/sent':>12}{'rps':>10}" + "".join(f"{'p' + format(p, 'g'):>10}" for p in PERCENTILES))
+    for endpoint, r in results["endpoints"].items():
+        latency = r["latency_ms"]
+        print(
+            f"{endpoint:<14}{str(r['ok']) + '/' + str(r['requests']):>12}{r['throughput_rps']:>10.1f}"
+            + "".join(f"{latency.get(f'p{p:g}', float('nan')):>10.2f}" for p in PERCENTILES)
+        )
+    print("latencies in ms")
+
+    if comparison:
+        print(f"\n{'endpoint':<14}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}")
+        for row in comparison:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(
+                f"{row['endpoint']:<14}{row['metric']:<16}{row['baseline']:>12.2f}"
+                f"{row['current']:>12.2f}{row['change']:>+10.1%}{flag}"
+            )
+
+
+async def benchmark(args) -> Dict[str, Any]:
+    payloads = {endpoint: build_payloads(endpoint, args.samples) for endpoint in args.endpoints}
+    results = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "target": args.url or "in-process",
+        "config": {
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "samples": args.samples,
+            "unique_ids": not args.repeat_ids,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "micro_batching": settings.ENABLE_MICRO_BATCHING,
+            "score_cache": settings.ENABLE_SCORE_CACHE,
+            "inference_executor": settings.INFERENCE_EXECUTOR,
+        },
+        "endpoints": {},
+    }
+
+    async with open_client(args.url, args.timeout) as client:
+        for endpoint in args.endpoints:
+            path = ENDPOINTS[endpoint]
+            if args.warmup:
+                await run_load(client, path, payloads[endpoint], args.warmup, args.concurrency, None)
+            logger.info(f"Benchmarking {path}: {args.requests} requests")
+            results["endpoints"][endpoint] = await run_load(
+                client, path, payloads[endpoint], args.requests, args.concurrency,
+                args.rate, unique_ids=not args.repeat_ids
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fraud scoring API")
+    parser.add_argument("--url", help="base URL of a running server; default drives the app in-process")
+    parser.add_argument("--endpoints", nargs="+", choices=sorted(ENDPOINTS), default=sorted(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests sent first")
+    parser.add_argument("--concurrency", type=int, default=16, help="clients, or the in-flight cap with --rate")
+    parser.add_argument("--rate", type=float, help="open-loop Poisson arrival rate in requests/s")
+    parser.add_argument("--samples", type=int, default=1000, help="distinct generated transactions")
+    parser.add_argument("--repeat-ids", action="store_true", help="reuse transaction ids so the score cache can hit")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--output", type=Path, help="defaults to data/benchmarks/<UTC timestamp>.json")
+    parser.add_argument("--baseline", type=Path, help="earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative change reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 if any metric regressed")
+    args = parser.parse_args()
+
+    results = asyncio.run(benchmark(args))
+
+    comparison = None
+    if args.baseline:
+        comparison = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        results["baseline"] = {"path": str(args.baseline), "tolerance": args.tolerance, "comparison": comparison}
+
+    output = args.output or settings.DATA_DIR / "benchmarks" / f"{datetime.now(timezone.utc):%Y%m%d%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print_report(results, comparison)
+    logger.info(f"Results saved to {output}")
+
+    if args.fail_on_regression and comparison and any(row["regression"] for row in comparison):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# scripts/export_model.py
+#
+# Export trained artifacts for serving without TensorFlow. The Keras MLP
+# member is replaced by its weights as float32 arrays (BatchNormalization
+# folded in, Dropout dropped) and run with NumPy. The exported artifact is
+# published to the registry unless --no-publish is given, and never when its
+# probabilities differ from the original's by more than --max-diff.
+#
+# Usage: python scripts/export_model.py [fraud_model|pca_detector ...] [--no-publish] [--max-diff D]
+import argparse
+import logging
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))  # Add project root to path
+
+import joblib
+import numpy as np
+from config.settings import settings
+from src.models.registry import registry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Largest probability difference from the original that an export may have
+DEFAULT_MAX_DIFF = 1e-4
+
+# name -> (training artifact, serving artifact)
+ARTIFACTS = {
+    "fraud_model": (settings.MODEL_PATH, settings.MODEL_SERVING_PATH),
+    "pca_detector": (settings.PCA_DETECTOR_PATH, settings.PCA_DETECTOR_SERVING_PATH),
+}
+
+
+def check_export(original, exported, n_rows: int = 1000) -> float:
+    """Largest difference between the two ensembles' probabilities on random rows"""
+    n_features = next(
+        model.n_features for model in exported.models.values() if hasattr(model, "n_features")
+    )
+    X = np.random.default_rng(0).normal(size=(n_rows, n_features)).astype(np.float32)
+    _, expected = original.predict(X, cascade=False)
+    _, actual = exported.predict(X, cascade=False)
+    return float(np.max(np.abs(expected - actual)))
+
+
+class ExportCheckError(RuntimeError):
+    """Raised when an exported model's probabilities drift too far from the original's"""
+
+
+def export_model(name: str, publish: bool = True, max_diff: float = DEFAULT_MAX_DIFF) -> Path:
+    """Write the TensorFlow-free artifact of ``name`` and optionally publish it.
+
+    Raises ``ExportCheckError``, before publishing, if the export's
+    probabilities differ from the original's by more than ``max_diff``.
+    """
+    source, target = ARTIFACTS[name]
+    # Loaded without compiling members, so the check compares against Keras itself
+    artifact = joblib.load(source)
+    if name == "fraud_model":
+        original = artifact
+        original.export_for_serving().save(target)
+    else:
+        from src.models.pca_fraud_detector import PCAFraudDetector
+
+        detector = PCAFraudDetector()
+        detector.pca_transformer = artifact['pca_transformer']
+        detector.model = artifact['model']
+        detector.feature_names_in_ = artifact['feature_names_in_']
+        original = detector.model
+        detector.export_for_serving().save(target)
+
+    exported = joblib.load(target)
+    exported = exported if name == "fraud_model" else exported['model']
+    error = check_export(original, exported)
+    logger.info(f"Exported {source} to {target} (max probability difference {error:.2e})")
+    if not error <= max_diff:
+        raise ExportCheckError(
+            f"Export of {name} differs from the original by {error:.2e} (limit {max_diff:.0e}); not publishing"
+        )
+
+    if publish:
+        version = registry.publish(name, target)
+        logger.info(f"Published {target} as {name} version {version}")
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export models for TensorFlow-free serving")
+    parser.add_argument("names", nargs="*", metavar="name", help=f"one of {sorted(ARTIFACTS)}; defaults to both")
+    parser.add_argument("--no-publish", action="store_true", help="write the artifacts only")
+    parser.add_argument("--max-diff", type=float, default=DEFAULT_MAX_DIFF,
+                        help="largest probability difference from the original to accept")
+    args = parser.parse_args()
+    unknown = set(args.names) - set(ARTIFACTS)
+    if unknown:
+        parser.error(f"unknown models {sorted(unknown)}")
+
+    for name in args.names or sorted(ARTIFACTS):
+        try:
+            export_model(name, publish=not args.no_publish, max_diff=args.max_diff)
+        except ExportCheckError as e:
+            logger.error(str(e))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
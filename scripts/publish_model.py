@@ -0,0 +1,38 @@
+# scripts/publish_model.py
+#
+# Publish an artifact to the versioned model registry. Running API workers
+# poll the registry and hot-swap to the new current version.
+#
+# Usage: python scripts/publish_model.py fraud_model data/models/fraud_detection_model.pkl [--version V] [--no-activate]
+#        python scripts/publish_model.py pca_detector --activate-only V
+import argparse
+import logging
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))  # Add project root to path
+
+from src.models.registry import registry, LEGACY_PATHS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish a model version")
+    parser.add_argument("name", choices=sorted(LEGACY_PATHS))
+    parser.add_argument("artifact", nargs="?", help="defaults to the model's legacy path")
+    parser.add_argument("--version", help="defaults to a UTC timestamp")
+    parser.add_argument("--no-activate", action="store_true", help="publish without making it current")
+    parser.add_argument("--activate-only", metavar="VERSION", help="make an existing version current")
+    args = parser.parse_args()
+
+    if args.activate_only:
+        registry.activate(args.name, args.activate_only)
+        logger.info(f"{args.name} now serves version {args.activate_only}")
+        return
+
+    artifact = args.artifact or LEGACY_PATHS[args.name]
+    version = registry.publish(args.name, artifact, args.version, activate=not args.no_activate)
+    logger.info(f"Published {artifact} as {args.name} version {version}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+# scripts/serve_model.py
+#
+# Multi-worker API server that loads the models once and forks the workers.
+#
+# The parent process loads FraudDetectionModel and PCAFraudDetector, then forks
+# WORKERS uvicorn workers that all accept on one listening socket. The workers
+# inherit the loaded models, and the pages holding them stay shared
+# copy-on-write until a worker writes to them. The parent restarts workers
+# that exit, with exponential backoff, and logs each worker's memory use from
+# /proc/<pid>/smaps_rollup: RSS, PSS, and the split between shared pages and
+# pages unique to that worker.
+#
+# TensorFlow cannot be used in a child forked after it has started, so the
+# served artifacts must contain no Keras members. Publish TensorFlow-free
+# versions with scripts/export_model.py, pass --export to have the server do
+# so before loading, or pass --no-preload to load a copy in each worker.
+#
+# With preloading, workers do not poll the registry themselves: a hot-swap in
+# one worker would give it a private copy of the model. The parent polls every
+# MODEL_RELOAD_INTERVAL_S (or on SIGHUP), loads the new version once, and
+# replaces the workers one at a time so they share it again.
+#
+# Usage: python scripts/serve_model.py [--workers N] [--host H] [--port P] [--export | --no-preload]
+import argparse
+import gc
+import logging
+import os
+import re
+import select
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))  # Add project root to path
+
+from config.settings import settings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("serve_model")
+
+# Frameworks whose runtime does not survive fork(); module paths, not stray bytes in weight arrays
+FORK_UNSAFE_MODULES = re.compile(rb"(?:tensorflow|keras)\.[a-z_]{2,}")
+
+MEMORY_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+# Models the parent preloads and keeps current
+SERVED_MODELS = ("fraud_model", "pca_detector")
+
+
+def fork_unsafe_artifacts(paths: dict) -> dict:
+    """The entries of ``paths`` (name -> artifact) whose pickles reference TensorFlow/Keras classes"""
+    unsafe = {}
+    for name, path in paths.items():
+        with open(path, "rb") as f:
+            if FORK_UNSAFE_MODULES.search(f.read()):
+                unsafe[name] = str(path)
+    return unsafe
+
+
+def served_artifacts() -> dict:
+    """Current artifact of each served model that has one"""
+    from src.models.registry import registry
+
+    paths = {}
+    for name in SERVED_MODELS:
+        try:
+            paths[name] = registry.resolve(name)[1]
+        except FileNotFoundError:
+            continue
+    return paths
+
+
+def export_artifacts(names) -> None:
+    """Publish TensorFlow-free versions of ``names``, in a child so TensorFlow never starts here"""
+    command = [sys.executable, str(Path(__file__).parent / "export_model.py"), *names]
+    logger.info(f"Exporting {list(names)} for preloading")
+    subprocess.run(command, check=True)
+
+
+def preload_models() -> None:
+    """Load every serving model into this process before forking"""
+    from src.api.executor import get_model
+    from src.api.endpoints.predict import get_raw_decoder
+
+    start = time.perf_counter()
+    get_model("fraud_model")
+    try:
+        get_raw_decoder()
+        get_model("pca_detector")
+    except Exception as e:
+        logger.warning(f"PCA detector unavailable: {str(e)}")
+    logger.info(f"Preloaded models in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def refresh_models() -> bool:
+    """Load any new current versions in the parent; True if something changed"""
+    from src.api.endpoints.predict import get_raw_decoder
+    from src.api.reload import model_manager
+
+    unsafe = fork_unsafe_artifacts(served_artifacts())
+    changed = False
+    for name in SERVED_MODELS:
+        if name in unsafe:
+            logger.error(f"Not reloading {name}: {unsafe[name]} contains TensorFlow models; export it first")
+            continue
+        try:
+            version = model_manager.refresh(name)
+        except Exception as e:
+            logger.error(f"Reloading {name} failed: {str(e)}")
+            continue
+        if version is not None:
+            logger.info(f"Loaded {name} version {version}")
+            changed = True
+    if changed:
+        try:
+            get_raw_decoder()
+        except Exception as e:
+            logger.warning(f"PCA detector unavailable: {str(e)}")
+        # Release the replaced models, then freeze the new ones like the first
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+    return changed
+
+
+def memory_usage(pid: int) -> dict:
+    """Memory counters in kB for one process, from smaps_rollup"""
+    usage = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            field, _, value = line.partition(":")
+            if field in MEMORY_FIELDS:
+                usage[field] = int(value.split()[0])
+    return {
+        "rss_mb": usage.get("Rss", 0) / 1024,
+        "pss_mb": usage.get("Pss", 0) / 1024,
+        "shared_mb": (usage.get("Shared_Clean", 0) + usage.get("Shared_Dirty", 0)) / 1024,
+        "unique_mb": (usage.get("Private_Clean", 0) + usage.get("Private_Dirty", 0)) / 1024
+    }
+
+
+def report_memory(workers: dict) -> None:
+    total_unique = 0.0
+    for index, pid in sorted(workers.items()):
+        try:
+            usage = memory_usage(pid)
+        except OSError:
+            continue
+        total_unique += usage["unique_mb"]
+        logger.info(
+            f"worker {index} (pid {pid}): rss={usage['rss_mb']:.1f} MB pss={usage['pss_mb']:.1f} MB "
+            f"shared={usage['shared_mb']:.1f} MB unique={usage['unique_mb']:.1f} MB"
+        )
+    parent = memory_usage(os.getpid())
+    logger.info(
+        f"parent (pid {os.getpid()}): rss={parent['rss_mb']:.1f} MB; "
+        f"unique across {len(workers)} workers: {total_unique:.1f} MB"
+    )
+
+
+def run_worker(app, sock: socket.socket, index: int, ready_fd: int = None) -> None:
+    """Body of a forked worker; never returns. Writes to ``ready_fd`` once serving"""
+    import uvicorn
+
+    class Server(uvicorn.Server):
+        async def startup(self, sockets=None):
+            await super().startup(sockets=sockets)
+            if ready_fd is not None and self.started:
+                os.write(ready_fd, b"1")
+                os.close(ready_fd)
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    logger.info(f"worker {index} started (pid {os.getpid()})")
+    try:
+        server = Server(uvicorn.Config(app, lifespan="on", log_config=None))
+        server.run(sockets=[sock])
+        os._exit(0)
+    except BaseException as e:
+        logger.error(f"worker {index} failed: {str(e)}")
+        os._exit(1)
+
+
+def spawn_worker(app, sock: socket.socket, index: int, ready_fd: int = None) -> int:
+    pid = os.fork()
+    if pid == 0:
+        run_worker(app, sock, index, ready_fd)
+    return pid
+
+
+def restart_delay(crashes: int) -> float:
+    """Backoff before restarting a worker after ``crashes`` consecutive crashes"""
+    return min(settings.WORKER_RESTART_BACKOFF_S * 2 ** (crashes - 1), settings.WORKER_RESTART_MAX_BACKOFF_S)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preload-and-fork API server")
+    parser.add_argument("--workers", type=int, default=settings.WORKERS)
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--no-preload", action="store_true", help="load models in each worker instead")
+    parser.add_argument("--export", action="store_true",
+                        help="publish TensorFlow-free versions of models that need them before preloading")
+    parser.add_argument("--report-interval", type=float, default=settings.MEMORY_REPORT_INTERVAL_S,
+                        help="seconds between memory reports, 0 to disable")
+    args = parser.parse_args()
+
+    preload = not args.no_preload
+    if preload:
+        unsafe = fork_unsafe_artifacts(served_artifacts())
+        if unsafe and args.export:
+            export_artifacts(sorted(unsafe))
+            unsafe = fork_unsafe_artifacts(served_artifacts())
+        if unsafe:
+            logger.error(
+                f"TensorFlow models in {sorted(unsafe.values())} cannot be shared across fork(). "
+                f"Run 'python scripts/export_model.py {' '.join(sorted(unsafe))}' to publish "
+                "TensorFlow-free versions, or start with --export or --no-preload"
+            )
+            sys.exit(1)
+    if preload and settings.INFERENCE_EXECUTOR == "process":
+        logger.warning("INFERENCE_EXECUTOR=process loads models in spawned processes; nothing will be shared")
+
+    # Importing the app is cheap: it registers loaders but loads nothing
+    from src.api.app import app
+    if preload:
+        from src.api.reload import model_manager
+
+        preload_models()
+        # Keep the collector from touching (and so un-sharing) the preloaded objects
+        gc.collect()
+        gc.freeze()
+        # Reloads are coordinated here; the workers inherit a disabled watcher
+        reload_interval = model_manager.interval
+        model_manager.interval = 0
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    logger.info(f"Listening on {args.host}:{args.port} with {args.workers} workers (preload={preload})")
+
+    workers = {}
+    started = {}
+    crashes = {index: 0 for index in range(args.workers)}
+    pending = {index: 0.0 for index in range(args.workers)}  # index -> when to (re)start it
+    retiring = set()  # pids of replaced workers that are shutting down
+    to_replace = []  # workers still running models older than the parent's
+    replacing = None  # {"index", "old_pid", "fd"} of the replacement being started
+    stopping = False
+    reload_requested = False
+    exit_code = 0
+
+    def start(index: int, ready_fd: int = None) -> None:
+        workers[index] = spawn_worker(app, sock, index, ready_fd)
+        started[index] = time.monotonic()
+
+    def end_replacement(retire: bool) -> None:
+        nonlocal replacing
+        os.close(replacing["fd"])
+        if retire:
+            retiring.add(replacing["old_pid"])
+            os.kill(replacing["old_pid"], signal.SIGTERM)
+        replacing = None
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        pending.clear()
+        to_replace.clear()
+        if replacing is not None:
+            end_replacement(retire=True)
+        for pid in list(workers.values()) + list(retiring):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def request_reload(signum, frame):
+        nonlocal reload_requested
+        reload_requested = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, request_reload)
+
+    next_report = time.monotonic() + args.report_interval
+    next_reload = time.monotonic() + reload_interval if preload and reload_interval else None
+    while workers or retiring or pending or replacing:
+        now = time.monotonic()
+        for index, due in list(pending.items()):
+            if now >= due and not stopping:
+                del pending[index]
+                start(index)
+
+        # Replace one worker at a time, retiring the old one once the new one serves
+        if replacing is None and to_replace and not stopping:
+            index = to_replace.pop(0)
+            if index in workers and index not in pending:
+                read_fd, write_fd = os.pipe()
+                replacing = {"index": index, "old_pid": workers[index], "fd": read_fd}
+                start(index, write_fd)
+                os.close(write_fd)
+        if replacing is not None and select.select([replacing["fd"]], [], [], 0)[0]:
+            if os.read(replacing["fd"], 1):
+                index = replacing["index"]
+                logger.info(f"worker {index} replaced (pid {replacing['old_pid']} -> {workers[index]})")
+                end_replacement(retire=True)
+
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            # Every worker has exited and the restarts are still backing off
+            pid, status = 0, 0
+        if pid:
+            if pid in retiring:
+                retiring.discard(pid)
+                continue
+            index = next((i for i, p in workers.items() if p == pid), None)
+            if index is None:
+                continue
+            del workers[index]
+            if stopping:
+                continue
+            if replacing is not None and replacing["index"] == index:
+                # The replacement died before serving; the old worker carries on
+                logger.error(
+                    f"replacement for worker {index} exited with status {status}; "
+                    f"keeping pid {replacing['old_pid']}"
+                )
+                workers[index] = replacing["old_pid"]
+                end_replacement(retire=False)
+                continue
+            # Only crashes in quick succession count towards the limit
+            crashes[index] = 1 if now - started[index] >= settings.WORKER_STABLE_S else crashes[index] + 1
+            if crashes[index] >= settings.WORKER_MAX_CRASHES:
+                logger.error(
+                    f"worker {index} (pid {pid}) exited with status {status} "
+                    f"{crashes[index]} times in a row; stopping the server"
+                )
+                exit_code = 1
+                stop(None, None)
+                continue
+            delay = restart_delay(crashes[index])
+            logger.warning(f"worker {index} (pid {pid}) exited with status {status}; restarting in {delay:.1f} s")
+            pending[index] = now + delay
+            continue
+
+        if preload and not stopping and (reload_requested or (next_reload and now >= next_reload)):
+            reload_requested = False
+            next_reload = now + reload_interval if reload_interval else None
+            if refresh_models():
+                to_replace = sorted(set(to_replace) | set(workers))
+        if args.report_interval and now >= next_report and not stopping:
+            report_memory(workers)
+            next_report = now + args.report_interval
+        time.sleep(0.5)
+
+    sock.close()
+    logger.info("All workers stopped")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
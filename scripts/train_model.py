@@ -3,6 +3,7 @@ from pathlib import Path
 from src.data.data_loader import DataLoader
 from src.data.data_preprocessor import DataPreprocessor
 from src.models.model import FraudDetectionModel
+from src.models.registry import registry
 from config.settings import settings
 import pandas as pd
 # scripts/train_pca_model.py
@@ -52,6 +53,10 @@ def main():
         # Save model
         logger.info("Saving model")
         model.save()
+        # Serve the TensorFlow-free export; the full model stays for retraining
+        model.export_for_serving().save(settings.MODEL_SERVING_PATH)
+        version = registry.publish("fraud_model", settings.MODEL_SERVING_PATH)
+        logger.info(f"Published fraud_model version {version}")
         
         logger.info("Model training completed successfully")
     except Exception as e:
@@ -1,4 +1,7 @@
 # scripts/train_pca_model.py
+#
+# Usage: python scripts/train_pca_model.py [--streaming-pca] [--chunksize N]
+import argparse
 import logging
 import pandas as pd
 import sys
@@ -9,23 +12,34 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 from config.settings import settings
 from src.models.pca_fraud_detector import PCAFraudDetector
+from src.models.registry import registry
 from src.data.data_loader import DataLoader
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def main():
+    parser = argparse.ArgumentParser(description="Train the PCA fraud detector")
+    parser.add_argument("--streaming-pca", action="store_true",
+                        help="train out of core, in chunks of the raw CSV; only the PCA components "
+                             "of the rows are held in memory")
+    parser.add_argument("--chunksize", type=int, default=settings.PCA_FIT_CHUNKSIZE)
+    args = parser.parse_args()
     logger.info("Training PCA Fraud Detector")
     
     try:
-        # 1. Load raw data
-        logger.info(f"Loading data from {settings.RAW_DATA_PATH}")
-        raw_data = pd.read_csv(settings.RAW_DATA_PATH)
-        
-        # 2. Initialize and fit PCA fraud detector
         detector = PCAFraudDetector()
-        logger.info("Training model...")
-        detector.fit(raw_data)
+        if args.streaming_pca:
+            logger.info(f"Training from {settings.RAW_DATA_PATH} in chunks of {args.chunksize}")
+            detector.fit_streaming(settings.RAW_DATA_PATH, chunksize=args.chunksize)
+        else:
+            # 1. Load raw data
+            logger.info(f"Loading data from {settings.RAW_DATA_PATH}")
+            raw_data = pd.read_csv(settings.RAW_DATA_PATH)
+            
+            # 2. Fit PCA fraud detector
+            logger.info("Training model...")
+            detector.fit(raw_data)
 
         # After detector.fit()
         components = detector.pca_transformer.get_pca_components()
@@ -40,6 +54,10 @@ def main():
         # 3. Save the trained model
         detector.save()
         logger.info(f"Model saved to {settings.MODEL_DIR}")
+        # Serve the TensorFlow-free export; the full model stays for retraining
+        detector.export_for_serving().save(settings.PCA_DETECTOR_SERVING_PATH)
+        version = registry.publish("pca_detector", settings.PCA_DETECTOR_SERVING_PATH)
+        logger.info(f"Published pca_detector version {version}")
         
     except Exception as e:
         logger.error(f"Training failed: {str(e)}")
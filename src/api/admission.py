@@ -0,0 +1,135 @@
+import logging
+import math
+import time
+from typing import Any, Awaitable, Dict, Optional
+from starlette.requests import HTTPConnection, Request
+from config.settings import settings
+from src.api.executor import inference_executor, cancel_on_disconnect, DeadlineExceededError
+
+logger = logging.getLogger(__name__)
+
+# Clients may send a tighter (or looser) budget than REQUEST_DEADLINE_MS
+DEADLINE_HEADER = "x-request-deadline-ms"
+
+
+class Admission:
+    """Decision for one request: its deadline and whether to score it degraded"""
+
+    def __init__(self, deadline: Optional[float], degraded: bool):
+        self.deadline = deadline
+        self.degraded = degraded
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.perf_counter()
+
+    async def run(self, request: Request, awaitable: Awaitable) -> Any:
+        """Await ``awaitable``, cancelling it on disconnect or once the deadline passes"""
+        try:
+            return await cancel_on_disconnect(request, awaitable, self.deadline)
+        except DeadlineExceededError:
+            admission_control.expired += 1
+            raise
+
+
+class AdmissionController:
+    """Decide, before any work is queued, whether a request can meet its deadline.
+
+    Each scoring request gets a deadline from the ``X-Request-Deadline-Ms``
+    header (milliseconds from arrival) or ``REQUEST_DEADLINE_MS``. Its
+    finishing time is predicted from the executor's queue depth and the
+    recent run times of the full and the degraded scoring path:
+
+    - if the full path fits, the request is admitted as usual;
+    - else if the degraded path (only ``DEGRADED_MEMBERS`` of the ensemble)
+      fits, the request is admitted degraded;
+    - else it is shed with ``DeadlineExceededError`` and a Retry-After hint
+      of how long the queue needs to drain.
+
+    Single rows are estimated from the per-call time of their label; whole
+    batches from the per-row time of theirs (``*.batch`` labels) times the
+    rows sent. A full path that has never run has no known time and is
+    always admitted; a degraded path is only chosen once its time is known.
+    The lifespan hook warms both paths, so their times are known before
+    traffic.
+    """
+
+    def __init__(self):
+        self.admitted = 0
+        self.degraded = 0
+        self.shed = 0
+        self.expired = 0
+
+    def deadline(self, request: HTTPConnection, received_at: float = None) -> Optional[float]:
+        """Absolute ``time.perf_counter()`` deadline of ``request``, or None for no deadline.
+
+        ``received_at`` overrides the arrival time, for messages on a WebSocket.
+        """
+        budget_ms = settings.REQUEST_DEADLINE_MS
+        header = request.headers.get(DEADLINE_HEADER) if request is not None else None
+        if header is not None:
+            try:
+                budget_ms = float(header)
+            except ValueError:
+                pass  # A malformed header falls back to the default budget
+        if not budget_ms or budget_ms <= 0:
+            return None
+        if received_at is None and request is not None:
+            received_at = getattr(request.state, "received_at", None)
+        return (received_at or time.perf_counter()) + budget_ms / 1000.0
+
+    def estimate(self, label: str, rows: int = None, batched: bool = False) -> float:
+        """Predicted seconds from now until a run of ``label`` finishes.
+
+        With ``rows`` the run is costed at ``label``'s per-row time, else at
+        its per-call time.
+        """
+        service = inference_executor.service_time(label) or 0.0
+        wait = inference_executor.queue_depth * service / inference_executor.max_workers
+        if batched and settings.ENABLE_MICRO_BATCHING:
+            wait += settings.BATCH_MAX_WAIT_MS / 1000.0
+        if rows is None:
+            return wait + service
+        return wait + rows * (inference_executor.row_time(label) or 0.0)
+
+    def admit(self, request: HTTPConnection, label: str, degraded_label: str = None,
+              rows: int = None, batched: bool = False, received_at: float = None) -> Admission:
+        """Admit, degrade or shed a request scored by one ``label`` run.
+
+        ``degraded_label`` names the cheaper path, or None if the model has
+        none. Batches pass their ``rows`` and are costed per row.
+        """
+        deadline = self.deadline(request, received_at)
+        if deadline is None:
+            self.admitted += 1
+            return Admission(None, False)
+
+        remaining = deadline - time.perf_counter()
+        if inference_executor.service_time(label) is None or self.estimate(label, rows, batched) <= remaining:
+            self.admitted += 1
+            return Admission(deadline, False)
+        if (settings.ENABLE_DEGRADED_SCORING and degraded_label is not None
+                and inference_executor.service_time(degraded_label) is not None
+                and self.estimate(degraded_label, rows, batched) <= remaining):
+            self.degraded += 1
+            return Admission(deadline, True)
+
+        self.shed += 1
+        drain_s = self.estimate(label, rows=0)
+        raise DeadlineExceededError(
+            f"Cannot score within the {remaining * 1000.0:.0f} ms left before the deadline",
+            retry_after_s=max(math.ceil(drain_s), 1)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default_deadline_ms": settings.REQUEST_DEADLINE_MS,
+            "degraded_scoring": settings.ENABLE_DEGRADED_SCORING,
+            "degraded_members": settings.DEGRADED_MEMBERS,
+            "admitted": self.admitted,
+            "degraded": self.degraded,
+            "shed": self.shed,
+            "expired": self.expired
+        }
+
+
+admission_control = AdmissionController()
@@ -1,25 +1,130 @@
-from fastapi import FastAPI, HTTPException, Request, Form
+from fastapi import FastAPI, HTTPException, Request, Form, Depends
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import List, Optional
+from contextlib import asynccontextmanager
 import numpy as np
-import pandas as pd
+import asyncio
 import logging
+import time
 import logging.config
 from pathlib import Path
 from config.settings import settings
 from src.models.model import FraudDetectionModel
+from src.api.batching import MicroBatcher
+from src.api.decoders import FeatureDecoder, compile_pca_decoder
+from src.api.streaming import NDJSONStreamingResponse, stream_predictions
+from src.api.columnar import (
+    read_matrix, decompress, manifest, columnar_response, ColumnarFormatError, BodyTooLargeError
+)
+from src.api.executor import (
+    inference_executor, get_model, is_loaded,
+    ExecutorSaturatedError, ClientDisconnectedError
+)
 from src.api.endpoints import predict_router, predict_raw_router, health_router
+from src.api.endpoints import predict as predict_endpoints
+from src.api.endpoints.predict import (
+    raw_batcher, raw_degraded_batcher, get_detector, get_raw_decoder, score_encoded_row
+)
+from src.api.reload import model_manager
+from src.api.auth import require_admin
+from src.api.startup import StartupTimer, load_model, warm_up
+from src.api.selftest import self_test
+from src.api.cache import score_cache
+from src.api.admission import admission_control, DeadlineExceededError
+from src.api import instrumentation
+from src.api.instrumentation import MetricsMiddleware, observe_parse, mark_handler_done
+from src.monitoring.metrics import metrics, STAGE_LATENCY
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load and warm the models before the worker starts accepting requests"""
+    timer = StartupTimer()
+    app.state.startup_timings = {}
+    
+    try:
+        with timer.phase("load_fraud_model"):
+            await load_model("fraud_model")
+        if settings.WARMUP_ROUNDS:
+            with timer.phase("warm_up_fraud_model"):
+                rng = np.random.default_rng(0)
+                await warm_up(
+                    "fraud_model", "predict", rng.standard_normal((8, len(FEATURE_COLUMNS))),
+                    batch_label="fraud_model.batch"
+                )
+                if settings.ENABLE_DEGRADED_SCORING:
+                    # Gives admission control a run time for the degraded path too
+                    await warm_up(
+                        "fraud_model", "predict", rng.standard_normal((8, len(FEATURE_COLUMNS))),
+                        args=(None, settings.DEGRADED_MEMBERS), label="fraud_model.degraded",
+                        batch_label="fraud_model.degraded_batch"
+                    )
+    except Exception as e:
+        logger.error(f"Failed to load model: {str(e)}")
+        raise RuntimeError("Failed to load model")
+    
+    self_test.add_component("fraud_model", lambda: is_loaded("fraud_model"))
+    self_test.add_check(
+        "fraud_model",
+        lambda: inference_executor.predict(
+            "fraud_model", np.zeros((1, len(FEATURE_COLUMNS)), dtype=np.float32), record=False
+        )
+    )
+    
+    # The raw-transaction detector is optional; its endpoints answer 503 without it
+    try:
+        with timer.phase("load_pca_detector"):
+            await asyncio.to_thread(get_raw_decoder)
+            await load_model("pca_detector")
+        if settings.WARMUP_ROUNDS:
+            with timer.phase("warm_up_pca_detector"):
+                await warm_up(
+                    "pca_detector", "predict_encoded", get_raw_decoder().defaults[np.newaxis, :],
+                    batch_label="pca_detector.batch"
+                )
+                if settings.ENABLE_DEGRADED_SCORING:
+                    await warm_up(
+                        "pca_detector", "predict_encoded", get_raw_decoder().defaults[np.newaxis, :],
+                        args=(settings.DEGRADED_MEMBERS,), label="pca_detector.degraded",
+                        batch_label="pca_detector.degraded_batch"
+                    )
+        self_test.add_check(
+            "pca_detector",
+            lambda: inference_executor.call(
+                "pca_detector", "predict_encoded", get_raw_decoder().defaults[np.newaxis, :], record=False
+            )
+        )
+    except Exception as e:
+        logger.warning(f"PCA detector unavailable: {str(e)}")
+    self_test.add_component("pca_detector", lambda: is_loaded("pca_detector"))
+    self_test.add_component(
+        "pca_transformer",
+        lambda: is_loaded("pca_detector") and get_model("pca_detector").pca_transformer is not None
+    )
+    self_test.add_component("raw_decoder", lambda: predict_endpoints.raw_decoder is not None)
+    
+    with timer.phase("self_test"):
+        await self_test.run_once()
+    self_test.start()
+    model_manager.start()
+    
+    app.state.startup_timings = timer.summary()
+    logger.info(f"Startup complete in {timer.total_ms:.1f} ms: {app.state.startup_timings}")
+    yield
+    await model_manager.stop()
+    await self_test.stop()
+    inference_executor.shutdown(wait=False)
 
 # Initialize FastAPI app
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API for credit card fraud detection",
-    version=settings.PROJECT_VERSION
+    version=settings.PROJECT_VERSION,
+    lifespan=lifespan
 )
 
 # Setup templates
@@ -46,16 +151,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route and per-stage latency histograms for /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Initialize router
 router = APIRouter()
 
-# Load model
-try:
-    model = FraudDetectionModel.load()
-    logger.info("Model loaded successfully")
-except Exception as e:
-    logger.error(f"Failed to load model: {str(e)}")
-    raise RuntimeError("Failed to load model")
+# Registry-versioned; loaded in the lifespan hook, or on first use if the app runs without one
+model_manager.add(
+    "fraud_model",
+    FraudDetectionModel.load,
+    "predict",
+    warm_up_rows=lambda model: np.random.default_rng(0).standard_normal((8, len(FEATURE_COLUMNS)))
+)
+
+async def _predict_rows(rows):
+    """Score a group of feature rows with a single ensemble call"""
+    (pred_class, pred_proba), version = await inference_executor.predict_versioned(
+        "fraud_model", np.vstack(rows)
+    )
+    return pred_class, pred_proba, version
+
+async def _predict_rows_degraded(rows):
+    """Score a group of feature rows with only the cheap ensemble members"""
+    (pred_class, pred_proba), version = await inference_executor.predict_versioned(
+        "fraud_model", np.vstack(rows), None, settings.DEGRADED_MEMBERS, label="fraud_model.degraded"
+    )
+    return pred_class, pred_proba, version
+
+# Coalesces concurrent /predict calls into one ensemble call
+fraud_batcher = MicroBatcher(_predict_rows, name="fraud_model")
+fraud_degraded_batcher = MicroBatcher(_predict_rows_degraded, name="fraud_model_degraded")
 
 class Transaction(BaseModel):
     Time: float
@@ -89,40 +215,202 @@ class Transaction(BaseModel):
     V28: float
     Amount: float
 
+# Column order the ensemble was trained on
+FEATURE_COLUMNS = ['Time'] + [f'V{i}' for i in range(1, 29)] + ['Amount']
+transaction_decoder = FeatureDecoder(Transaction, FEATURE_COLUMNS)
+
 class PredictionResult(BaseModel):
     is_fraud: bool
     probability: float
     threshold: float
+    model_version: Optional[str] = None
+    degraded: bool = False
+
+class BatchTransactions(BaseModel):
+    transactions: List[Transaction]
+
+class BatchPredictionItem(BaseModel):
+    is_fraud: bool
+    probability: float
+
+class BatchPredictionResult(BaseModel):
+    predictions: List[BatchPredictionItem]
+    threshold: float
+    count: int
+    model_version: Optional[str] = None
+    degraded: bool = False
 
 # Make sure these routers are properly configured
 app.include_router(predict_router, prefix="/api")
 app.include_router(predict_raw_router, prefix="/api")  # This is used in your frontend
-app.include_router(health_router, prefix="/api")
+app.include_router(health_router)  # /livez, /readyz and /api/health
 
 @app.get("/transaction", response_class=HTMLResponse)
 async def transaction_form(request: Request):
     return templates.TemplateResponse("transaction.html", {"request": request})
 
+async def _score_row(row: np.ndarray, degraded: bool = False):
+    """Score one feature row; returns ``(is_fraud, probability, model_version)``"""
+    if settings.ENABLE_MICRO_BATCHING:
+        return await (fraud_degraded_batcher if degraded else fraud_batcher).submit(row)
+    pred_class, pred_proba, version = await (_predict_rows_degraded if degraded else _predict_rows)([row])
+    return pred_class[0], pred_proba[0], version
+
+def _degraded_members(admission) -> Optional[List[str]]:
+    return settings.DEGRADED_MEMBERS if admission.degraded else None
+
+def _batch_label(admission) -> str:
+    return "fraud_model.degraded_batch" if admission.degraded else "fraud_model.batch"
+
 @router.post("/predict", response_model=PredictionResult)
-async def predict(transaction: Transaction):
+async def predict(transaction: Transaction, request: Request):
     """Make prediction using V1-V28 features"""
+    observe_parse(request)
+    row = transaction_decoder.acquire(1)
     try:
-        # Convert to DataFrame with correct column order
-        transaction_dict = transaction.dict()
-        cols = ['Time'] + [f'V{i}' for i in range(1, 29)] + ['Amount']
-        df = pd.DataFrame([transaction_dict])[cols]
+        # Decode into the feature buffer with correct column order
+        start = time.perf_counter()
+        transaction_decoder.decode(transaction, out=row)
+        STAGE_LATENCY.observe_since(start, "feature_assembly")
         
-        # Make prediction
-        pred_class, pred_proba = model.predict(df.values)
+        # Make prediction, degraded or not at all if the deadline is too close
+        admission = admission_control.admit(request, "fraud_model.predict", "fraud_model.degraded", batched=True)
+        is_fraud, probability, version = await admission.run(
+            request, _score_row(row[0], admission.degraded)
+        )
         
+        mark_handler_done(request)
         return {
-            "is_fraud": bool(pred_class[0]),
-            "probability": float(pred_proba[0]),
-            "threshold": settings.THRESHOLD
+            "is_fraud": bool(is_fraud),
+            "probability": float(probability),
+            "threshold": settings.THRESHOLD,
+            "model_version": version,
+            "degraded": admission.degraded
         }
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after_s)})
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ClientDisconnectedError as e:
+        raise HTTPException(status_code=499, detail=str(e))
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        transaction_decoder.release(row)
+
+@router.post("/predict/batch", response_model=BatchPredictionResult)
+async def predict_batch(batch: BatchTransactions, request: Request):
+    """Score many V1-V28 transactions with a single ensemble call"""
+    observe_parse(request)
+    n_rows = len(batch.transactions)
+    if n_rows == 0:
+        raise HTTPException(status_code=422, detail="No transactions supplied")
+    if n_rows > settings.MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {n_rows} rows exceeds limit of {settings.MAX_BATCH_SIZE}"
+        )
+
+    X = transaction_decoder.acquire(n_rows)
+    try:
+        start = time.perf_counter()
+        transaction_decoder.decode_many(batch.transactions, out=X)
+        STAGE_LATENCY.observe_since(start, "feature_assembly")
+        admission = admission_control.admit(request, "fraud_model.batch", "fraud_model.degraded_batch", rows=n_rows)
+        (pred_class, pred_proba), version = await admission.run(
+            request, inference_executor.predict_versioned(
+                "fraud_model", X, None, _degraded_members(admission), label=_batch_label(admission)
+            )
+        )
+
+        # Results come back in input order
+        predictions = [
+            {"is_fraud": bool(c), "probability": float(p)}
+            for c, p in zip(pred_class, pred_proba)
+        ]
+        mark_handler_done(request)
+        return {
+            "predictions": predictions,
+            "threshold": settings.THRESHOLD,
+            "count": n_rows,
+            "model_version": version,
+            "degraded": admission.degraded
+        }
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after_s)})
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ClientDisconnectedError as e:
+        raise HTTPException(status_code=499, detail=str(e))
+    except Exception as e:
+        logger.error(f"Batch prediction error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        transaction_decoder.release(X)
+
+@router.post("/predict/stream")
+async def predict_stream(request: Request):
+    """Score an NDJSON upload of V1-V28 transactions, streaming NDJSON results back"""
+    return NDJSONStreamingResponse(
+        stream_predictions(request, Transaction, transaction_decoder, "fraud_model")
+    )
+
+@router.get("/predict/columnar/manifest")
+async def predict_columnar_manifest():
+    """Column layout expected by /predict/columnar"""
+    return manifest(FEATURE_COLUMNS)
+
+@router.post("/predict/columnar")
+async def predict_columnar(request: Request):
+    """Score a binary (npy, packed float32 or Arrow) batch of V1-V28 rows in one pass"""
+    try:
+        body = decompress(await request.body(), request.headers.get("content-encoding"))
+        X = read_matrix(
+            body,
+            request.headers.get("content-type", ""),
+            FEATURE_COLUMNS,
+            request.headers.get("x-columns")
+        )
+        observe_parse(request)
+    except BodyTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ColumnarFormatError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    if X.shape[0] == 0:
+        raise HTTPException(status_code=422, detail="No transactions supplied")
+    if X.shape[0] > settings.MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {X.shape[0]} rows exceeds limit of {settings.MAX_BATCH_SIZE}"
+        )
+
+    try:
+        admission = admission_control.admit(
+            request, "fraud_model.batch", "fraud_model.degraded_batch", rows=X.shape[0]
+        )
+        (pred_class, pred_proba), version = await admission.run(
+            request, inference_executor.predict_versioned(
+                "fraud_model", X, None, _degraded_members(admission), label=_batch_label(admission)
+            )
+        )
+        start = time.perf_counter()
+        response = columnar_response(
+            pred_class, pred_proba, request.headers.get("accept"), settings.THRESHOLD, version
+        )
+        STAGE_LATENCY.observe_since(start, "response_serialization")
+        if admission.degraded:
+            response.headers["X-Scoring-Degraded"] = "true"
+        return response
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after_s)})
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ClientDisconnectedError as e:
+        raise HTTPException(status_code=499, detail=str(e))
+    except Exception as e:
+        logger.error(f"Columnar prediction error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 class RawTransactionInput(BaseModel):
     # Transaction Details
@@ -170,33 +458,67 @@ class RawTransactionInput(BaseModel):
     device_trust_score: Optional[float] = None
     behavioral_anomaly_score: Optional[float] = None
 
+# Fill missing values with defaults
+RAW_INPUT_DEFAULTS = {
+    "merchant_risk_score": 0.0,
+    "merchant_chargeback_rate": 0.0,
+    "user_age": 30,
+    "user_credit_score": 600,
+    # Add defaults for other fields as needed
+}
+
+raw_input_decoder = None
+
+def get_raw_input_decoder():
+    """Decoder from RawTransactionInput into the PCA detector's feature layout"""
+    global raw_input_decoder
+    pca_transformer = get_detector().pca_transformer
+    if raw_input_decoder is None or raw_input_decoder.pca_transformer is not pca_transformer:
+        raw_input_decoder = compile_pca_decoder(RawTransactionInput, pca_transformer, RAW_INPUT_DEFAULTS)
+    return raw_input_decoder
+
 @router.post("/predict_raw", response_model=PredictionResult)
-async def predict_raw(raw_input: RawTransactionInput):
+async def predict_raw(raw_input: RawTransactionInput, request: Request):
+    observe_parse(request)
     try:
-        logger.info(f"Received data: {raw_input.dict()}")
-        raw_data = pd.DataFrame([raw_input.dict()])
-        
-        # Fill missing values with defaults
-        raw_data.fillna({
-            "merchant_risk_score": 0.0,
-            "merchant_chargeback_rate": 0.0,
-            "user_age": 30,
-            "user_credit_score": 600,
-            # Add defaults for other fields as needed
-        }, inplace=True)
+        decoder = get_raw_input_decoder()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model not loaded: {str(e)}")
+    
+    row = decoder.acquire(1)
+    try:
+        logger.debug(f"Received data: {raw_input}")
+        start = time.perf_counter()
+        decoder.decode(raw_input, out=row)
+        STAGE_LATENCY.observe_since(start, "feature_assembly")
         
-        # Preprocess and predict
-        processed_features = model.preprocess(raw_data)
-        pred_class, pred_proba = model.predict(processed_features)
+        # Raw fields are scored by the PCA detector, not the V1-V28 ensemble
+        admission = admission_control.admit(
+            request, "pca_detector.predict_encoded", "pca_detector.degraded", batched=True
+        )
+        is_fraud, probability, version = await admission.run(
+            request, score_encoded_row(row[0], admission.degraded)
+        )
         
+        mark_handler_done(request)
         return {
-            "is_fraud": bool(pred_class[0]),
-            "probability": float(pred_proba[0]),
+            "is_fraud": bool(is_fraud),
+            "probability": float(probability),
             "threshold": settings.THRESHOLD,
+            "model_version": version,
+            "degraded": admission.degraded
         }
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after_s)})
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ClientDisconnectedError as e:
+        raise HTTPException(status_code=499, detail=str(e))
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        decoder.release(row)
 
 # Include the router
 app.include_router(router, prefix="/api")
@@ -252,7 +574,7 @@ async def check_fraud(
     }
     
     # Call your existing API
-    response = await predict(Transaction(**transaction))
+    response = await predict(Transaction(**transaction), request)
     
     return templates.TemplateResponse("result.html", {
         "request": request,
@@ -264,17 +586,83 @@ async def check_fraud(
 async def root():
     return {"message": "Credit Card Fraud Detection API"}
 
-@app.get("/api/health")
-async def health_check():
+@app.get("/api/batching")
+async def batching_stats():
+    """Micro-batcher counters, including the batch-size distribution"""
+    return {
+        "enabled": settings.ENABLE_MICRO_BATCHING,
+        "batchers": [
+            b.stats() for b in (fraud_batcher, fraud_degraded_batcher, raw_batcher, raw_degraded_batcher)
+        ],
+        "executor": inference_executor.stats()
+    }
+
+@app.get("/api/models")
+async def models_status():
+    """Serving and published versions of each model, and recent swaps"""
+    return model_manager.status()
+
+@app.post("/api/models/{name}/reload", dependencies=[Depends(require_admin)])
+async def reload_model(name: str, version: Optional[str] = None):
+    """Hot-swap a model to ``version`` (default: the registry's current version); requires ADMIN_TOKEN"""
     try:
-        # Simple check to see if model is loaded
-        if model is None:
-            raise HTTPException(status_code=503, detail="Model not loaded")
-        
-        # Test prediction with dummy data
-        dummy_data = np.zeros((1, 30))
-        _, _ = model.predict(dummy_data)
-        
-        return {"status": "healthy"}
+        return await model_manager.reload(name, version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=503, detail=f"Service unhealthy: {str(e)}")
\ No newline at end of file
+        logger.error(f"Model reload failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/cache")
+async def cache_stats():
+    """Hit/miss/eviction counters of the idempotent scoring cache"""
+    return score_cache.stats()
+
+@app.get("/api/admission")
+async def admission_stats():
+    """Admitted, degraded, shed and expired request counts"""
+    return {**admission_control.stats(), "executor": inference_executor.stats()}
+
+# Point-in-time values read when /metrics is scraped
+metrics.gauge("fraud_http_in_flight_requests", "HTTP requests being handled", lambda: instrumentation.in_flight)
+metrics.gauge("fraud_executor_pending", "Inference calls accepted and not finished", lambda: inference_executor.pending)
+metrics.gauge("fraud_executor_queue_depth", "Inference calls waiting for a worker", lambda: inference_executor.queue_depth)
+metrics.gauge(
+    "fraud_batcher_queue_depth",
+    "Rows waiting for a micro-batch",
+    lambda: [
+        ((b.name,), b.stats()["queued"])
+        for b in (fraud_batcher, fraud_degraded_batcher, raw_batcher, raw_degraded_batcher)
+    ],
+    ["batcher"]
+)
+metrics.gauge(
+    "fraud_model_version_info",
+    "Model version currently served",
+    lambda: [((name, info["version"] or ""), 1) for name, info in model_manager.status()["models"].items()],
+    ["model", "version"]
+)
+metrics.gauge(
+    "fraud_admission_requests_total",
+    "Scoring requests by admission outcome",
+    lambda: [
+        ((outcome,), getattr(admission_control, outcome))
+        for outcome in ("admitted", "degraded", "shed", "expired")
+    ],
+    ["outcome"],
+    kind="counter"
+)
+metrics.gauge(
+    "fraud_score_cache_lookups_total",
+    "Score cache lookups by outcome",
+    lambda: [((outcome,), getattr(score_cache, outcome)) for outcome in ("hits", "misses", "coalesced")],
+    ["outcome"],
+    kind="counter"
+)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of latency histograms and serving gauges"""
+    return PlainTextResponse(metrics.expose(), media_type="text/plain; version=0.0.4")
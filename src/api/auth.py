@@ -0,0 +1,17 @@
+import secrets
+from fastapi import HTTPException, Request
+from config.settings import settings
+
+ADMIN_TOKEN_HEADER = "x-admin-token"
+
+
+def require_admin(request: Request) -> None:
+    """Dependency of operator endpoints: the request must carry ``ADMIN_TOKEN``.
+
+    With no ``ADMIN_TOKEN`` configured the endpoints are disabled outright.
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    token = request.headers.get(ADMIN_TOKEN_HEADER, "")
+    if not secrets.compare_digest(token.encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Missing or invalid admin token")
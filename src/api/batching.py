@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+from config.settings import settings
+from src.monitoring.metrics import STAGE_LATENCY
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-row scoring calls into one model call.
+
+    Callers ``await submit(item)`` and get back their own ``(is_fraud, probability, ...)``.
+    A background task collects items until either ``max_batch_size`` rows are
+    queued or ``max_wait_ms`` has passed since the first row arrived, then hands
+    the whole group to ``predict_fn``, which must return (or resolve to) per-row
+    classes and probabilities in the same order. Any further values it returns,
+    such as the model version, are passed unchanged to every caller in the
+    batch. Several batches may be in flight at once.
+    """
+
+    def __init__(self, predict_fn: Callable[[List[Any]], Tuple[np.ndarray, np.ndarray]],
+                 max_batch_size: int = None, max_wait_ms: float = None, name: str = "batcher"):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size or settings.BATCH_MAX_SIZE
+        self.max_wait = (settings.BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self.name = name
+
+        self._queue = None
+        self._worker = None
+        self._inflight = set()
+
+        # Batch-size distribution, bucketed by powers of two
+        self.batch_size_counts = Counter()
+        self.total_batches = 0
+        self.total_items = 0
+
+    def _ensure_started(self) -> None:
+        """Start the collector task on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item: Any) -> Tuple[Any, Any]:
+        """Queue one item and wait for its own prediction"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future, float]]:
+        """Wait for the first item, then gather more until the window closes"""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already waiting before sleeping on the queue
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+
+            # Skip callers that went away while waiting
+            now = time.perf_counter()
+            live = []
+            for item, future, queued_at in batch:
+                if not future.done():
+                    live.append((item, future))
+                    STAGE_LATENCY.observe(now - queued_at, "batch_wait")
+            batch = live
+            if not batch:
+                continue
+            self._record(len(batch))
+
+            # Dispatch without waiting so the next window can fill while this one scores
+            task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            result = self.predict_fn([item for item, _ in batch])
+            if asyncio.iscoroutine(result):
+                result = await result
+            pred_class, pred_proba, *extra = result
+        except Exception as e:
+            logger.error(f"{self.name}: batch of {len(batch)} failed: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for i, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result((pred_class[i], pred_proba[i], *extra))
+
+    def _record(self, size: int) -> None:
+        bucket = 1
+        while bucket < size:
+            bucket *= 2
+        self.batch_size_counts[bucket] += 1
+        self.total_batches += 1
+        self.total_items += size
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters describing how well requests are being coalesced"""
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "total_batches": self.total_batches,
+            "total_items": self.total_items,
+            "mean_batch_size": self.total_items / self.total_batches if self.total_batches else 0.0,
+            "batch_size_le": {str(k): v for k, v in sorted(self.batch_size_counts.items())},
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "inflight_batches": len(self._inflight)
+        }
@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+import numpy as np
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry bookkeeping cost (dict slot, tuples, floats) on top of the key bytes
+ENTRY_OVERHEAD_BYTES = 256
+
+
+class ScoreCache:
+    """In-process LRU + TTL cache of scores for retried transactions.
+
+    Entries are keyed by ``transaction_id`` plus a digest of the encoded
+    feature row, so a retry with different features is scored again.
+    Concurrent lookups for the same key share one computation. The
+    computation runs as its own task, so a caller that gives up (say a
+    gateway timeout) leaves it running, and the retry finds the result
+    cached. Everything is dropped when the serving model version changes.
+    """
+
+    def __init__(self, max_bytes: int = None, ttl_s: float = None):
+        self.max_bytes = settings.SCORE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl = settings.SCORE_CACHE_TTL_S if ttl_s is None else ttl_s
+        self.version = None
+
+        # key -> (expires_at, value, size_bytes), least recently used first
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, int]]" = OrderedDict()
+        self._inflight: Dict[Tuple[Any, Hashable], asyncio.Task] = {}
+        self.size_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(transaction_id: str, row: np.ndarray) -> Tuple[str, bytes]:
+        """Cache key for one transaction and its encoded features"""
+        digest = hashlib.blake2b(np.ascontiguousarray(row).tobytes(), digest_size=16).digest()
+        return transaction_id, digest
+
+    def _check_version(self, version: Any) -> None:
+        if version != self.version:
+            if self._entries:
+                logger.info(f"Model version changed to {version}; dropping {len(self._entries)} cached scores")
+                self.invalidations += 1
+            self.clear()
+            self.version = version
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def _store(self, key: Tuple[str, bytes], value: Any) -> None:
+        size = ENTRY_OVERHEAD_BYTES + len(key[0]) + len(key[1])
+        if key in self._entries:
+            self.size_bytes -= self._entries.pop(key)[2]
+        self._entries[key] = (time.monotonic() + self.ttl, value, size)
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes and self._entries:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.size_bytes -= evicted
+            self.evictions += 1
+
+    def _finish(self, version: Any, key: Tuple[str, bytes], task: asyncio.Task) -> None:
+        self._inflight.pop((version, key), None)
+        # Failures are never cached; retrieving the exception also keeps asyncio quiet
+        if task.cancelled() or task.exception() is not None:
+            return
+        if version == self.version:
+            self._store(key, task.result())
+
+    async def get_or_compute(self, key: Tuple[str, bytes], compute: Callable[[], Awaitable[Any]],
+                             version: Any = None) -> Any:
+        """Return the cached value for ``key`` or await one shared ``compute()``"""
+        self._check_version(version)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+            self.size_bytes -= entry[2]
+            self.expirations += 1
+
+        task = self._inflight.get((version, key))
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[(version, key)] = task
+            task.add_done_callback(lambda t: self._finish(version, key, t))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "enabled": settings.ENABLE_SCORE_CACHE,
+            "version": self.version,
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+
+score_cache = ScoreCache()
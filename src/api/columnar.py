@@ -0,0 +1,277 @@
+# src/api/columnar.py
+#
+# Binary request/response bodies for high-volume scoring.
+#
+# Supported request content types:
+#   application/x-npy                    a NumPy .npy file holding an (n, k) array
+#   application/vnd.fraud.f32            packed little-endian float32, row-major,
+#                                        k values per row, no header
+#   application/vnd.apache.arrow.stream  Arrow IPC stream (requires pyarrow)
+#
+# Column order is given by the endpoint's manifest (GET .../columnar/manifest).
+# Callers may send their own order in an ``X-Columns`` header as a
+# comma-separated list; the server reorders to the manifest. Arrow bodies carry
+# their own column names. Categorical columns hold the integer code from the
+# manifest's code table, -1 for unknown; missing numerics are NaN.
+#
+# Bodies may be compressed with ``Content-Encoding: gzip`` or ``zstd`` (zstd
+# requires the zstandard package) and may expand to at most 64 times their
+# compressed size; larger bodies are rejected with 413. Float32 .npy and packed bodies in manifest
+# order are mapped with np.frombuffer, without copying.
+#
+# Responses use the body type named in ``Accept`` and fall back to JSON. Binary
+# responses are an (n, 2) float32 matrix with columns ``is_fraud,probability``.
+import io
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from starlette.responses import JSONResponse, Response
+
+CONTENT_TYPE_NPY = "application/x-npy"
+CONTENT_TYPE_F32 = "application/vnd.fraud.f32"
+CONTENT_TYPE_ARROW = "application/vnd.apache.arrow.stream"
+BINARY_CONTENT_TYPES = (CONTENT_TYPE_NPY, CONTENT_TYPE_F32, CONTENT_TYPE_ARROW)
+
+RESPONSE_COLUMNS = ["is_fraud", "probability"]
+
+# A compressed body may expand to at most this many times its own size
+MAX_DECOMPRESSION_RATIO = 64
+
+
+class ColumnarFormatError(ValueError):
+    """Raised when a binary body cannot be mapped onto the expected columns"""
+
+
+class BodyTooLargeError(ColumnarFormatError):
+    """Raised when a compressed body expands past ``MAX_DECOMPRESSION_RATIO``"""
+
+
+def _gunzip(body: bytes, max_size: int) -> bytes:
+    """gzip.decompress with a cap on the output size, for every member of the body"""
+    chunks = []
+    size = 0
+    data = body
+    while data:
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        chunk = decompressor.decompress(data, max_size - size + 1)
+        size += len(chunk)
+        if size > max_size:
+            raise BodyTooLargeError(f"Decompressed body exceeds {max_size} bytes")
+        if not decompressor.eof:
+            raise ColumnarFormatError("Invalid gzip body: truncated stream")
+        chunks.append(chunk)
+        data = decompressor.unused_data
+    return b"".join(chunks)
+
+
+def _unzstd(body: bytes, max_size: int) -> bytes:
+    """zstd decompression of every frame of the body, with a cap on the output size.
+
+    ``max_output_size`` alone is no cap: frames that declare their content
+    size are expanded in full. A stream reader is read to at most one byte
+    past the cap instead; within it, a decompressor object then checks that
+    no frame is truncated, which the stream reader lets pass silently.
+    """
+    import zstandard
+
+    reader = zstandard.ZstdDecompressor().stream_reader(body, read_across_frames=True)
+    size = 0
+    while size <= max_size:
+        chunk = reader.read(max_size + 1 - size)
+        if not chunk:
+            break
+        size += len(chunk)
+    if size > max_size:
+        raise BodyTooLargeError(f"Decompressed body exceeds {max_size} bytes")
+
+    chunks = []
+    data = body
+    while data:
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        chunks.append(decompressor.decompress(data))
+        if not decompressor.eof:
+            raise ColumnarFormatError("Invalid zstd body: truncated frame")
+        data = decompressor.unused_data
+    return b"".join(chunks)
+
+
+def decompress(body: bytes, encoding: Optional[str]) -> bytes:
+    """Undo ``Content-Encoding`` on a request body"""
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return body
+    if encoding == "gzip":
+        try:
+            return _gunzip(body, len(body) * MAX_DECOMPRESSION_RATIO)
+        except zlib.error as e:
+            raise ColumnarFormatError(f"Invalid gzip body: {str(e)}")
+    if encoding == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ColumnarFormatError("zstd bodies require the 'zstandard' package")
+        try:
+            return _unzstd(body, len(body) * MAX_DECOMPRESSION_RATIO)
+        except zstandard.ZstdError as e:
+            raise ColumnarFormatError(f"Invalid zstd body: {str(e)}")
+    raise ColumnarFormatError(f"Unsupported Content-Encoding '{encoding}'")
+
+
+def _read_npy(body: bytes) -> np.ndarray:
+    """Map a .npy body onto an array without copying the data section"""
+    buffer = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(buffer)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(buffer)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(buffer)
+    except ValueError as e:
+        raise ColumnarFormatError(f"Invalid .npy body: {str(e)}")
+    if dtype.hasobject:
+        raise ColumnarFormatError("Object arrays are not accepted")
+    if dtype.kind not in "fiub":
+        raise ColumnarFormatError(f"Expected a numeric array, got dtype {dtype.str}")
+    if len(shape) != 2:
+        raise ColumnarFormatError(f"Expected a 2-D array, got shape {shape}")
+
+    count = int(np.prod(shape))
+    if len(body) - buffer.tell() < count * dtype.itemsize:
+        raise ColumnarFormatError(f"Truncated .npy body: {len(body) - buffer.tell()} bytes for shape {shape}")
+    array = np.frombuffer(body, dtype=dtype, count=count, offset=buffer.tell())
+    return array.reshape(shape, order="F" if fortran_order else "C")
+
+
+def _read_arrow(body: bytes, columns: Sequence[str]) -> np.ndarray:
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ColumnarFormatError("Arrow bodies require the 'pyarrow' package")
+    try:
+        table = pa.ipc.open_stream(body).read_all()
+    except (pa.ArrowInvalid, OSError) as e:
+        raise ColumnarFormatError(f"Invalid Arrow body: {str(e)}")
+    missing = [col for col in columns if col not in table.column_names]
+    if missing:
+        raise ColumnarFormatError(f"Arrow body is missing columns: {missing}")
+
+    out = np.empty((table.num_rows, len(columns)), dtype=np.float32)
+    for i, col in enumerate(columns):
+        try:
+            out[:, i] = table.column(col).to_numpy(zero_copy_only=False)
+        except (ValueError, TypeError, pa.ArrowException) as e:
+            raise ColumnarFormatError(f"Arrow column '{col}' is not numeric: {str(e)}")
+    return out
+
+
+def read_matrix(body: bytes, content_type: str, columns: Sequence[str],
+                header_columns: Optional[str] = None) -> np.ndarray:
+    """Decode a binary body into an (n, len(columns)) float32 matrix in manifest order"""
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type == CONTENT_TYPE_ARROW:
+        return _read_arrow(body, columns)
+
+    body_columns = list(columns)
+    if header_columns:
+        body_columns = [col.strip() for col in header_columns.split(",")]
+    n_cols = len(body_columns)
+
+    if content_type == CONTENT_TYPE_NPY:
+        X = _read_npy(body)
+    elif content_type == CONTENT_TYPE_F32:
+        if len(body) % (4 * n_cols):
+            raise ColumnarFormatError(
+                f"Body of {len(body)} bytes is not a whole number of {n_cols}-column float32 rows"
+            )
+        X = np.frombuffer(body, dtype="<f4").reshape(-1, n_cols)
+    else:
+        raise ColumnarFormatError(f"Unsupported content type '{content_type}'")
+
+    if X.shape[1] != n_cols:
+        raise ColumnarFormatError(f"Expected {n_cols} columns, got {X.shape[1]}")
+    if body_columns != list(columns):
+        missing = [col for col in columns if col not in body_columns]
+        if missing:
+            raise ColumnarFormatError(f"Body is missing columns: {missing}")
+        X = X[:, [body_columns.index(col) for col in columns]]
+    if X.dtype != np.float32:
+        X = X.astype(np.float32)
+    return X
+
+
+def response_content_type(accept: Optional[str]) -> Optional[str]:
+    """Binary content type requested by the client, or None for JSON"""
+    for part in (accept or "").split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in BINARY_CONTENT_TYPES:
+            return media_type
+    return None
+
+
+def write_predictions(pred_class: np.ndarray, pred_proba: np.ndarray,
+                      content_type: str) -> Tuple[bytes, Dict[str, str]]:
+    """Encode predictions as an (n, 2) float32 body plus response headers"""
+    out = np.empty((len(pred_class), 2), dtype=np.float32)
+    out[:, 0] = pred_class
+    out[:, 1] = pred_proba
+    headers = {"X-Columns": ",".join(RESPONSE_COLUMNS)}
+
+    if content_type == CONTENT_TYPE_NPY:
+        buffer = io.BytesIO()
+        np.save(buffer, out, allow_pickle=False)
+        return buffer.getvalue(), headers
+    if content_type == CONTENT_TYPE_F32:
+        return out.astype("<f4", copy=False).tobytes(), headers
+    if content_type == CONTENT_TYPE_ARROW:
+        import pyarrow as pa
+        table = pa.table({name: out[:, i] for i, name in enumerate(RESPONSE_COLUMNS)})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), headers
+    raise ColumnarFormatError(f"Unsupported content type '{content_type}'")
+
+
+def manifest(columns: List[str], categories: Optional[Dict[str, List[str]]] = None,
+             hashed: Optional[Dict[str, int]] = None) -> Dict:
+    """Describe the expected binary layout for an endpoint.
+
+    ``hashed`` maps hashed columns to their bucket counts; clients send the
+    bucket computed with ``hash_scheme`` instead of a categorical code.
+    """
+    from src.features.hashing import HASH_SCHEME
+
+    return {
+        "columns": columns,
+        "dtype": "float32",
+        "byte_order": "little",
+        "layout": "row-major",
+        "content_types": list(BINARY_CONTENT_TYPES),
+        "content_encodings": ["identity", "gzip", "zstd"],
+        "categorical_codes": categories or {},
+        "unknown_code": -1,
+        "hashed_buckets": hashed or {},
+        "hash_scheme": HASH_SCHEME,
+        "response_columns": RESPONSE_COLUMNS
+    }
+
+
+def columnar_response(pred_class: np.ndarray, pred_proba: np.ndarray,
+                      accept: Optional[str], threshold: float, model_version: Optional[str] = None):
+    """Build the response in the binary form the client asked for, else JSON"""
+    content_type = response_content_type(accept)
+    if content_type is None:
+        return JSONResponse({
+            "predictions": [
+                {"is_fraud": bool(c), "probability": float(p)}
+                for c, p in zip(pred_class, pred_proba)
+            ],
+            "threshold": threshold,
+            "count": len(pred_class),
+            "model_version": model_version
+        })
+    body, headers = write_predictions(pred_class, pred_proba, content_type)
+    headers["X-Threshold"] = str(threshold)
+    if model_version is not None:
+        headers["X-Model-Version"] = model_version
+    return Response(content=body, media_type=content_type, headers=headers)
@@ -0,0 +1,125 @@
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Type
+import numpy as np
+from pydantic import BaseModel
+
+# Code written for categorical values the model has never seen
+UNKNOWN_CODE = -1.0
+
+# Idle buffers kept per decoder for reuse
+MAX_FREE_BUFFERS = 32
+
+
+class FeatureDecoder:
+    """Compiled mapping from a validated request schema into a float32 feature row.
+
+    The column order, per-column defaults and categorical code tables are
+    resolved once when the decoder is built. Decoding a request is then a
+    copy of the defaults vector followed by one pass over the schema fields,
+    writing straight into a NumPy buffer with no pandas objects involved.
+    """
+
+    def __init__(self, schema: Type[BaseModel], columns: Sequence[str],
+                 defaults: Optional[Dict[str, float]] = None,
+                 categorical_tables: Optional[Dict[str, Dict[str, int]]] = None):
+        defaults = defaults or {}
+        categorical_tables = categorical_tables or {}
+        self.schema = schema
+        self.columns = list(columns)
+        self.n_features = len(self.columns)
+        self.categorical_tables = categorical_tables
+
+        # Precomputed defaults vector: explicit default, then the categorical
+        # "missing" code where the encoder knows one, otherwise NaN for the imputer
+        self.defaults = np.full(self.n_features, np.nan, dtype=np.float32)
+        for i, col in enumerate(self.columns):
+            if col in defaults:
+                self.defaults[i] = defaults[col]
+            elif col in categorical_tables:
+                self.defaults[i] = categorical_tables[col].get("missing", UNKNOWN_CODE)
+
+        # (field, column index, code table or None) for every field the model consumes
+        index = {col: i for i, col in enumerate(self.columns)}
+        fields = schema.model_fields if hasattr(schema, "model_fields") else schema.__fields__
+        self._plan = [
+            (field, index[field], categorical_tables.get(field))
+            for field in fields if field in index
+        ]
+
+        self._free: List[np.ndarray] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, n_rows: int = 1) -> np.ndarray:
+        """Take a reusable (n_rows, n_features) float32 buffer"""
+        with self._lock:
+            for i, buffer in enumerate(self._free):
+                if buffer.shape[0] >= n_rows:
+                    del self._free[i]
+                    return buffer[:n_rows]
+        return np.empty((n_rows, self.n_features), dtype=np.float32)
+
+    def release(self, buffer: np.ndarray) -> None:
+        """Return a buffer obtained from ``acquire`` once the model is done with it"""
+        base = buffer if buffer.base is None else buffer.base
+        with self._lock:
+            if len(self._free) < MAX_FREE_BUFFERS:
+                self._free.append(base)
+
+    def decode_into(self, obj: BaseModel, out: np.ndarray) -> np.ndarray:
+        """Write one validated request into a 1-D row of length ``n_features``"""
+        out[:] = self.defaults
+        for field, i, table in self._plan:
+            value = getattr(obj, field)
+            if value is None:
+                continue
+            if table is not None:
+                out[i] = table.get(value, UNKNOWN_CODE)
+            else:
+                try:
+                    out[i] = value
+                except (TypeError, ValueError):
+                    out[i] = np.nan
+        return out
+
+    def decode(self, obj: BaseModel, out: np.ndarray = None) -> np.ndarray:
+        """Decode one request into a (1, n_features) array"""
+        if out is None:
+            out = self.acquire(1)
+        self.decode_into(obj, out[0])
+        return out
+
+    def decode_many(self, objs: Sequence[BaseModel], out: np.ndarray = None) -> np.ndarray:
+        """Decode many requests into a contiguous (n, n_features) array in input order"""
+        if out is None:
+            out = self.acquire(len(objs))
+        for row, obj in zip(out, objs):
+            self.decode_into(obj, row)
+        return out
+
+
+def code_tables(categories: Dict[str, Sequence[Any]]) -> Dict[str, Dict[str, int]]:
+    """Turn per-column category lists into value -> code lookups"""
+    return {
+        col: {value: code for code, value in enumerate(values)}
+        for col, values in categories.items()
+    }
+
+
+def compile_pca_decoder(schema: Type[BaseModel], pca_transformer,
+                        defaults: Optional[Dict[str, float]] = None) -> FeatureDecoder:
+    """Build a decoder producing rows for ``PCATransformer.transform_encoded``"""
+    hashed_features = getattr(pca_transformer, "hashed_features", [])
+    columns = pca_transformer.numeric_features + pca_transformer.categorical_features + hashed_features
+    # Hash bucket lookups answer ``.get`` like the categorical code tables
+    tables = code_tables(pca_transformer.get_categories())
+    if hashed_features:
+        tables.update(pca_transformer.get_hashers())
+    decoder = FeatureDecoder(
+        schema,
+        columns,
+        defaults=defaults,
+        categorical_tables=tables
+    )
+    # Lets callers notice when a reloaded detector needs a fresh decoder
+    decoder.pca_transformer = pca_transformer
+    return decoder
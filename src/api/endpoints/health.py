@@ -1,7 +1,22 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from src.api.selftest import self_test
 
 router = APIRouter()
 
-@router.get("/health")
+@router.get("/livez")
+async def liveness():
+    """The process is up and serving requests; never touches the models"""
+    return {"status": "alive"}
+
+@router.get("/readyz")
+async def readiness():
+    """Cached result of the background self-test"""
+    status = self_test.status()
+    status["status"] = "ready" if status["ready"] else "not ready"
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@router.get("/api/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    """Kept for existing callers; same answer as /readyz"""
+    return await readiness()
@@ -1,27 +1,80 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel, Field
-import pandas as pd
+import asyncio
+import json
 import logging
+import time
 from typing import Optional
 from config.settings import settings
+from src.api.batching import MicroBatcher
+from src.api.cache import score_cache
+from src.api.decoders import compile_pca_decoder
+from src.api.columnar import (
+    read_matrix, decompress, manifest, columnar_response, ColumnarFormatError, BodyTooLargeError
+)
+from src.api.executor import (
+    inference_executor, get_model, model_version,
+    ExecutorSaturatedError, ClientDisconnectedError
+)
+from src.api.reload import model_manager
+from src.api.admission import admission_control, DeadlineExceededError
+from src.api.instrumentation import observe_parse, mark_handler_done
+from src.monitoring.metrics import STAGE_LATENCY
 import numpy as np
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Initialize detector without loading models immediately
-detector = None
+def load_detector(path):
+    """Registry load function for the PCA detector (imported lazily)"""
+    from src.models.pca_fraud_detector import PCAFraudDetector
+    return PCAFraudDetector.load(path)
 
 def get_detector():
-    global detector
-    if detector is None:
-        try:
-            from src.models.pca_fraud_detector import PCAFraudDetector
-            detector = PCAFraudDetector()
-            detector.load(settings.MODEL_PATH)  # Ensure MODEL_PATH is correctly set in your settings
-        except Exception as e:
-            raise RuntimeError(f"Failed to load the detector: {str(e)}")
-    return detector
+    """The detector currently being served, loading it on first use"""
+    try:
+        return get_model("pca_detector")
+    except Exception as e:
+        raise RuntimeError(f"Failed to load the detector: {str(e)}")
+
+def _warm_up_rows(detector):
+    return compile_pca_decoder(RawTransaction, detector.pca_transformer).defaults[np.newaxis, :]
+
+async def _predict_rows(rows):
+    """Score a group of encoded rows with a single detector call"""
+    (pred_class, pred_proba), version = await inference_executor.call_versioned(
+        "pca_detector", "predict_encoded", np.vstack(rows)
+    )
+    return pred_class, pred_proba, version
+
+async def _predict_rows_degraded(rows):
+    """Score a group of encoded rows with only the cheap ensemble members"""
+    (pred_class, pred_proba), version = await inference_executor.call_versioned(
+        "pca_detector", "predict_encoded", np.vstack(rows), settings.DEGRADED_MEMBERS,
+        label="pca_detector.degraded"
+    )
+    return pred_class, pred_proba, version
+
+async def score_encoded_row(row: np.ndarray, degraded: bool = False):
+    """Score one encoded raw row; returns ``(is_fraud, probability, model_version)``"""
+    if settings.ENABLE_MICRO_BATCHING:
+        return await (raw_degraded_batcher if degraded else raw_batcher).submit(row)
+    pred_class, pred_proba, version = await (_predict_rows_degraded if degraded else _predict_rows)([row])
+    return pred_class[0], pred_proba[0], version
+
+async def score_cached(transaction_id: str, row: np.ndarray, degraded: bool = False):
+    """Score one encoded row, reusing the result for retries of the same transaction"""
+    # Degraded scores are never cached, so a retry can get the full ensemble
+    if degraded or not settings.ENABLE_SCORE_CACHE:
+        return await score_encoded_row(row, degraded)
+    # The caller's buffer goes back to the pool while a shared computation may still run
+    row = row.copy()
+    return await score_cache.get_or_compute(
+        score_cache.key(transaction_id, row), lambda: score_encoded_row(row), model_version("pca_detector")
+    )
+
+raw_batcher = MicroBatcher(_predict_rows, name="pca_detector")
+raw_degraded_batcher = MicroBatcher(_predict_rows_degraded, name="pca_detector_degraded")
 
 class RawTransaction(BaseModel):
     # Core Transaction Fields
@@ -563,39 +616,64 @@ class RawTransaction(BaseModel):
             }
         }
 
+# Served detector versions are hot-swapped, so both are registered only now
+model_manager.add("pca_detector", load_detector, "predict_encoded", warm_up_rows=_warm_up_rows)
+
+# Compiled lazily once the detector (and its fitted categories) is available,
+# and again whenever a reload brings a different transformer
+raw_decoder = None
+
+def get_raw_decoder():
+    global raw_decoder
+    pca_transformer = get_detector().pca_transformer
+    if raw_decoder is None or raw_decoder.pca_transformer is not pca_transformer:
+        # Missing numeric values are scored as 0, as before
+        raw_decoder = compile_pca_decoder(
+            RawTransaction,
+            pca_transformer,
+            defaults={col: 0.0 for col in pca_transformer.numeric_features}
+        )
+    return raw_decoder
+
 @router.post("/predict_raw")
-async def predict_raw(transaction: RawTransaction):
+async def predict_raw(transaction: RawTransaction, request: Request):
+    observe_parse(request)
     try:
         detector = get_detector()
+        decoder = get_raw_decoder()
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Model loading failed: {str(e)}")
     
+    row = decoder.acquire(1)
     try:
-        # Convert to DataFrame and ensure proper data types
-        transaction_data = transaction.dict()
-        raw_df = pd.DataFrame([transaction_data])
-        
-        # Ensure numeric fields are properly converted
-        numeric_cols = [col for col in raw_df.columns if raw_df[col].dtype in ['object', 'bool']]
-        for col in numeric_cols:
-            try:
-                raw_df[col] = pd.to_numeric(raw_df[col])
-            except (ValueError, TypeError):
-                pass  # Keep as-is if conversion fails
-                
-        # Handle missing values for numeric columns
-        numeric_cols = raw_df.select_dtypes(include=[np.number]).columns
-        raw_df[numeric_cols] = raw_df[numeric_cols].fillna(0)
+        # Decode straight into the feature buffer the detector expects
+        start = time.perf_counter()
+        decoder.decode(transaction, out=row)
+        STAGE_LATENCY.observe_since(start, "feature_assembly")
         
-        # Make prediction
-        pred_class, pred_proba = detector.predict(raw_df)
+        # Make prediction, degraded or not at all if the deadline is too close
+        admission = admission_control.admit(
+            request, "pca_detector.predict_encoded", "pca_detector.degraded", batched=True
+        )
+        is_fraud, probability, version = await admission.run(
+            request, score_cached(transaction.transaction_id, row[0], admission.degraded)
+        )
         
+        mark_handler_done(request)
         return {
-            "is_fraud": bool(pred_class[0]),
-            "probability": float(pred_proba[0]),
+            "is_fraud": bool(is_fraud),
+            "probability": float(probability),
             "threshold": settings.THRESHOLD,
+            "model_version": version,
+            "degraded": admission.degraded,
             "features_used": detector.pca_transformer.feature_names
         }
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after_s)})
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ClientDisconnectedError as e:
+        raise HTTPException(status_code=499, detail=str(e))
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -605,4 +683,175 @@ async def predict_raw(transaction: RawTransaction):
                 "message": "Data processing failed. Please check your input data.",
                 "expected_schema": RawTransaction.schema()
             }
-        )
\ No newline at end of file
+        )
+    finally:
+        decoder.release(row)
+
+@router.get("/predict_raw/columnar/manifest")
+async def predict_raw_columnar_manifest():
+    """Column layout and categorical code tables expected by /predict_raw/columnar"""
+    try:
+        decoder = get_raw_decoder()
+        pca_transformer = get_detector().pca_transformer
+        categories = pca_transformer.get_categories()
+        hashed = {col: hasher.n_buckets for col, hasher in pca_transformer.get_hashers().items()}
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model loading failed: {str(e)}")
+    return manifest(decoder.columns, categories, hashed)
+
+@router.post("/predict_raw/columnar")
+async def predict_raw_columnar(request: Request):
+    """Score a binary batch of pre-encoded raw rows in one pass"""
+    try:
+        decoder = get_raw_decoder()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model loading failed: {str(e)}")
+    
+    try:
+        body = decompress(await request.body(), request.headers.get("content-encoding"))
+        X = read_matrix(
+            body,
+            request.headers.get("content-type", ""),
+            decoder.columns,
+            request.headers.get("x-columns")
+        )
+        observe_parse(request)
+    except BodyTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ColumnarFormatError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    if X.shape[0] == 0:
+        raise HTTPException(status_code=422, detail="No transactions supplied")
+    if X.shape[0] > settings.MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {X.shape[0]} rows exceeds limit of {settings.MAX_BATCH_SIZE}"
+        )
+    
+    try:
+        admission = admission_control.admit(
+            request, "pca_detector.batch", "pca_detector.degraded_batch", rows=X.shape[0]
+        )
+        members = settings.DEGRADED_MEMBERS if admission.degraded else None
+        label = "pca_detector.degraded_batch" if admission.degraded else "pca_detector.batch"
+        (pred_class, pred_proba), version = await admission.run(
+            request, inference_executor.call_versioned(
+                "pca_detector", "predict_encoded", X, members, label=label
+            )
+        )
+        start = time.perf_counter()
+        response = columnar_response(
+            pred_class, pred_proba, request.headers.get("accept"), settings.THRESHOLD, version
+        )
+        STAGE_LATENCY.observe_since(start, "response_serialization")
+        if admission.degraded:
+            response.headers["X-Scoring-Degraded"] = "true"
+        return response
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after_s)})
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ClientDisconnectedError as e:
+        raise HTTPException(status_code=499, detail=str(e))
+    except Exception as e:
+        logger.error(f"Columnar prediction error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.websocket("/ws/predict_raw")
+async def predict_raw_ws(websocket: WebSocket):
+    """Long-lived scoring channel for gateways.
+
+    Each text message is one RawTransaction as JSON. Each reply carries the
+    message's ``transaction_id`` and is sent as soon as that transaction is
+    scored, so replies may arrive out of order. At most WS_MAX_INFLIGHT
+    transactions are scored at once per connection; beyond that we stop
+    reading until one finishes. Each message goes through admission control
+    like /predict_raw, with a deadline counted from its arrival; the budget
+    comes from the handshake's X-Request-Deadline-Ms header or
+    REQUEST_DEADLINE_MS. Shed messages get a retryable error reply.
+    """
+    await websocket.accept()
+    try:
+        decoder = get_raw_decoder()
+    except Exception as e:
+        await websocket.close(code=1011, reason=f"Model loading failed: {str(e)}"[:120])
+        return
+    
+    send_lock = asyncio.Lock()
+    inflight = asyncio.Semaphore(settings.WS_MAX_INFLIGHT)
+    tasks = set()
+    
+    async def send(message: dict) -> None:
+        try:
+            start = time.perf_counter()
+            text = json.dumps(message)
+            STAGE_LATENCY.observe_since(start, "response_serialization")
+            async with send_lock:
+                await websocket.send_text(text)
+        except (WebSocketDisconnect, RuntimeError):
+            pass  # Client already gone
+    
+    async def score(text: str, received_at: float) -> None:
+        try:
+            start = time.perf_counter()
+            transaction = RawTransaction.parse_raw(text)
+            STAGE_LATENCY.observe_since(start, "request_parse")
+        except ValueError as e:
+            try:
+                transaction_id = json.loads(text).get("transaction_id")
+            except (ValueError, AttributeError):
+                transaction_id = None
+            await send({"transaction_id": transaction_id, "error": str(e)})
+            inflight.release()
+            return
+        
+        row = decoder.acquire(1)
+        try:
+            start = time.perf_counter()
+            decoder.decode(transaction, out=row)
+            STAGE_LATENCY.observe_since(start, "feature_assembly")
+            admission = admission_control.admit(
+                websocket, "pca_detector.predict_encoded", "pca_detector.degraded",
+                batched=True, received_at=received_at
+            )
+            # Disconnects cancel this task directly, so only the deadline is watched
+            is_fraud, probability, version = await admission.run(
+                None, score_cached(transaction.transaction_id, row[0], admission.degraded)
+            )
+            await send({
+                "transaction_id": transaction.transaction_id,
+                "is_fraud": bool(is_fraud),
+                "probability": float(probability),
+                "threshold": settings.THRESHOLD,
+                "model_version": version,
+                "degraded": admission.degraded
+            })
+        except DeadlineExceededError as e:
+            await send({
+                "transaction_id": transaction.transaction_id, "error": str(e),
+                "retryable": True, "retry_after_s": e.retry_after_s
+            })
+        except ExecutorSaturatedError as e:
+            await send({"transaction_id": transaction.transaction_id, "error": str(e), "retryable": True})
+        except Exception as e:
+            logger.error(f"WebSocket prediction error: {str(e)}")
+            await send({"transaction_id": transaction.transaction_id, "error": str(e)})
+        finally:
+            decoder.release(row)
+            inflight.release()
+    
+    try:
+        while True:
+            text = await websocket.receive_text()
+            received_at = time.perf_counter()
+            await inflight.acquire()
+            task = asyncio.ensure_future(score(text, received_at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Nobody is left to receive these results
+        for task in tasks:
+            task.cancel()
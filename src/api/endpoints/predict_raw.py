@@ -1,21 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional
-import pandas as pd
 import logging
-from src.models.pca_fraud_detector import PCAFraudDetector
+import time
+from src.api.decoders import compile_pca_decoder
+from src.api.instrumentation import observe_parse, mark_handler_done
+from src.monitoring.metrics import STAGE_LATENCY
+from src.api.endpoints.predict import get_detector, score_cached
+from src.api.admission import admission_control, DeadlineExceededError
+from src.api.executor import ExecutorSaturatedError, ClientDisconnectedError
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Load model
-try:
-    detector = PCAFraudDetector.load()
-    logger.info("PCA Fraud Detector loaded successfully")
-except Exception as e:
-    logger.error(f"Failed to load model: {str(e)}")
-    detector = None
-
 # Expanded RawTransaction model to match your earlier data
 class RawTransaction(BaseModel):
     # Transaction Details
@@ -156,42 +153,73 @@ class RawTransaction(BaseModel):
     engineered_feature_4: Optional[float] = None
     # Add more up to engineered_feature_50 as needed
 
+# Fill missing values with defaults (customize based on your model needs)
+RAW_DEFAULTS = {
+    "merchant_risk_score": 0.0,
+    "merchant_chargeback_rate": 0.0,
+    "user_age": 30,
+    "user_credit_score": 600,
+    "merchant_avg_transaction": 100.0,
+    "user_avg_transaction": 100.0,
+    "device_velocity_kmh": 0.0,
+    "ip_risk_score": 0.0,
+    "transactions_last_1h": 0,
+    "transactions_last_24h": 0,
+    "transactions_last_7d": 0,
+    "user_hist_chargeback_rate": 0.0,
+    "time_of_day_risk_score": 0.0,
+    "device_trust_score": 0.5,
+    # Add more defaults as necessary
+}
+
+decoder = None
+
+def get_decoder():
+    global decoder
+    pca_transformer = get_detector().pca_transformer
+    if decoder is None or decoder.pca_transformer is not pca_transformer:
+        decoder = compile_pca_decoder(RawTransaction, pca_transformer, RAW_DEFAULTS)
+    return decoder
+
 @router.post("/predict_raw")
-async def predict_raw(transaction: RawTransaction):
-    if not detector:
-        raise HTTPException(status_code=503, detail="Model not loaded")
+async def predict_raw(transaction: RawTransaction, request: Request):
+    # Shares the detector instance loaded by the predict endpoints
+    observe_parse(request)
+    try:
+        raw_decoder = get_decoder()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model not loaded: {str(e)}")
     
+    row = raw_decoder.acquire(1)
     try:
-        # Convert transaction to DataFrame
-        raw_df = pd.DataFrame([transaction.dict()])
-        
-        # Fill missing values with defaults (customize based on your model needs)
-        raw_df.fillna({
-            "merchant_risk_score": 0.0,
-            "merchant_chargeback_rate": 0.0,
-            "user_age": 30,
-            "user_credit_score": 600,
-            "merchant_avg_transaction": 100.0,
-            "user_avg_transaction": 100.0,
-            "device_velocity_kmh": 0.0,
-            "ip_risk_score": 0.0,
-            "transactions_last_1h": 0,
-            "transactions_last_24h": 0,
-            "transactions_last_7d": 0,
-            "user_hist_chargeback_rate": 0.0,
-            "time_of_day_risk_score": 0.0,
-            "device_trust_score": 0.5,
-            # Add more defaults as necessary
-        }, inplace=True)
+        start = time.perf_counter()
+        raw_decoder.decode(transaction, out=row)
+        STAGE_LATENCY.observe_since(start, "feature_assembly")
         
-        # Make prediction
-        pred_class, pred_proba = detector.predict(raw_df)
+        # Make prediction, degraded or not at all if the deadline is too close
+        admission = admission_control.admit(
+            request, "pca_detector.predict_encoded", "pca_detector.degraded", batched=True
+        )
+        is_fraud, probability, version = await admission.run(
+            request, score_cached(transaction.transaction_id, row[0], admission.degraded)
+        )
         
+        mark_handler_done(request)
         return {
-            "is_fraud": bool(pred_class[0]),
-            "probability": float(pred_proba[0]),
-            "threshold": 0.5  # Adjust this based on your model or settings
+            "is_fraud": bool(is_fraud),
+            "probability": float(probability),
+            "threshold": 0.5,  # Adjust this based on your model or settings
+            "model_version": version,
+            "degraded": admission.degraded
         }
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after_s)})
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ClientDisconnectedError as e:
+        raise HTTPException(status_code=499, detail=str(e))
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        raw_decoder.release(row)
\ No newline at end of file
@@ -0,0 +1,332 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from starlette.requests import Request
+from config.settings import settings
+from src.monitoring.metrics import metrics, STAGE_LATENCY
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when the inference queue is full and the call was not accepted"""
+
+
+class ClientDisconnectedError(RuntimeError):
+    """Raised when the client went away before its prediction finished"""
+
+
+class DeadlineExceededError(RuntimeError):
+    """Raised when a request cannot be scored before its deadline"""
+
+    def __init__(self, message: str, retry_after_s: int = 1):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+# Models are looked up by name so that process-pool workers can resolve them
+# locally instead of having the whole ensemble pickled into every call. Each
+# loaded model is stored together with its version as one tuple, so replacing
+# the entry swaps both at once and a call that already fetched the old pair
+# finishes on the old model.
+_model_loaders: Dict[str, Callable[[], Any]] = {}
+_models: Dict[str, Tuple[Any, Optional[str]]] = {}
+
+
+def register_model(name: str, loader: Callable[[], Any], instance: Any = None) -> None:
+    """Register a zero-argument loader for a named model.
+
+    ``loader`` must be picklable (a module-level function or classmethod) so
+    process-pool workers can load their own copy. Its ``version`` attribute,
+    if any, is reported with every prediction. Pass ``instance`` when the
+    model is already loaded in this process.
+    """
+    _model_loaders[name] = loader
+    if instance is not None:
+        _models[name] = (instance, getattr(loader, "version", None))
+    else:
+        _models.pop(name, None)
+
+
+def _init_worker(loaders: Dict[str, Callable[[], Any]]) -> None:
+    """Process-pool initializer: load every registered model up front"""
+    metrics.record()
+    _model_loaders.update(loaders)
+    for name in loaders:
+        get_model(name)
+
+
+def _get_entry(name: str) -> Tuple[Any, Optional[str]]:
+    entry = _models.get(name)
+    if entry is None:
+        if name not in _model_loaders:
+            raise KeyError(f"No model registered under '{name}'")
+        loader = _model_loaders[name]
+        entry = _models[name] = (loader(), getattr(loader, "version", None))
+    return entry
+
+
+def get_model(name: str) -> Any:
+    """Return the named model, loading it on first use in this process"""
+    return _get_entry(name)[0]
+
+
+def model_version(name: str) -> Optional[str]:
+    """Version of the loader currently registered under ``name``"""
+    loader = _model_loaders.get(name)
+    return getattr(loader, "version", None)
+
+
+def registered_loaders() -> Dict[str, Callable[[], Any]]:
+    return dict(_model_loaders)
+
+
+def is_loaded(name: str) -> bool:
+    """Whether the named model is loaded in this process"""
+    return name in _models
+
+
+def _call_model(name: str, method: str, *args) -> Any:
+    return getattr(get_model(name), method)(*args)
+
+
+def _call_model_versioned(name: str, method: str, *args) -> Tuple[Any, Optional[str]]:
+    model, version = _get_entry(name)
+    return getattr(model, method)(*args), version
+
+
+def _timed(fn: Callable, *args) -> Tuple[float, Any]:
+    """Run ``fn(*args)`` in a worker, returning its own run time alongside the result"""
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def _timed_recorded(fn: Callable, *args) -> Tuple[float, Any, list]:
+    """``_timed`` in a process worker, also returning the metrics it recorded for the parent"""
+    elapsed, result = _timed(fn, *args)
+    return elapsed, result, metrics.drain()
+
+
+def _rows(args: tuple) -> Optional[int]:
+    """Rows scored by a model call whose first argument is a batch"""
+    shape = getattr(args[0], "shape", None) if args else None
+    return shape[0] if shape else None
+
+
+class InferenceExecutor:
+    """Bounded pool that runs CPU-bound scoring off the event loop.
+
+    ``INFERENCE_EXECUTOR`` selects a thread pool (default) or a process pool
+    whose workers each load the registered models at start-up. At most
+    ``max_workers + max_queue`` calls may be pending; anything beyond that is
+    rejected with ``ExecutorSaturatedError`` so that callers can shed load
+    instead of piling up behind the models.
+
+    Calls may carry a ``label``; the executor keeps a moving average of how
+    long each label takes to run (queueing excluded), per call and per row
+    scored, which admission control uses to predict whether a request can
+    still finish in time. Calls that are not traffic (self-tests) pass
+    ``record=False`` so they do not skew those averages.
+    """
+
+    # Weight of the newest run in each label's moving average
+    SERVICE_TIME_ALPHA = 0.2
+
+    def __init__(self, kind: str = None, max_workers: int = None, max_queue: int = None):
+        self.kind = kind or settings.INFERENCE_EXECUTOR
+        if self.kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind '{self.kind}', expected 'thread' or 'process'")
+        self.max_workers = max_workers or settings.INFERENCE_WORKERS or os.cpu_count() or 1
+        self.max_queue = settings.INFERENCE_MAX_QUEUE if max_queue is None else max_queue
+        self._pool: Executor = None
+        # Counts calls until their pool work finishes, not until their caller
+        # stops waiting, so cancelled calls that are still running count too
+        self.pending = 0
+        self._pending_lock = threading.Lock()
+        self._service_times: Dict[str, float] = {}
+        self._row_times: Dict[str, float] = {}
+
+    def _make_pool(self, loaders: Dict[str, Callable[[], Any]] = None) -> Executor:
+        if self.kind == "process":
+            # spawn, not fork: the TensorFlow runtime deadlocks in forked children
+            pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(dict(_model_loaders if loaders is None else loaders),)
+            )
+        else:
+            pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="inference"
+            )
+        logger.info(f"Started {self.kind} inference pool with {self.max_workers} workers")
+        return pool
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            self._pool = self._make_pool()
+        return self._pool
+
+    async def replace_pool(self, loaders: Dict[str, Callable[[], Any]] = None,
+                           warm_up_calls: Iterable[Tuple[str, str, tuple]] = ()) -> None:
+        """Start a fresh pool, run ``(name, method, args)`` warm-up calls on it, then switch to it.
+
+        Process workers only load models when they start, so this is how they
+        pick up new model versions. Calls already running on the old pool
+        finish there before it shuts down.
+        """
+        pool = self._make_pool(loaders)
+        try:
+            for name, method, args in warm_up_calls:
+                await asyncio.wrap_future(pool.submit(_call_model, name, method, *args))
+        except Exception:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        old, self._pool = self._pool, pool
+        if old is not None:
+            old.shutdown(wait=False)
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls accepted but not yet running"""
+        return max(self.pending - self.max_workers, 0)
+
+    def service_time(self, label: str) -> Optional[float]:
+        """Moving average of one ``label``'s run time in seconds, if it has run"""
+        return self._service_times.get(label)
+
+    def row_time(self, label: str) -> Optional[float]:
+        """Moving average of one ``label``'s run time per row scored, if it has run"""
+        return self._row_times.get(label)
+
+    def _update(self, averages: Dict[str, float], label: str, seconds: float) -> None:
+        previous = averages.get(label)
+        averages[label] = seconds if previous is None else (
+            previous + self.SERVICE_TIME_ALPHA * (seconds - previous)
+        )
+
+    def _record_service_time(self, label: str, seconds: float, rows: int = None) -> None:
+        self._update(self._service_times, label, seconds)
+        if rows:
+            self._update(self._row_times, label, seconds / rows)
+
+    def _release(self, future) -> None:
+        with self._pending_lock:
+            self.pending -= 1
+
+    async def run(self, fn: Callable, *args, label: str = None, rows: int = None) -> Any:
+        """Run ``fn(*args)`` in the pool; cancelling the caller cancels queued work.
+
+        ``rows`` is how many rows the call scores, for the per-row average.
+        """
+        with self._pending_lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                raise ExecutorSaturatedError(
+                    f"Inference queue full ({self.pending} pending, limit {self.max_workers + self.max_queue})"
+                )
+            self.pending += 1
+        start = time.perf_counter()
+        try:
+            # Member latencies and cascade exits of process workers are recorded there
+            task = _timed_recorded if self.kind == "process" else _timed
+            future = self._get_pool().submit(task, fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        # Released when the work itself ends: on completion, or on cancellation while still queued
+        future.add_done_callback(self._release)
+        try:
+            # wrap_future propagates cancellation of the awaiting task to the pool future
+            if self.kind == "process":
+                elapsed, result, records = await asyncio.wrap_future(future)
+                metrics.replay(records)
+            else:
+                elapsed, result = await asyncio.wrap_future(future)
+            if label is not None:
+                self._record_service_time(label, elapsed, rows)
+            return result
+        finally:
+            STAGE_LATENCY.observe_since(start, "executor")
+
+    async def call(self, name: str, method: str, *args, label: str = None, record: bool = True) -> Any:
+        """Call ``method`` on a registered model inside the pool.
+
+        Run times are recorded under ``label`` (default ``name.method``)
+        unless ``record`` is False.
+        """
+        return await self.run(
+            _call_model, name, method, *args,
+            label=(label or f"{name}.{method}") if record else None, rows=_rows(args)
+        )
+
+    async def predict(self, name: str, *args, label: str = None, record: bool = True) -> Any:
+        """Call ``predict`` on a registered model inside the pool"""
+        return await self.call(name, "predict", *args, label=label, record=record)
+
+    async def call_versioned(self, name: str, method: str, *args, label: str = None,
+                             record: bool = True) -> Tuple[Any, Optional[str]]:
+        """Like ``call``, also returning the version of the model that ran it"""
+        return await self.run(
+            _call_model_versioned, name, method, *args,
+            label=(label or f"{name}.{method}") if record else None, rows=_rows(args)
+        )
+
+    async def predict_versioned(self, name: str, *args, label: str = None,
+                                record: bool = True) -> Tuple[Any, Optional[str]]:
+        return await self.call_versioned(name, "predict", *args, label=label, record=record)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "queue_depth": self.queue_depth,
+            "service_time_ms": {label: round(t * 1000.0, 3) for label, t in self._service_times.items()},
+            "row_time_ms": {label: round(t * 1000.0, 4) for label, t in self._row_times.items()}
+        }
+
+
+async def cancel_on_disconnect(request: Request, awaitable, deadline: float = None) -> Any:
+    """Await ``awaitable`` but cancel it if the client disconnects first.
+
+    ``deadline`` (a ``time.perf_counter()`` value) also cancels it, raising
+    ``DeadlineExceededError``, once passed.
+    """
+    if request is None and deadline is None:
+        return await awaitable
+
+    task = asyncio.ensure_future(awaitable)
+    poll_interval = settings.DISCONNECT_POLL_MS / 1000.0
+    try:
+        while True:
+            timeout = poll_interval
+            if deadline is not None:
+                timeout = min(timeout, max(deadline - time.perf_counter(), 0.0))
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if done:
+                return task.result()
+            if deadline is not None and time.perf_counter() >= deadline:
+                task.cancel()
+                raise DeadlineExceededError("Deadline passed before the prediction finished")
+            if request is not None and await request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnectedError("Client disconnected before prediction finished")
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+
+inference_executor = InferenceExecutor()
@@ -0,0 +1,62 @@
+import time
+from starlette.requests import Request
+from src.monitoring.metrics import metrics, STAGE_LATENCY
+
+REQUEST_LATENCY = metrics.histogram(
+    "fraud_http_request_latency_seconds",
+    "End-to-end latency of HTTP requests by route",
+    ["route"]
+)
+
+# Paths whose own timings would only add noise
+UNTIMED_PATHS = ("/metrics", "/livez", "/readyz")
+
+# HTTP requests currently being handled
+in_flight = 0
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing requests and the stages handlers cannot see.
+
+    It stamps ``request.state.received_at`` before routing, so a handler can
+    record how long parsing and validating its body took. If the handler
+    calls ``mark_handler_done`` before returning, the time from then to the
+    response start is recorded as response serialization.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global in_flight
+        if scope["type"] != "http" or scope["path"] in UNTIMED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = scope.setdefault("state", {})
+        state["received_at"] = start
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start" and "handler_done_at" in state:
+                STAGE_LATENCY.observe_since(state["handler_done_at"], "response_serialization")
+            await send(message)
+
+        in_flight += 1
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            in_flight -= 1
+            route = scope.get("route")
+            REQUEST_LATENCY.observe_since(start, getattr(route, "path", "unmatched"))
+
+
+def observe_parse(request: Request) -> None:
+    """Record time from request arrival to handler entry (body read and validation)"""
+    received_at = getattr(request.state, "received_at", None)
+    if received_at is not None:
+        STAGE_LATENCY.observe_since(received_at, "request_parse")
+
+
+def mark_handler_done(request: Request) -> None:
+    request.state.handler_done_at = time.perf_counter()
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from config.settings import settings
+from src.api.executor import inference_executor, register_model, registered_loaders, model_version
+from src.api.startup import warm_up_batches
+from src.models.registry import ModelRegistry, VersionedLoader, registry as default_registry
+
+logger = logging.getLogger(__name__)
+
+
+class ModelManager:
+    """Serve registry versions of each model and hot-swap them without a restart.
+
+    A swap loads the new version off the event loop, warms it on synthetic
+    rows, and only then replaces the executor's entry for the model. Calls
+    that already picked up the old model finish on it. With a process pool, a
+    new pool is started and warmed on the new version before traffic moves
+    to it.
+    """
+
+    def __init__(self, registry: ModelRegistry = None, interval_s: float = None):
+        self.registry = registry or default_registry
+        self.interval = settings.MODEL_RELOAD_INTERVAL_S if interval_s is None else interval_s
+        self._load_fns: Dict[str, Callable[[Path], Any]] = {}
+        self._methods: Dict[str, str] = {}
+        self._warm_up_rows: Dict[str, Callable[[Any], np.ndarray]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.history: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, load_fn: Callable[[Path], Any], method: str = "predict",
+            warm_up_rows: Callable[[Any], np.ndarray] = None) -> None:
+        """Serve the registry's current version of ``name``.
+
+        ``load_fn`` maps an artifact path to a model and must be picklable.
+        ``warm_up_rows`` builds synthetic input rows for a loaded model.
+        """
+        self._load_fns[name] = load_fn
+        self._methods[name] = method
+        if warm_up_rows is not None:
+            self._warm_up_rows[name] = warm_up_rows
+        try:
+            version, path = self.registry.resolve(name)
+        except FileNotFoundError as e:
+            # Fails again, with this error, when the model is first used
+            logger.warning(f"No artifact found for {name}: {str(e)}")
+            version, path = None, None
+        register_model(name, VersionedLoader(load_fn, path, version))
+
+    def _warm_up_calls(self, name: str, model: Any) -> List[tuple]:
+        if name not in self._warm_up_rows or not settings.WARMUP_ROUNDS:
+            return []
+        rows = self._warm_up_rows[name](model)
+        return [(name, self._methods[name], (X,)) for X in warm_up_batches(rows)]
+
+    async def reload(self, name: str, version: str = None) -> Dict[str, Any]:
+        """Swap ``name`` to ``version`` (default: the registry's current one)"""
+        if name not in self._load_fns:
+            raise KeyError(f"No model registered under '{name}'")
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            new_version, path = await asyncio.to_thread(self.registry.resolve, name, version)
+            old_version = model_version(name)
+            if new_version == old_version:
+                return {"name": name, "version": new_version, "swapped": False}
+
+            start = time.perf_counter()
+            loader = VersionedLoader(self._load_fns[name], path, new_version)
+            model = await asyncio.to_thread(loader)
+            warm_up_calls = self._warm_up_calls(name, model)
+
+            if inference_executor.kind == "process":
+                loaders = dict(registered_loaders(), **{name: loader})
+                await inference_executor.replace_pool(loaders, warm_up_calls)
+            else:
+                for _, method, args in warm_up_calls:
+                    await asyncio.to_thread(getattr(model, method), *args)
+
+            # The flip: one dict assignment replaces model and version together
+            register_model(name, loader, instance=model)
+
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            logger.info(f"Swapped {name} from {old_version} to {new_version} in {elapsed_ms:.1f} ms")
+            result = {
+                "name": name,
+                "version": new_version,
+                "previous_version": old_version,
+                "swapped": True,
+                "swap_ms": round(elapsed_ms, 1),
+                "at": time.time()
+            }
+            self.history.append(result)
+            return result
+
+    def refresh(self, name: str) -> Optional[str]:
+        """Load the registry's current version of ``name`` synchronously, without warm-up.
+
+        For a process that serves no requests itself, such as the parent of
+        scripts/serve_model.py. Returns the new version, or None if unchanged.
+        """
+        version, path = self.registry.resolve(name)
+        old_version = model_version(name)
+        if version == old_version:
+            return None
+        loader = VersionedLoader(self._load_fns[name], path, version)
+        register_model(name, loader, instance=loader())
+        self.history.append({
+            "name": name, "version": version, "previous_version": old_version, "swapped": True, "at": time.time()
+        })
+        return version
+
+    async def reload_all(self) -> List[Dict[str, Any]]:
+        results = []
+        for name in self._load_fns:
+            try:
+                results.append(await self.reload(name))
+            except Exception as e:
+                logger.error(f"Reloading {name} failed: {str(e)}")
+                results.append({"name": name, "error": str(e), "swapped": False})
+        return results
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.reload_all()
+
+    def start(self) -> None:
+        """Poll the registry and swap whenever a model's current version changes"""
+        if self.interval and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "models": {
+                name: {
+                    "version": model_version(name),
+                    "available": self.registry.versions(name),
+                    "current": self.registry.current_version(name)
+                }
+                for name in self._load_fns
+            },
+            "swaps": self.history[-20:]
+        }
+
+
+model_manager = ModelManager()
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from config.settings import settings
+from src.api.executor import ExecutorSaturatedError
+
+logger = logging.getLogger(__name__)
+
+
+class SelfTest:
+    """Periodic background check of the serving path, cached for health probes.
+
+    Each check is a coroutine function that scores a synthetic row the same
+    way real traffic is scored. Probes only read the cached result, so probing
+    never costs an inference. Components are cheap boolean callables, read on
+    every probe, that report whether a model or transformer is loaded.
+    """
+
+    def __init__(self, interval_s: float = None, timeout_s: float = None):
+        self.interval = settings.SELF_TEST_INTERVAL_S if interval_s is None else interval_s
+        self.timeout = settings.SELF_TEST_TIMEOUT_S if timeout_s is None else timeout_s
+        self.checks: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self.components: Dict[str, Callable[[], bool]] = {}
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.last_run: Optional[float] = None
+        self.last_latency_ms: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add_check(self, name: str, check: Callable[[], Awaitable[Any]]) -> None:
+        self.checks[name] = check
+
+    def add_component(self, name: str, is_loaded: Callable[[], bool]) -> None:
+        self.components[name] = is_loaded
+
+    async def run_once(self) -> None:
+        """Run every check and cache the outcome"""
+        start = time.perf_counter()
+        for name, check in self.checks.items():
+            check_start = time.perf_counter()
+            try:
+                await asyncio.wait_for(check(), self.timeout)
+                result = {"ok": True}
+            except ExecutorSaturatedError:
+                # A busy pool says nothing about model health; keep the last result
+                logger.info(f"Self-test '{name}' skipped: inference queue full")
+                continue
+            except asyncio.TimeoutError:
+                result = {"ok": False, "error": f"timed out after {self.timeout}s"}
+            except Exception as e:
+                result = {"ok": False, "error": str(e)}
+            result["latency_ms"] = round((time.perf_counter() - check_start) * 1000.0, 2)
+            if not result["ok"]:
+                logger.warning(f"Self-test '{name}' failed: {result['error']}")
+            self.results[name] = result
+        self.last_latency_ms = round((time.perf_counter() - start) * 1000.0, 2)
+        self.last_run = time.time()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Self-test loop error: {str(e)}")
+
+    def start(self) -> None:
+        """Start periodic re-checks on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        """Cached readiness; stale results count as not ready"""
+        age = None if self.last_run is None else time.time() - self.last_run
+        fresh = age is not None and age <= max(self.interval * 3, self.timeout)
+        checks_ok = bool(self.results) and all(r["ok"] for r in self.results.values())
+        return {
+            "ready": fresh and checks_ok,
+            "components": {name: bool(is_loaded()) for name, is_loaded in self.components.items()},
+            "checks": self.results,
+            "last_self_test_age_s": None if age is None else round(age, 2),
+            "last_self_test_latency_ms": self.last_latency_ms
+        }
+
+
+self_test = SelfTest()
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence
+import numpy as np
+from config.settings import settings
+from src.api.executor import inference_executor, get_model
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Wall-clock duration of each startup phase, logged as each one finishes"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (time.perf_counter() - start) * 1000.0
+            logger.info(f"Startup phase '{name}' took {self.phases[name]:.1f} ms")
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000.0
+
+    def summary(self) -> Dict[str, float]:
+        return {**{name: round(ms, 1) for name, ms in self.phases.items()}, "total": round(self.total_ms, 1)}
+
+
+async def load_model(name: str) -> None:
+    """Load a registered model off the event loop.
+
+    Process-pool workers load their own copies when the pool starts, so the
+    parent only loads models itself when scoring runs on threads.
+    """
+    if inference_executor.kind == "thread":
+        await asyncio.to_thread(get_model, name)
+
+
+def warm_up_batches(rows: np.ndarray, batch_sizes: Sequence[int] = None,
+                    rounds: int = None) -> List[np.ndarray]:
+    """Synthetic float32 batches at the sizes the API sends, ``rounds`` times over"""
+    rounds = settings.WARMUP_ROUNDS if rounds is None else rounds
+    batch_sizes = batch_sizes or (1, settings.BATCH_MAX_SIZE)
+    return [
+        np.resize(rows, (size, rows.shape[1])).astype(np.float32)
+        for _ in range(rounds) for size in batch_sizes
+    ]
+
+
+async def warm_up(name: str, method: str, rows: np.ndarray,
+                  batch_sizes: Sequence[int] = None, rounds: int = None,
+                  args: tuple = (), label: str = None, batch_label: str = None) -> None:
+    """Push synthetic batches through the executor so the first real request runs warm.
+
+    This starts the pool and exercises each model's first-call paths (lazy
+    graph tracing in TensorFlow, thread pools in the tree libraries) at the
+    batch sizes the API actually sends. ``args`` follow each batch in the
+    call. Single rows record their run times for admission control under
+    ``label`` and larger batches under ``batch_label``, so warm-up batches
+    do not inflate the single-row average.
+    """
+    for X in warm_up_batches(rows, batch_sizes, rounds):
+        await inference_executor.call(
+            name, method, X, *args, label=label if len(X) == 1 else (batch_label or label)
+        )
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, List, Tuple, Type
+import numpy as np
+from pydantic import BaseModel
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from config.settings import settings
+from src.api.decoders import FeatureDecoder
+from src.api.executor import inference_executor, ExecutorSaturatedError
+
+logger = logging.getLogger(__name__)
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """Streaming response that leaves ``receive`` to the request body reader.
+
+    Starlette's default streaming response listens for disconnects on older
+    ASGI servers by reading ``receive``, which would swallow the upload we are
+    still consuming. Here the body reader notices the disconnect instead.
+    """
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def _read_chunks(request: Request, schema: Type[BaseModel], queue: asyncio.Queue) -> None:
+    """Parse NDJSON lines into validated chunks of at most STREAM_CHUNK_SIZE rows.
+
+    ``queue`` is bounded, so when scoring falls behind ``put`` blocks and we
+    stop pulling the request body, which pushes back on the client.
+    """
+    chunk_size = settings.STREAM_CHUNK_SIZE
+    row_index = 0
+    pending = b""
+    rows: List[Tuple[int, BaseModel]] = []
+    errors: List[Tuple[int, str]] = []
+
+    async def flush() -> None:
+        nonlocal rows, errors
+        if rows or errors:
+            await queue.put((rows, errors))
+            rows, errors = [], []
+
+    async def handle(line: bytes) -> None:
+        nonlocal row_index
+        line = line.strip()
+        if not line:
+            return
+        try:
+            rows.append((row_index, schema.parse_raw(line)))
+        except ValueError as e:
+            errors.append((row_index, str(e)))
+        row_index += 1
+        if len(rows) + len(errors) >= chunk_size:
+            await flush()
+
+    async for data in request.stream():
+        pending += data
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        if len(pending) > settings.STREAM_MAX_LINE_BYTES:
+            raise ValueError(f"Line {row_index} exceeds {settings.STREAM_MAX_LINE_BYTES} bytes")
+        for line in lines:
+            await handle(line)
+
+    await handle(pending)
+    await flush()
+    await queue.put(None)
+
+
+async def _predict_with_backpressure(name: str, X: np.ndarray):
+    """Wait for room on the executor instead of failing the stream"""
+    while True:
+        try:
+            # Stream chunks are batches; keep them out of the single-row average
+            return await inference_executor.predict_versioned(name, X, label=f"{name}.stream")
+        except ExecutorSaturatedError:
+            await asyncio.sleep(settings.STREAM_RETRY_MS / 1000.0)
+
+
+async def stream_predictions(request: Request, schema: Type[BaseModel], decoder: FeatureDecoder,
+                             model_name: str) -> AsyncIterator[bytes]:
+    """Score an NDJSON upload chunk by chunk, yielding NDJSON results in input order"""
+    queue = asyncio.Queue(maxsize=settings.STREAM_MAX_PENDING_CHUNKS)
+    reader = asyncio.ensure_future(_read_chunks(request, schema, queue))
+
+    try:
+        while True:
+            if reader.done():
+                # Raises if the body could not be read; otherwise drain what is queued
+                reader.result()
+                chunk = await queue.get()
+            else:
+                # Surface reader failures instead of waiting forever on the queue
+                get = asyncio.ensure_future(queue.get())
+                await asyncio.wait({get, reader}, return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    get.cancel()
+                    continue
+                chunk = get.result()
+            if chunk is None:
+                break
+
+            rows, errors = chunk
+            results = [
+                {"row": i, "error": message} for i, message in errors
+            ]
+            if rows:
+                X = decoder.acquire(len(rows))
+                try:
+                    decoder.decode_many([obj for _, obj in rows], out=X)
+                    (pred_class, pred_proba), version = await _predict_with_backpressure(model_name, X)
+                finally:
+                    decoder.release(X)
+                results.extend(
+                    {"row": i, "is_fraud": bool(c), "probability": float(p), "model_version": version}
+                    for (i, _), c, p in zip(rows, pred_class, pred_proba)
+                )
+            results.sort(key=lambda result: result["row"])
+            yield "".join(json.dumps(result) + "\n" for result in results).encode()
+    except Exception as e:
+        logger.error(f"Streaming prediction error: {str(e)}")
+        yield (json.dumps({"error": str(e)}) + "\n").encode()
+    finally:
+        reader.cancel()
@@ -1,11 +1,19 @@
+import joblib
+import numpy as np
+import pandas as pd
 from datetime import datetime
+from typing import Any, Dict, Mapping, Sequence, Union
+from config.settings import settings
+
+# Inputs of the scaler and PCA, in order
+BASE_FEATURES = ['amount_log', 'is_foreign', 'merchant_risk', 'is_night']
 
 class TransactionFeatureEngineer:
     def __init__(self):
         # Load any pre-trained transformers
         self.scaler = joblib.load(settings.SCALER_PATH)
         self.pca = joblib.load(settings.PCA_PATH)
-        
+
         # Merchant risk profiles
         self.merchant_risk = {
             'gas_station': 1.2,
@@ -14,45 +22,55 @@ class TransactionFeatureEngineer:
             'travel': 2.0,
             'groceries': 0.8
         }
+        # The same profiles as a code table: codes index the risks, and code -1
+        # (an unlisted merchant type) picks the trailing default of 1.0
+        self._merchant_types = pd.Index(list(self.merchant_risk))
+        self._merchant_risk_table = np.append(np.fromiter(self.merchant_risk.values(), dtype=np.float64), 1.0)
 
     def engineer_features(self, transaction_data: dict) -> dict:
         """Convert raw transaction data to V1-V28 features"""
-        # 1. Basic features
-        features = {
-            'time': self._get_transaction_time(),
-            'amount': transaction_data['amount'],
-            'amount_log': np.log1p(transaction_data['amount']),
-            'is_foreign': int(transaction_data['country'] != 'US'),
-            'merchant_risk': self.merchant_risk.get(
-                transaction_data['merchant_type'], 1.0),
-            'is_night': int(0 <= datetime.now().hour < 6),
-            'customer_history': transaction_data.get('customer_history', 0)
+        batch = {
+            'amount': [transaction_data['amount']],
+            'country': [transaction_data['country']],
+            'merchant_type': [transaction_data['merchant_type']]
         }
+        features = self.engineer_features_batch(batch, timestamps=[datetime.now()])
+        # Python scalars, so the result serialises with plain json as before
+        return {name: values[0].item() for name, values in features.items()}
+
+    def engineer_features_batch(self, batch: Union[pd.DataFrame, Mapping[str, Sequence[Any]]],
+                                timestamps: Sequence[Any] = None) -> Union[pd.DataFrame, Dict[str, np.ndarray]]:
+        """Convert a columnar batch of raw transactions to Time, Amount and V1-V28.
+
+        ``batch`` is a DataFrame or a mapping of column name to array with
+        ``amount``, ``country`` and ``merchant_type``. Each row's time comes
+        from ``timestamps``, else the batch's ``timestamp`` column, else the
+        current time. All features are computed column-wise and the scaler
+        and PCA run once for the whole batch. Returns a DataFrame for a
+        DataFrame batch, otherwise a dict of arrays.
+        """
+        amount = np.asarray(batch['amount'], dtype=np.float64)
+        n_rows = len(amount)
+        if timestamps is None:
+            timestamps = batch['timestamp'] if 'timestamp' in batch else [datetime.now()] * n_rows
+        timestamps = pd.DatetimeIndex(pd.to_datetime(timestamps))
+        seconds_of_day = timestamps.hour * 3600 + timestamps.minute * 60 + timestamps.second
 
-        # 2. Create derived features
-        features.update({
-            'amount_per_hist': features['amount'] / (features['customer_history'] + 1),
-            'time_since_last': transaction_data.get('time_since_last', 0)
-        })
-
-        # 3. Normalize and transform to V features
-        base_features = pd.DataFrame([features])[['amount_log', 'is_foreign', 
-                                               'merchant_risk', 'is_night']]
-        
-        # Scale features
-        scaled = self.scaler.transform(base_features)
-        
-        # Apply PCA to get V features
-        v_features = self.pca.transform(scaled)
-        
-        # Create output dictionary
-        output = {'Time': features['time'], 'Amount': features['amount']}
+        merchant_codes = self._merchant_types.get_indexer(np.asarray(batch['merchant_type'], dtype=object))
+        base_features = pd.DataFrame({
+            'amount_log': np.log1p(amount),
+            'is_foreign': (np.asarray(batch['country'], dtype=object) != 'US').astype(np.int64),
+            'merchant_risk': self._merchant_risk_table[merchant_codes],
+            'is_night': (timestamps.hour < 6).astype(np.int64)
+        }, columns=BASE_FEATURES)
+
+        # One scaler and one PCA call for the whole batch
+        v_features = self.pca.transform(self.scaler.transform(base_features))
+
+        output = {'Time': np.asarray(seconds_of_day, dtype=np.int64), 'Amount': amount}
         for i in range(1, 29):
-            output[f'V{i}'] = v_features[0][i-1] if i-1 < len(v_features[0]) else 0.0
-        
-        return output
+            output[f'V{i}'] = v_features[:, i-1] if i-1 < v_features.shape[1] else np.zeros(n_rows)
 
-    def _get_transaction_time(self):
-        """Convert current time to seconds since first transaction of day"""
-        now = datetime.now()
-        return (now.hour * 3600 + now.minute * 60 + now.second)
\ No newline at end of file
+        if isinstance(batch, pd.DataFrame):
+            return pd.DataFrame(output, index=batch.index)
+        return output
@@ -0,0 +1,77 @@
+import zlib
+from typing import Any, Sequence
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
+
+# Description of the bucket function, for clients that encode rows themselves
+HASH_SCHEME = "crc32(utf8(value), start=crc32(utf8(column))) % buckets"
+
+
+class HashBuckets:
+    """Value -> bucket lookup for one column, with the ``.get`` of a code table.
+
+    Buckets come from a CRC32 of the value seeded with the column name, so
+    they are stable across processes and Python versions (unlike ``hash()``)
+    and the same value lands in unrelated buckets in different columns.
+    """
+
+    def __init__(self, column: str, n_buckets: int):
+        self.column = column
+        self.n_buckets = n_buckets
+        self._seed = zlib.crc32(column.encode())
+
+    def bucket(self, value: Any) -> int:
+        return zlib.crc32(str(value).encode(), self._seed) % self.n_buckets
+
+    def get(self, value: Any, default: Any = None) -> int:
+        return self.bucket(value)
+
+    def buckets(self, values: Sequence[Any]) -> np.ndarray:
+        """Buckets of many values, hashing each distinct value once"""
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+        table = np.fromiter((self.bucket(value) for value in uniques), dtype=np.int64, count=len(uniques))
+        return table[codes]
+
+
+class HashedEncoder(BaseEstimator, TransformerMixin):
+    """Sparse indicator encoding of high-cardinality columns into fixed buckets.
+
+    Each input column gets ``n_buckets`` output columns and every row has a
+    single 1 among them, so the output width, memory and transform time do
+    not grow with the number of distinct values. Distinct values that share
+    a bucket share its column. Output is a CSR matrix.
+    """
+
+    def __init__(self, columns: Sequence[str] = (), n_buckets: int = 256):
+        self.columns = columns
+        self.n_buckets = n_buckets
+
+    def fit(self, X, y=None):
+        self.n_features_in_ = np.shape(X)[1]
+        if len(self.columns) != self.n_features_in_:
+            raise ValueError(f"Expected {len(self.columns)} columns to hash, got {self.n_features_in_}")
+        self.hashers_ = [HashBuckets(column, self.n_buckets) for column in self.columns]
+        return self
+
+    def transform(self, X) -> sparse.csr_matrix:
+        values = X.to_numpy() if hasattr(X, 'to_numpy') else np.asarray(X, dtype=object)
+        n_rows = len(values)
+        # Column j of the input owns output columns [j * n_buckets, (j + 1) * n_buckets)
+        indices = np.empty((n_rows, len(self.hashers_)), dtype=np.int64)
+        for j, hasher in enumerate(self.hashers_):
+            indices[:, j] = hasher.buckets(values[:, j]) + j * self.n_buckets
+        return sparse.csr_matrix(
+            (np.ones(indices.size), indices.ravel(), np.arange(0, indices.size + 1, len(self.hashers_))),
+            shape=(n_rows, len(self.hashers_) * self.n_buckets)
+        )
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        return np.array([
+            f"{column}_bucket{i}" for column in self.columns for i in range(self.n_buckets)
+        ], dtype=object)
+
+    def code_tables(self) -> dict:
+        """Per-column bucket lookups for decoders"""
+        return {hasher.column: hasher for hasher in self.hashers_}
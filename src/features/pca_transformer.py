@@ -1,13 +1,99 @@
 # src/features/pca_transformer.py
 import joblib
+import logging
 import pandas as pd
 import numpy as np
+from pathlib import Path
+from typing import Callable, Iterable, Union
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import OneHotEncoder, RobustScaler
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
 from sklearn.impute import SimpleImputer
 from config.settings import settings
+from src.features.hashing import HashedEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledPCAMap:
+    """A fitted imputer -> RobustScaler -> one-hot -> PCA chain folded into one affine map.
+
+    Every step is affine, so the output is
+    ``(numeric - center) @ weights + bias + sum_j table[offset_j + code_j]``:
+    one float32 matmul over the numeric columns plus one gather of each
+    row's categories' (and hash buckets') precomputed contributions to the
+    components. The
+    table ends with a row of zeros that unknown categories (code -1) map
+    to, like ``handle_unknown='ignore'``.
+    """
+
+    def __init__(self, medians: np.ndarray, center: np.ndarray, weights: np.ndarray,
+                 bias: np.ndarray, tables: list):
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.center = np.asarray(center, dtype=np.float64)
+        self.weights = np.ascontiguousarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        sizes = [len(table) for table in tables]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        self.table = np.vstack(tables + [np.zeros((1, self.weights.shape[1]))]).astype(np.float32)
+
+    @classmethod
+    def from_pipeline(cls, pipeline: Pipeline) -> 'CompiledPCAMap':
+        preprocessor = pipeline.named_steps['preprocessor']
+        numeric_pipeline = preprocessor.named_transformers_['num']
+        imputer = numeric_pipeline.named_steps['imputer']
+        scaler = numeric_pipeline.named_steps['scaler']
+        onehot = preprocessor.named_transformers_['cat'].named_steps['encoder']
+        pca = pipeline.named_steps['pca']
+
+        n_numeric = len(imputer.statistics_)
+        components = pca.components_.T.astype(np.float64)  # (inputs, n_components)
+        if pca.whiten:
+            components = components / np.sqrt(pca.explained_variance_)
+        center = scaler.center_ if scaler.with_centering else np.zeros(n_numeric)
+        scale = scaler.scale_ if scaler.with_scaling else np.ones(n_numeric)
+
+        weights = components[:n_numeric] / scale[:, np.newaxis]
+        bias = -pca.mean_ @ components
+        tables = []
+        offset = n_numeric
+        sizes = [len(categories) for categories in onehot.categories_]
+        if 'hash' in preprocessor.named_transformers_:
+            hashed = preprocessor.named_transformers_['hash'].named_steps['encoder']
+            sizes += [hashed.n_buckets] * len(hashed.columns)
+        for size in sizes:
+            tables.append(components[offset:offset + size])
+            offset += size
+        return cls(imputer.statistics_, center, weights, bias, tables)
+
+    @property
+    def n_components(self) -> int:
+        return self.weights.shape[1]
+
+    def transform(self, X: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """Components of rows in the ``PCATransformer.transform_encoded`` layout, as float32.
+
+        ``out``, if given, is a C-contiguous float32 array of shape
+        (n_rows, n_components) that receives the result.
+        """
+        n_numeric = len(self.medians)
+        numeric = np.array(X[:, :n_numeric], dtype=np.float64)
+        missing = np.isnan(numeric)
+        if missing.any():
+            numeric[missing] = np.take(self.medians, np.nonzero(missing)[1])
+        # Centre in float64 before the float32 matmul, so large raw values keep their precision
+        numeric -= self.center
+        if out is None:
+            out = np.empty((len(X), self.n_components), dtype=np.float32)
+        np.matmul(numeric.astype(np.float32), self.weights, out=out)
+        out += self.bias
+        codes = X[:, n_numeric:].astype(np.int64)
+        index = np.where(codes >= 0, codes + self.offsets, len(self.table) - 1)
+        for j in range(index.shape[1]):
+            out += self.table.take(index[:, j], axis=0)
+        return out
+
 
 class PCATransformer:
     def __init__(self):
@@ -70,15 +156,26 @@ class PCATransformer:
             ('encoder', OneHotEncoder(handle_unknown='ignore', sparse_output=False))
         ])
 
-        preprocessor = ColumnTransformer([
+        transformers = [
             ('num', numeric_transformer, numeric_features),
             ('cat', categorical_transformer, categorical_features)
-        ])
+        ]
 
-        # Full pipeline with PCA
+        # High-cardinality identifiers go into a fixed number of hash buckets
+        hashed_features = list(settings.HASHED_FEATURES)
+        if hashed_features:
+            hashed_transformer = Pipeline([
+                ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
+                ('encoder', HashedEncoder(hashed_features, settings.HASH_BUCKETS))
+            ])
+            transformers.append(('hash', hashed_transformer, hashed_features))
+
+        preprocessor = ColumnTransformer(transformers)
+
+        # Full pipeline with PCA; ARPACK works on the sparse matrix hashing produces
         return Pipeline([
             ('preprocessor', preprocessor),
-            ('pca', PCA(n_components=self.n_components))
+            ('pca', PCA(n_components=self.n_components, svd_solver='arpack' if hashed_features else 'auto'))
         ])
 
     def fit(self, X: pd.DataFrame):
@@ -87,13 +184,229 @@ class PCATransformer:
         self.feature_names = [f'V{i}' for i in range(1, self.n_components+1)]
         return self
 
+    def fit_streaming(self, source: Union[str, Path, Callable[[], Iterable[pd.DataFrame]]],
+                      chunksize: int = None, rows: Callable[[pd.DataFrame], np.ndarray] = None):
+        """Fit the PCA transformer out of core, holding one chunk of rows at a time.
+
+        ``source`` is a CSV path, or a callable returning a fresh iterable of
+        DataFrame chunks (it is read twice). The first pass collects numeric
+        medians and quartiles in ``QuantileSketch``es and the category
+        vocabularies. The second pass one-hot encodes each chunk and feeds it
+        to an ``IncrementalPCA``. The fitted pipeline has the same steps and
+        interface as ``fit`` gives, with approximate quantiles.
+
+        ``rows``, if given, maps a chunk to a boolean mask of the rows to fit
+        on, e.g. to leave out a validation split.
+        """
+        from src.features.sketches import QuantileSketch
+
+        chunksize = chunksize or settings.PCA_FIT_CHUNKSIZE
+        if callable(source):
+            chunks = source
+        else:
+            def chunks():
+                return pd.read_csv(source, chunksize=chunksize)
+
+        numeric_features = self.numeric_features
+        categorical_features = self.categorical_features
+        sketches = {col: QuantileSketch() for col in numeric_features}
+        missing = dict.fromkeys(numeric_features, 0)
+        vocabularies = {col: set() for col in categorical_features}
+        n_rows = 0
+
+        # Pass 1: medians, quartiles and vocabularies
+        for chunk in chunks():
+            if rows is not None:
+                chunk = chunk[rows(chunk)]
+            n_rows += len(chunk)
+            for col in numeric_features:
+                values = chunk[col].to_numpy(dtype=np.float64)
+                sketches[col].update(values)
+                missing[col] += int(np.isnan(values).sum())
+            for col in categorical_features:
+                values = chunk[col]
+                vocabularies[col].update(values.dropna().unique())
+                if values.isna().any():
+                    vocabularies[col].add('missing')
+        if not n_rows:
+            raise ValueError(f"No rows to fit in {source}")
+
+        medians = np.array([sketches[col].quantile(0.5)[0] for col in numeric_features])
+        scaler = self.pipeline.named_steps['preprocessor'].transformers[0][1].named_steps['scaler']
+        quantile_range = np.array(scaler.quantile_range) / 100.0
+        quartiles = []
+        for col, median in zip(numeric_features, medians):
+            # The scaler sees imputed values, so missing ones count at the median
+            sketches[col].add(median, missing[col])
+            quartiles.append(sketches[col].quantile(quantile_range))
+        quartiles = np.array(quartiles)
+        scale = quartiles[:, 1] - quartiles[:, 0]
+        scale[scale == 0.0] = 1.0  # As RobustScaler does for constant columns
+
+        # Fit the preprocessor on a single placeholder row for its structure,
+        # then install the full-data statistics
+        categories = [sorted(vocabularies[col], key=str) for col in categorical_features]
+        self.pipeline.set_params(preprocessor__cat__encoder__categories=categories)
+        placeholder = pd.DataFrame(
+            [list(medians) + [values[0] for values in categories] + ['missing'] * len(self.hashed_features)],
+            columns=numeric_features + categorical_features + self.hashed_features
+        )
+        preprocessor = self.pipeline.named_steps['preprocessor']
+        preprocessor.fit(placeholder)
+        numeric_pipeline = preprocessor.named_transformers_['num']
+        numeric_pipeline.named_steps['imputer'].statistics_ = medians
+        fitted_scaler = numeric_pipeline.named_steps['scaler']
+        if fitted_scaler.with_centering:
+            fitted_scaler.center_ = medians
+        if fitted_scaler.with_scaling:
+            fitted_scaler.scale_ = scale
+
+        # Pass 2: incremental PCA, one encoded chunk at a time
+        pca = IncrementalPCA(n_components=self.n_components)
+        pending = None
+        for chunk in chunks():
+            if rows is not None:
+                chunk = chunk[rows(chunk)]
+            if not len(chunk):
+                continue
+            encoded = preprocessor.transform(chunk)
+            if hasattr(encoded, 'toarray'):
+                encoded = encoded.toarray()  # IncrementalPCA takes dense batches
+            # The first partial fit needs at least n_components rows
+            if pending is not None:
+                encoded = np.vstack([pending, encoded])
+                pending = None
+            if not hasattr(pca, 'components_') and len(encoded) < self.n_components:
+                pending = encoded
+                continue
+            pca.partial_fit(encoded)
+        if pending is not None:
+            pca.partial_fit(pending)
+        # fit() sets this but partial_fit() does not; transforming sparse rows reads it
+        pca.batch_size_ = chunksize
+
+        self.pipeline.steps[-1] = ('pca', pca)
+        self.feature_names = [f'V{i}' for i in range(1, self.n_components+1)]
+        logger.info(
+            f"Fitted PCA on {n_rows} rows in chunks of {chunksize}; "
+            f"{sum(len(v) for v in vocabularies.values())} categories"
+        )
+        return self
+
     def transform(self, X: pd.DataFrame) -> pd.DataFrame:
         """Transform data using fitted PCA model"""
         if not hasattr(self, 'feature_names'):
             raise ValueError("Transformer not fitted. Call fit() first.")
-        transformed = self.pipeline.transform(X)
+        if getattr(self, 'compiled_map', None) is not None:
+            transformed = self.compiled_map.transform(self.encode(X))
+        else:
+            transformed = self.pipeline.transform(X)
         return pd.DataFrame(transformed, columns=self.feature_names)
 
+    def compile(self) -> None:
+        """Serve ``transform``/``transform_encoded`` from a ``CompiledPCAMap``"""
+        self.compiled_map = CompiledPCAMap.from_pipeline(self.pipeline)
+
+    def encode(self, X: pd.DataFrame) -> np.ndarray:
+        """Rows of a raw frame in the ``transform_encoded`` layout"""
+        numeric = X[self.numeric_features].to_numpy(dtype=np.float64)
+        categories, hashers = self.get_categories(), self.get_hashers()
+        codes = np.empty((len(X), len(categories) + len(hashers)), dtype=np.float64)
+        for j, col in enumerate(list(categories) + list(hashers)):
+            # Missing values are imputed as the 'missing' category before encoding
+            values = X[col].astype(object).where(X[col].notna(), 'missing')
+            if col in hashers:
+                codes[:, j] = hashers[col].buckets(values.to_numpy())
+            else:
+                codes[:, j] = pd.Categorical(values, categories=categories[col]).codes
+        return np.hstack([numeric, codes])
+
+    @property
+    def numeric_features(self) -> list:
+        """Numeric input columns, in the order the pipeline consumes them"""
+        return list(self.pipeline.named_steps['preprocessor'].transformers[0][2])
+
+    @property
+    def categorical_features(self) -> list:
+        """Categorical input columns, in the order the pipeline consumes them"""
+        return list(self.pipeline.named_steps['preprocessor'].transformers[1][2])
+
+    @property
+    def hashed_features(self) -> list:
+        """Hashed input columns, in the order the pipeline consumes them (empty for older artifacts)"""
+        for name, _, columns in self.pipeline.named_steps['preprocessor'].transformers:
+            if name == 'hash':
+                return list(columns)
+        return []
+
+    def get_hashers(self) -> dict:
+        """Fitted value -> bucket lookups per hashed column"""
+        preprocessor = self.pipeline.named_steps['preprocessor']
+        if 'hash' not in getattr(preprocessor, 'named_transformers_', {}):
+            return {}
+        return preprocessor.named_transformers_['hash'].named_steps['encoder'].code_tables()
+
+    def get_categories(self) -> dict:
+        """Fitted one-hot categories per categorical column"""
+        onehot = self.pipeline.named_steps['preprocessor'].named_transformers_['cat'].named_steps['encoder']
+        return {
+            col: list(categories)
+            for col, categories in zip(self.categorical_features, onehot.categories_)
+        }
+
+    def transform_encoded(self, X: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """Transform pre-encoded rows without going through pandas.
+
+        ``X`` holds the numeric, categorical and hashed features, in
+        ``numeric_features + categorical_features + hashed_features`` order.
+        Categorical values are integer codes into ``get_categories()``;
+        negative codes are unknown categories and encode to all zeros, like
+        ``handle_unknown='ignore'``. Hashed values are buckets from
+        ``get_hashers()``. ``out`` is an optional float32
+        (n_rows, n_components) buffer for the result.
+        """
+        if getattr(self, 'compiled_map', None) is not None:
+            return self.compiled_map.transform(X, out=out)
+
+        preprocessor = self.pipeline.named_steps['preprocessor']
+        numeric_pipeline = preprocessor.named_transformers_['num']
+        imputer = numeric_pipeline.named_steps['imputer']
+        scaler = numeric_pipeline.named_steps['scaler']
+        onehot = preprocessor.named_transformers_['cat'].named_steps['encoder']
+
+        n_numeric = len(self.numeric_features)
+        numeric = np.array(X[:, :n_numeric], dtype=np.float64)
+        codes = X[:, n_numeric:].astype(np.int64)
+
+        # Median imputation and robust scaling
+        missing = np.isnan(numeric)
+        if missing.any():
+            numeric[missing] = np.take(imputer.statistics_, np.nonzero(missing)[1])
+        if scaler.with_centering:
+            numeric -= scaler.center_
+        if scaler.with_scaling:
+            numeric /= scaler.scale_
+
+        # One-hot encode directly from the codes (hash buckets included)
+        sizes = [len(categories) for categories in onehot.categories_]
+        sizes += [hasher.n_buckets for hasher in self.get_hashers().values()]
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        encoded = np.zeros((X.shape[0], sum(sizes)), dtype=np.float64)
+        rows, cols = np.nonzero(codes >= 0)
+        encoded[rows, offsets[cols] + codes[rows, cols]] = 1.0
+
+        transformed = self.pipeline.named_steps['pca'].transform(np.hstack([numeric, encoded]))
+        if out is None:
+            return transformed
+        out[...] = transformed
+        return out
+
+    def __getstate__(self):
+        # The compiled map is rebuilt from the pipeline on load
+        state = dict(self.__dict__)
+        state.pop('compiled_map', None)
+        return state
+
     def save(self, path=None):
         """Save the trained transformer"""
         path = path or settings.MODEL_DIR / "pca_transformer.joblib"
@@ -123,6 +436,9 @@ class PCATransformer:
         
         # Combine all original feature names
         original_feature_names = list(numeric_features) + list(categorical_onehot_names)
+        if 'hash' in self.pipeline.named_steps['preprocessor'].named_transformers_:
+            hashed = self.pipeline.named_steps['preprocessor'].named_transformers_['hash'].named_steps['encoder']
+            original_feature_names += list(hashed.get_feature_names_out())
         
         # Create DataFrame showing how original features map to PCA components
         components_df = pd.DataFrame(
@@ -0,0 +1,70 @@
+import numpy as np
+
+
+class QuantileSketch:
+    """Streaming quantile sketch with bounded memory (a KLL-style compactor stack).
+
+    Level ``h`` holds items that each stand for ``2**h`` input values. When a
+    level grows past ``k`` items it is sorted and every other item, starting
+    at a random offset, moves up one level. Memory stays around
+    ``k * log2(n / k)`` items however many values are added, and the rank
+    error of a quantile is a small multiple of ``1 / k``. NaNs are ignored.
+    """
+
+    def __init__(self, k: int = 4096, seed: int = 0):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compact()
+
+    def add(self, value: float, count: int) -> None:
+        """Add ``count`` copies of ``value`` without materialising them"""
+        self.count += count
+        level = 0
+        while count:
+            if count & 1:
+                self._level(level)
+                self.levels[level] = np.append(self.levels[level], value)
+            count >>= 1
+            level += 1
+        self._compact()
+
+    def _level(self, level: int) -> None:
+        while len(self.levels) <= level:
+            self.levels.append(np.empty(0))
+
+    def _compact(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.k:
+                items = np.sort(items)
+                # An odd item out stays at this level, so no weight is lost
+                leftover, items = items[len(items) - len(items) % 2:], items[:len(items) - len(items) % 2]
+                self._level(level + 1)
+                self.levels[level] = leftover
+                self.levels[level + 1] = np.concatenate(
+                    [self.levels[level + 1], items[self._rng.integers(2)::2]]
+                )
+            level += 1
+
+    def quantile(self, q) -> np.ndarray:
+        """Approximate quantiles (``q`` in [0, 1]); NaN if nothing was added"""
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if not self.count:
+            return np.full(len(q), np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, weights = items[order], weights[order]
+        # 0-based rank at the middle of each item's weight; with unit weights this
+        # is np.quantile's default linear interpolation, exact until the first compaction
+        ranks = np.cumsum(weights) - weights + (weights - 1) / 2
+        return np.interp(q * (weights.sum() - 1), ranks, items)
@@ -1,15 +1,110 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import joblib
 import numpy as np
 import pandas as pd
-import tensorflow as tf
-from tensorflow.keras.models import Sequential, Model
-from tensorflow.keras.layers import Dense, Dropout, BatchNormalization
-from tensorflow.keras.optimizers import Adam
-from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau, ModelCheckpoint
-from sklearn.ensemble import RandomForestClassifier
-from xgboost import XGBClassifier
-import lightgbm as lgb
-from typing import Tuple, List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Tuple, List, Dict, Any, Optional
 from config.settings import settings
+from src.monitoring.metrics import MEMBER_LATENCY, ENSEMBLE_LATENCY, CASCADE_EXITS
+
+logger = logging.getLogger(__name__)
+
+# Threads dedicated to evaluating members concurrently, shared by every model
+# in the process so concurrent requests cannot multiply them
+_member_pool = None
+_member_pool_lock = threading.Lock()
+
+
+def get_member_pool() -> ThreadPoolExecutor:
+    global _member_pool
+    with _member_pool_lock:
+        if _member_pool is None:
+            _member_pool = ThreadPoolExecutor(
+                max_workers=max(settings.MEMBER_POOL_SIZE, 1), thread_name_prefix="member"
+            )
+        return _member_pool
+
+
+# Inspects the loaded BLAS libraries once; each member call then only sets their thread counts
+_blas_controller = None
+
+
+def get_blas_controller():
+    global _blas_controller
+    if _blas_controller is None:
+        from threadpoolctl import ThreadpoolController
+        _blas_controller = ThreadpoolController()
+    return _blas_controller
+
+
+# Members trained by train_ensemble, slowest first so parallel workers finish together
+ENSEMBLE_MEMBERS = ('mlp', 'rf', 'xgb', 'lgb')
+
+
+def _training_fingerprint(*parts) -> str:
+    """Short digest of the training data, naming its checkpoint directory"""
+    digest = hashlib.sha256()
+    for part in parts:
+        frame = pd.DataFrame(part)
+        digest.update(str(list(frame.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=False).values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _save_member(member: Any, path: Path) -> None:
+    """Write a trained member, then the digest that marks its artifact complete"""
+    tmp_path = path.with_suffix('.tmp')
+    joblib.dump(member, tmp_path)
+    digest = _file_digest(tmp_path)
+    os.replace(tmp_path, path)
+    path.with_suffix('.sha256').write_text(digest)
+
+
+def _load_member(path: Path) -> Optional[Any]:
+    """A member saved by ``_save_member``, or None if it is missing or incomplete"""
+    digest_path = path.with_suffix('.sha256')
+    if not path.exists() or not digest_path.exists():
+        return None
+    try:
+        if _file_digest(path) != digest_path.read_text().strip():
+            raise ValueError("digest mismatch")
+        return joblib.load(path)
+    except Exception as e:
+        logger.warning(f"Ignoring checkpoint {path}: {str(e)}")
+        return None
+
+
+def _train_member_process(name: str, data_path: str, run_dir: str, threads: int) -> str:
+    """Train and save one member in a training worker process"""
+    logging.basicConfig(level=logging.INFO)
+    X_train, y_train, X_val, y_val = joblib.load(data_path, mmap_mode='r')
+    member = FraudDetectionModel().train_member(
+        name, X_train, y_train, X_val, y_val, threads=threads,
+        backup_dir=Path(run_dir) / f"{name}.backup"
+    )
+    _save_member(member, Path(run_dir) / f"{name}.joblib")
+    return name
+
+# TensorFlow, XGBoost and LightGBM are imported inside the methods that build
+# models. Unpickling a saved ensemble imports whichever frameworks its members
+# actually use, so serving never pays for a framework it does not need.
+# ``export_for_serving`` replaces the Keras MLP with NumPy weights, so a
+# serving artifact does not need TensorFlow at all.
 
 class FraudDetectionModel:
     def __init__(self):
@@ -17,8 +112,12 @@ class FraudDetectionModel:
         self.model_weights = {}
         
     def create_mlp_model(self, input_dim: int, neurons: List[int] = [128, 64], 
-                        dropout_rate: float = 0.3, learning_rate: float = 0.001) -> Sequential:
+                        dropout_rate: float = 0.3, learning_rate: float = 0.001) -> 'Sequential':
         """Create a simple MLP model"""
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import Dense, Dropout, BatchNormalization
+        from tensorflow.keras.optimizers import Adam
+        
         model = Sequential([
             Dense(neurons[0], activation='relu', input_shape=(input_dim,)),
             BatchNormalization(),
@@ -39,8 +138,10 @@ class FraudDetectionModel:
         
         return model
     
-    def create_random_forest(self, n_estimators: int = 100, class_weight: str = 'balanced') -> RandomForestClassifier:
+    def create_random_forest(self, n_estimators: int = 100, class_weight: str = 'balanced') -> 'RandomForestClassifier':
         """Create a Random Forest classifier"""
+        from sklearn.ensemble import RandomForestClassifier
+        
         return RandomForestClassifier(
             n_estimators=n_estimators,
             random_state=42,
@@ -49,8 +150,10 @@ class FraudDetectionModel:
         )
     
     def create_xgboost(self, n_estimators: int = 100, learning_rate: float = 0.1, 
-                      max_depth: int = 5, scale_pos_weight: float = None) -> XGBClassifier:
+                      max_depth: int = 5, scale_pos_weight: float = None) -> 'XGBClassifier':
         """Create an XGBoost classifier"""
+        from xgboost import XGBClassifier
+        
         return XGBClassifier(
             n_estimators=n_estimators,
             learning_rate=learning_rate,
@@ -62,8 +165,10 @@ class FraudDetectionModel:
         )
     
     def create_lightgbm(self, n_estimators: int = 100, learning_rate: float = 0.1, 
-                       num_leaves: int = 31, class_weight: str = 'balanced') -> lgb.LGBMClassifier:
+                       num_leaves: int = 31, class_weight: str = 'balanced') -> 'lgb.LGBMClassifier':
         """Create a LightGBM classifier"""
+        import lightgbm as lgb
+        
         return lgb.LGBMClassifier(
             n_estimators=n_estimators,
             learning_rate=learning_rate,
@@ -72,37 +177,122 @@ class FraudDetectionModel:
             random_state=42
         )
     
+    def train_member(self, name: str, X_train: pd.DataFrame, y_train: pd.Series,
+                     X_val: pd.DataFrame, y_val: pd.Series, threads: int = None,
+                     backup_dir: Path = None) -> Any:
+        """Build and fit one ensemble member.
+
+        ``threads`` caps the member's own parallelism. The MLP backs up its
+        training state to ``backup_dir`` after every epoch and resumes from it
+        if a previous attempt was interrupted.
+        """
+        if name == 'mlp':
+            import tensorflow as tf
+            from tensorflow.keras.callbacks import BackupAndRestore
+            
+            if threads:
+                try:
+                    tf.config.threading.set_intra_op_parallelism_threads(threads)
+                    tf.config.threading.set_inter_op_parallelism_threads(1)
+                except RuntimeError:
+                    pass  # TensorFlow already started in this process
+            callbacks = [BackupAndRestore(str(backup_dir))] if backup_dir is not None else []
+            model = self.create_mlp_model(X_train.shape[1])
+            model.fit(
+                X_train, y_train,
+                validation_data=(X_val, y_val),
+                epochs=50,
+                batch_size=256,
+                callbacks=callbacks,
+                verbose=1
+            )
+            return model
+        
+        if name == 'rf':
+            model = self.create_random_forest()
+        elif name == 'xgb':
+            scale_pos_weight = sum(y_train == 0) / sum(y_train == 1)
+            model = self.create_xgboost(scale_pos_weight=scale_pos_weight)
+        elif name == 'lgb':
+            model = self.create_lightgbm()
+        else:
+            raise ValueError(f"Unknown ensemble member '{name}'")
+        if threads:
+            model.set_params(n_jobs=threads)
+        model.fit(X_train, y_train)
+        return model
+    
     def train_ensemble(self, X_train: pd.DataFrame, y_train: pd.Series, 
-                      X_val: pd.DataFrame, y_val: pd.Series) -> None:
-        """Train an ensemble of models"""
-        input_dim = X_train.shape[1]
-        
-        # Train MLP
-        mlp_model = self.create_mlp_model(input_dim)
-        mlp_model.fit(
-            X_train, y_train,
-            validation_data=(X_val, y_val),
-            epochs=50,
-            batch_size=256,
-            verbose=1
+                      X_val: pd.DataFrame, y_val: pd.Series,
+                      checkpoint_dir: Path = None, workers: int = None) -> None:
+        """Train an ensemble of models.
+
+        Members train concurrently in ``workers`` spawned processes (default
+        ``TRAINING_WORKERS``; 1 trains them one by one in this process) that
+        split ``TRAINING_CPUS`` cores between them. Each finished member is
+        saved under ``checkpoint_dir`` in a directory keyed by a fingerprint
+        of the data, so a rerun after a failure only trains the members that
+        are missing. The directory is removed once the ensemble is complete.
+        """
+        cpus = settings.TRAINING_CPUS or os.cpu_count() or 1
+        workers = settings.TRAINING_WORKERS if workers is None else workers
+        workers = max(min(workers or cpus, len(ENSEMBLE_MEMBERS)), 1)
+        run_dir = Path(checkpoint_dir or settings.TRAINING_CHECKPOINT_DIR) / _training_fingerprint(
+            X_train, y_train, X_val, y_val
         )
-        self.models['mlp'] = mlp_model
+        run_dir.mkdir(parents=True, exist_ok=True)
         
-        # Train Random Forest
-        rf_model = self.create_random_forest()
-        rf_model.fit(X_train, y_train)
-        self.models['rf'] = rf_model
+        trained = {}
+        for name in ENSEMBLE_MEMBERS:
+            member = _load_member(run_dir / f"{name}.joblib")
+            if member is not None:
+                logger.info(f"Reusing {name} trained earlier from {run_dir}")
+                trained[name] = member
+        pending = [name for name in ENSEMBLE_MEMBERS if name not in trained]
+        threads = max(cpus // min(workers, max(len(pending), 1)), 1)
         
-        # Train XGBoost
-        scale_pos_weight = sum(y_train == 0) / sum(y_train == 1)
-        xgb_model = self.create_xgboost(scale_pos_weight=scale_pos_weight)
-        xgb_model.fit(X_train, y_train)
-        self.models['xgb'] = xgb_model
+        failed = {}
+        if workers == 1:
+            for name in pending:
+                logger.info(f"Training {name} with {threads} threads")
+                try:
+                    member = self.train_member(name, X_train, y_train, X_val, y_val, threads=threads,
+                                               backup_dir=run_dir / f"{name}.backup")
+                    _save_member(member, run_dir / f"{name}.joblib")
+                    trained[name] = member
+                except Exception as e:
+                    logger.error(f"Training {name} failed: {str(e)}")
+                    failed[name] = e
+        elif pending:
+            # Workers memory-map one copy of the data instead of each unpickling their own
+            data_path = run_dir / "data.joblib"
+            joblib.dump((X_train, y_train, X_val, y_val), data_path)
+            # Spawned, not forked: TensorFlow does not survive fork()
+            context = multiprocessing.get_context("spawn")
+            logger.info(f"Training {pending} in {workers} processes with {threads} threads each")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = {
+                    pool.submit(_train_member_process, name, str(data_path), str(run_dir), threads): name
+                    for name in pending
+                }
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        future.result()
+                        trained[name] = _load_member(run_dir / f"{name}.joblib")
+                        if trained[name] is None:
+                            raise RuntimeError(f"{name} artifact is missing or incomplete")
+                        logger.info(f"Trained {name}")
+                    except Exception as e:
+                        logger.error(f"Training {name} failed: {str(e)}")
+                        failed[name] = e
         
-        # Train LightGBM
-        lgb_model = self.create_lightgbm()
-        lgb_model.fit(X_train, y_train)
-        self.models['lgb'] = lgb_model
+        if failed:
+            raise RuntimeError(
+                f"Training failed for {sorted(failed)}; the other members are saved in "
+                f"{run_dir} and a rerun on the same data will only train the failed ones"
+            )
+        self.models = {name: trained[name] for name in ENSEMBLE_MEMBERS}
         
         # Initialize weights (can be optimized later)
         self.model_weights = {
@@ -111,37 +301,243 @@ class FraudDetectionModel:
             'xgb': 0.25,
             'lgb': 0.25
         }
+        shutil.rmtree(run_dir, ignore_errors=True)
     
-    def predict(self, X: pd.DataFrame, threshold: float = None) -> Tuple[np.ndarray, np.ndarray]:
-        """Make predictions using the ensemble"""
-        if threshold is None:
-            threshold = settings.THRESHOLD
+    def compile_trees(self) -> None:
+        """Serve the tree members from compiled node tables (see ``tree_compiler``)"""
+        from src.models.tree_compiler import compile_tree_model, TreeCompileError
         
-        # Get predictions from each model
-        predictions = {}
+        self.compiled_members = getattr(self, 'compiled_members', {})
         for name, model in self.models.items():
-            if hasattr(model, 'predict_proba'):
-                predictions[name] = model.predict_proba(X)[:, 1]
-            else:
-                predictions[name] = model.predict(X).ravel()
+            try:
+                compiled = compile_tree_model(model)
+            except TreeCompileError as e:
+                logger.warning(f"Serving {name} with its own library: {str(e)}")
+                continue
+            if compiled is not None:
+                self.compiled_members[name] = compiled
+    
+    def compile_mlp(self) -> None:
+        """Serve Keras members with a NumPy forward pass (see ``numpy_mlp``)"""
+        from src.models.numpy_mlp import export_keras_mlp, is_keras_model, MLPExportError
         
-        # Weighted average
-        ensemble_pred = np.zeros_like(predictions['mlp'])
-        for name, pred in predictions.items():
-            ensemble_pred += self.model_weights[name] * pred
+        self.compiled_members = getattr(self, 'compiled_members', {})
+        for name, model in self.models.items():
+            if not is_keras_model(model):
+                continue
+            try:
+                self.compiled_members[name] = export_keras_mlp(model)
+            except MLPExportError as e:
+                logger.warning(f"Serving {name} with TensorFlow: {str(e)}")
+    
+    def compile_members(self) -> None:
+        """Compile the members enabled by ``COMPILE_TREE_MEMBERS``/``COMPILE_MLP_MEMBERS``"""
+        if settings.COMPILE_TREE_MEMBERS:
+            self.compile_trees()
+        if settings.COMPILE_MLP_MEMBERS:
+            self.compile_mlp()
+    
+    def apply_thread_budgets(self) -> Dict[str, int]:
+        """Cap the threads each member uses, so concurrent members do not oversubscribe the CPUs.
+
+        Budgets come from ``MEMBER_THREADS``; with ``PARALLEL_MEMBERS`` the
+        members not listed get an equal share of the CPUs. Library models
+        take their budget as ``n_jobs``. A NumPy MLP takes it as a BLAS
+        thread limit set around each of its calls only, since BLAS thread
+        pools are process-wide and a lasting limit would also throttle the
+        PCA transform and other members. Returns the budgets applied.
+        """
+        from src.models.numpy_mlp import NumpyMLP
+        
+        budgets = dict(settings.MEMBER_THREADS)
+        if settings.PARALLEL_MEMBERS:
+            share = max((os.cpu_count() or 1) // max(len(self.models), 1), 1)
+            for name in self.models:
+                budgets.setdefault(name, share)
+        
+        applied = {}
+        self.blas_limits = {}
+        for name, threads in budgets.items():
+            model = self.models.get(name)
+            if model is None:
+                continue
+            if hasattr(model, 'get_params') and 'n_jobs' in model.get_params():
+                model.set_params(n_jobs=threads)
+                applied[name] = threads
+            if isinstance(getattr(self, 'compiled_members', {}).get(name, model), NumpyMLP):
+                self.blas_limits[name] = threads
+                applied[name] = threads
+        if applied:
+            logger.info(f"Member thread budgets: {applied}")
+        return applied
+    
+    def export_for_serving(self) -> 'FraudDetectionModel':
+        """Copy of the ensemble with Keras members replaced by ``NumpyMLP`` weights.
+
+        The copy unpickles and predicts without TensorFlow, but cannot be
+        trained further. Raises ``MLPExportError`` if a member cannot be exported.
+        """
+        from src.models.numpy_mlp import export_keras_mlp, is_keras_model
+        
+        exported = FraudDetectionModel()
+        exported.models = {
+            name: export_keras_mlp(model) if is_keras_model(model) else model
+            for name, model in self.models.items()
+        }
+        exported.model_weights = dict(self.model_weights)
+        return exported
+    
+    def _member_proba(self, name: str, X) -> np.ndarray:
+        """Fraud probability of one ensemble member"""
+        model = getattr(self, 'compiled_members', {}).get(name, self.models[name])
+        start = time.perf_counter()
+        if hasattr(model, 'predict_proba'):
+            proba = model.predict_proba(X)[:, 1]
+        elif name in getattr(self, 'blas_limits', {}):
+            with get_blas_controller().limit(limits=self.blas_limits[name], user_api='blas'):
+                proba = model.predict(X).ravel()
+        else:
+            proba = model.predict(X).ravel()
+        MEMBER_LATENCY.observe_since(start, name)
+        return proba
+    
+    def _predict_members(self, members: List[str], X) -> Dict[str, np.ndarray]:
+        """Probabilities of each of ``members``, concurrently on the member pool if enabled.
+
+        Each member computes exactly what it would sequentially, and the
+        callers sum them in ensemble order, so both modes give bit-identical
+        scores.
+        """
+        start = time.perf_counter()
+        if (settings.PARALLEL_MEMBERS and len(members) > 1
+                and len(X) >= settings.PARALLEL_MEMBERS_MIN_ROWS):
+            pool = get_member_pool()
+            futures = {name: pool.submit(self._member_proba, name, X) for name in members}
+            predictions = {name: future.result() for name, future in futures.items()}
+            ENSEMBLE_LATENCY.observe_since(start, "parallel")
+        else:
+            predictions = {name: self._member_proba(name, X) for name in members}
+            ENSEMBLE_LATENCY.observe_since(start, "sequential")
+        return predictions
+    
+    def _combine(self, predictions: Dict[str, np.ndarray]) -> np.ndarray:
+        """Weighted average of member probabilities, renormalised over the members present"""
+        members = [name for name in self.models if name in predictions]
+        total_weight = sum(self.model_weights[name] for name in members)
+        ensemble_pred = np.zeros_like(predictions[members[0]])
+        for name in members:
+            ensemble_pred += self.model_weights[name] / total_weight * predictions[name]
+        return ensemble_pred
+    
+    def score(self, X: np.ndarray, out: np.ndarray = None, members: List[str] = None,
+              cascade: bool = None) -> np.ndarray:
+        """Weighted-average fraud probabilities as float32, array in and array out.
+
+        ``X`` is converted once to a C-contiguous float32 array (no copy if
+        it already is one) that every member reads. The average is
+        accumulated into ``out``, a float32 array of ``len(X)``, when given.
+        No pandas objects are created. ``members`` and ``cascade`` are as
+        for ``predict``.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if out is None:
+            out = np.empty(len(X), dtype=np.float32)
+        if cascade is None:
+            cascade = settings.ENABLE_CASCADE and members is None
+        if cascade:
+            out[:] = self.predict_cascade(X)[0]
+            return out
+        
+        if members is None:
+            members = list(self.models)
+        missing = [name for name in members if name not in self.models]
+        if missing:
+            raise ValueError(f"Ensemble has no members named {missing}")
+        
+        predictions = self._predict_members(members, X)
+        total_weight = sum(self.model_weights[name] for name in members)
+        out.fill(0.0)
+        for name in self.models:
+            if name in predictions:
+                out += np.float32(self.model_weights[name] / total_weight) * predictions[name]
+        return out
+    
+    def predict(self, X: pd.DataFrame, threshold: float = None,
+                members: List[str] = None, cascade: bool = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Make predictions using the ensemble, or only the named ``members`` of it.
+
+        Probabilities come from ``score``, or with ``cascade`` (default
+        ``settings.ENABLE_CASCADE`` when no members are named) from
+        ``predict_cascade``. DataFrames are accepted for convenience.
+        """
+        if threshold is None:
+            threshold = settings.THRESHOLD
+        if cascade is None:
+            cascade = settings.ENABLE_CASCADE and members is None
+        
+        if cascade:
+            ensemble_pred, _ = self.predict_cascade(X, threshold=threshold)
+        else:
+            ensemble_pred = self.score(X, members=members, cascade=False)
         
         # Apply threshold
         ensemble_class = (ensemble_pred > threshold).astype(int)
         
         return ensemble_class, ensemble_pred
     
+    def predict_cascade(self, X: pd.DataFrame, threshold: float = None, band: float = None,
+                        order: List[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Score members in ``order``, letting confident rows exit early.
+
+        After each stage a row's score is the weighted average of the members
+        it has been through so far. Rows whose score is more than ``band``
+        away from ``threshold`` stop there; only the rest are passed to the
+        next (slower) member. Rows that reach the last stage get the same
+        weighted average as ``predict``. Members missing from ``order`` run last.
+
+        Returns the probabilities and, per row, the index in the stage order
+        after which it exited. Exit counts are added to ``CASCADE_EXITS``.
+        """
+        threshold = settings.THRESHOLD if threshold is None else threshold
+        band = settings.CASCADE_BAND if band is None else band
+        order = [name for name in (order or settings.CASCADE_ORDER) if name in self.models]
+        order += [name for name in self.models if name not in order]
+        
+        n_rows = len(X)
+        scores = np.zeros(n_rows, dtype=np.float64)
+        exit_stage = np.full(n_rows, len(order) - 1)
+        active = np.arange(n_rows)
+        predictions = {}
+        
+        for stage, name in enumerate(order):
+            if not len(active):
+                break
+            X_active = X.iloc[active] if hasattr(X, 'iloc') else X[active]
+            proba = self._member_proba(name, X_active)
+            predictions[name] = np.zeros(n_rows, dtype=proba.dtype)
+            predictions[name][active] = proba
+            partial = self._combine({member: predictions[member][active] for member in predictions})
+            
+            if stage == len(order) - 1:
+                scores[active] = partial
+                CASCADE_EXITS.inc(name, amount=len(active))
+                break
+            
+            confident = np.abs(partial - threshold) > band
+            exited = active[confident]
+            scores[exited] = partial[confident]
+            exit_stage[exited] = stage
+            CASCADE_EXITS.inc(name, amount=len(exited))
+            active = active[~confident]
+        
+        return scores, exit_stage
+    
     def save(self, filepath: str = None) -> None:
         """Save the model to disk"""
         if filepath is None:
             filepath = settings.MODEL_PATH
         
         # For simplicity, we'll save the whole object (in practice, save each model separately)
-        import joblib
         joblib.dump(self, filepath)
     
     @classmethod
@@ -150,7 +546,16 @@ class FraudDetectionModel:
         if filepath is None:
             filepath = settings.MODEL_PATH
         
-        import joblib
-        return joblib.load(filepath)
+        model = joblib.load(filepath)
+        model.compile_members()
+        model.apply_thread_budgets()
+        return model
+    
+    def __getstate__(self):
+        # Compiled members are rebuilt from the library models on load
+        state = dict(self.__dict__)
+        state.pop('compiled_members', None)
+        state.pop('blas_limits', None)
+        return state
     
     
\ No newline at end of file
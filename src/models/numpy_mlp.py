@@ -0,0 +1,130 @@
+import logging
+from typing import Any, List, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0, out=x),
+    "tanh": lambda x: np.tanh(x, out=x),
+    # exp(-log(1 + exp(-x))) never overflows, unlike 1 / (1 + exp(-x))
+    "sigmoid": lambda x: np.exp(-np.logaddexp(0, -x)),
+}
+
+# Layers that are the identity at inference time
+INFERENCE_NOOP_LAYERS = ("InputLayer", "Dropout", "GaussianNoise", "GaussianDropout", "AlphaDropout")
+
+
+class MLPExportError(ValueError):
+    """Raised for a Keras model the exporter cannot represent exactly"""
+
+
+class NumpyMLP:
+    """A dense network as float32 weight arrays, evaluated with NumPy.
+
+    Each layer is ``activation(x @ W + b)``. ``predict`` returns an
+    (n_rows, n_outputs) array like ``keras.Model.predict``, so the ensemble
+    treats it the same way, but needs no TensorFlow at load or predict time.
+    """
+
+    def __init__(self, layers: List[Tuple[np.ndarray, np.ndarray, str]], source: str = None):
+        for _, _, activation in layers:
+            if activation not in ACTIVATIONS:
+                raise MLPExportError(f"Unsupported activation '{activation}'")
+        self.layers = [
+            (np.ascontiguousarray(W, dtype=np.float32), np.asarray(b, dtype=np.float32), activation)
+            for W, b, activation in layers
+        ]
+        self.source = source
+
+    @property
+    def n_features(self) -> int:
+        return self.layers[0][0].shape[0]
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        h = np.asarray(X, dtype=np.float32)
+        if h.ndim != 2 or h.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got shape {h.shape}")
+        for W, b, activation in self.layers:
+            h = h @ W
+            h += b
+            h = ACTIVATIONS[activation](h)
+        return h
+
+    def __repr__(self) -> str:
+        shape = " -> ".join([str(self.n_features)] + [str(W.shape[1]) for W, _, _ in self.layers])
+        return f"NumpyMLP({self.source}, {shape})"
+
+
+def is_keras_model(model: Any) -> bool:
+    """True for Keras models, checked without importing TensorFlow"""
+    return type(model).__module__.split(".")[0] in ("keras", "tensorflow", "tf_keras")
+
+
+def _batch_norm_affine(layer) -> Tuple[np.ndarray, np.ndarray]:
+    """Inference-time BatchNormalization as ``x * scale + shift`` (float64)"""
+    config = layer.get_config()
+    axis = config.get("axis", -1)
+    if axis not in (-1, [-1], (-1,), 1, [1], (1,)):
+        raise MLPExportError(f"BatchNormalization over axis {axis} is not supported")
+    weights = [w.astype(np.float64) for w in layer.get_weights()]
+    gamma = weights.pop(0) if config.get("scale", True) else None
+    beta = weights.pop(0) if config.get("center", True) else None
+    mean, variance = weights
+    scale = 1.0 / np.sqrt(variance + layer.epsilon)
+    if gamma is not None:
+        scale = scale * gamma
+    shift = -mean * scale
+    if beta is not None:
+        shift = shift + beta
+    return scale, shift
+
+
+def export_keras_mlp(model) -> NumpyMLP:
+    """Fold a Sequential Dense/BatchNormalization/Dropout network into a ``NumpyMLP``.
+
+    Dropout is dropped. A BatchNormalization layer is an affine map per unit,
+    so it is folded into the next Dense layer's weights; after the last Dense
+    layer it is folded into that layer when its activation is linear and kept
+    as a diagonal layer otherwise. Folding is done in float64 and the result
+    stored as float32, so outputs match Keras to float32 rounding.
+    """
+    layers = []
+    pending = None  # (scale, shift) of BatchNormalization not yet folded
+
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind in INFERENCE_NOOP_LAYERS:
+            continue
+        if kind == "BatchNormalization":
+            scale, shift = _batch_norm_affine(layer)
+            if pending is not None:
+                scale, shift = pending[0] * scale, pending[1] * scale + shift
+            pending = (scale, shift)
+        elif kind == "Dense":
+            config = layer.get_config()
+            weights = [w.astype(np.float64) for w in layer.get_weights()]
+            W = weights[0]
+            b = weights[1] if config.get("use_bias", True) else np.zeros(W.shape[1])
+            if pending is not None:
+                # (x * scale + shift) @ W + b == x @ (scale[:, None] * W) + (shift @ W + b)
+                b = pending[1] @ W + b
+                W = pending[0][:, None] * W
+                pending = None
+            layers.append([W, b, config.get("activation", "linear")])
+        elif kind == "Activation" and layers and layers[-1][2] == "linear" and pending is None:
+            layers[-1][2] = layer.get_config()["activation"]
+        else:
+            raise MLPExportError(f"Cannot export {kind} layer '{layer.name}'")
+
+    if not layers:
+        raise MLPExportError("Model has no Dense layers")
+    if pending is not None:
+        if layers[-1][2] == "linear":
+            W, b, _ = layers[-1]
+            layers[-1] = [W * pending[0], b * pending[0] + pending[1], "linear"]
+        else:
+            layers.append([np.diag(pending[0]), pending[1], "linear"])
+
+    return NumpyMLP([tuple(layer) for layer in layers], source=type(model).__name__)
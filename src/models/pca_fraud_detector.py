@@ -1,10 +1,26 @@
 import joblib
+import time
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from config.settings import settings
+from src.monitoring.metrics import STAGE_LATENCY
 from sklearn.model_selection import train_test_split
-from typing import Tuple
+from typing import Callable, Iterable, List, Tuple, Union
+
+# Share of rows held out for validation
+VALIDATION_FRACTION = 0.2
+
+
+def validation_rows(chunk: pd.DataFrame, fraction: float = VALIDATION_FRACTION) -> np.ndarray:
+    """Boolean mask of the rows held out for validation, chosen by a hash of each row's values.
+
+    The choice does not depend on the row's position, so every pass over a
+    file, in any chunk size, holds out the same rows.
+    """
+    hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+    return hashes % 10_000 < int(fraction * 10_000)
+
 
 class PCAFraudDetector:
     def __init__(self):
@@ -25,8 +41,7 @@ class PCAFraudDetector:
         self.feature_names_in_ = list(X.columns)
         
         # 2. Fit PCA transformer
-        self.pca_transformer = PCATransformer()
-        self.pca_transformer.fit(X_train)
+        self.pca_transformer = PCATransformer().fit(X_train)
         X_train_pca = self.pca_transformer.transform(X_train)
         X_val_pca = self.pca_transformer.transform(X_val)
         
@@ -34,40 +49,120 @@ class PCAFraudDetector:
         self.model = FraudDetectionModel()
         self.model.train_ensemble(X_train_pca, y_train, X_val_pca, y_val)
 
+    def fit_streaming(self, source: Union[str, Path, Callable[[], Iterable[pd.DataFrame]]],
+                      chunksize: int = None):
+        """Train like ``fit`` without loading the raw data, one chunk of rows at a time.
+
+        ``source`` is as for ``PCATransformer.fit_streaming`` and is read three
+        times. The rows picked by ``validation_rows`` are held out: the PCA
+        transformer is fitted out of core on the others, then every chunk is
+        reduced to its components. Only those components (float32, one row
+        per transaction) and the labels are kept in memory for the ensemble,
+        whose members train on in-memory arrays.
+        """
+        from src.features.pca_transformer import PCATransformer
+        from src.models.model import FraudDetectionModel
+        
+        chunksize = chunksize or settings.PCA_FIT_CHUNKSIZE
+        if callable(source):
+            chunks = source
+        else:
+            def chunks():
+                return pd.read_csv(source, chunksize=chunksize)
+        
+        self.pca_transformer = PCATransformer().fit_streaming(
+            chunks, chunksize=chunksize, rows=lambda chunk: ~validation_rows(chunk)
+        )
+        
+        parts = {True: ([], []), False: ([], [])}
+        for chunk in chunks():
+            held_out = validation_rows(chunk)
+            X = chunk.drop('is_fraud', axis=1)
+            if not hasattr(self, 'feature_names_in_'):
+                self.feature_names_in_ = list(X.columns)
+            components = self.pca_transformer.transform(X).to_numpy(dtype=np.float32)
+            for is_val in (False, True):
+                parts[is_val][0].append(components[held_out == is_val])
+                parts[is_val][1].append(chunk['is_fraud'].to_numpy()[held_out == is_val])
+        
+        names = self.pca_transformer.feature_names
+        X_train_pca, X_val_pca = (pd.DataFrame(np.vstack(parts[v][0]), columns=names) for v in (False, True))
+        y_train, y_val = (pd.Series(np.concatenate(parts[v][1]), name='is_fraud') for v in (False, True))
+        
+        self.model = FraudDetectionModel()
+        self.model.train_ensemble(X_train_pca, y_train, X_val_pca, y_val)
+        return self
+
     def predict(self, raw_data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
-        """Make predictions on new data"""
+        """Make predictions on new data (a convenience layer over ``predict_encoded``)"""
         if not self.pca_transformer or not self.model:
             raise ValueError("Model not trained. Call fit() first.")
-            
-        # Ensure columns match training data
-        raw_data = raw_data[self.feature_names_in_]
         
-        # Transform and predict
-        pca_features = self.pca_transformer.transform(raw_data)
-        pred_class = self.model.predict(pca_features)
-        pred_proba = self.model.predict_proba(pca_features)[:, 1]
+        # Only the columns the transformer uses are read from the frame
+        return self.predict_encoded(self.pca_transformer.encode(raw_data))
+
+    def score_encoded(self, X: np.ndarray, out: np.ndarray = None, members: List[str] = None,
+                      components_out: np.ndarray = None) -> np.ndarray:
+        """Fraud probabilities of encoded rows as float32, without creating pandas objects.
+
+        ``out`` (float32, n_rows) receives the probabilities and
+        ``components_out`` (float32, n_rows x n_components) the intermediate
+        PCA components, so a caller can reuse both buffers across calls.
+        """
+        if not self.pca_transformer or not self.model:
+            raise ValueError("Model not trained. Call fit() first.")
         
-        return pred_class, pred_proba
+        start = time.perf_counter()
+        pca_features = self.pca_transformer.transform_encoded(X, out=components_out)
+        STAGE_LATENCY.observe_since(start, "pca_transform")
+        return self.model.score(pca_features, out=out, members=members)
+
+    def predict_encoded(self, X: np.ndarray, members: List[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Make predictions on rows already encoded by ``PCATransformer.transform_encoded`` rules.
 
-    def save(self):
+        ``members`` restricts scoring to those ensemble members (the degraded path).
+        """
+        pred_proba = self.score_encoded(X, members=members)
+        return (pred_proba > settings.THRESHOLD).astype(int), pred_proba
+
+    def save(self, model_path: str = None):
         """Save both components to disk"""
         if not self.pca_transformer or not self.model:
             raise ValueError("Model not trained. Call fit() first.")
+        if model_path is None:
+            model_path = settings.PCA_DETECTOR_PATH
             
         settings.MODEL_DIR.mkdir(exist_ok=True)
         joblib.dump({
             'pca_transformer': self.pca_transformer,
             'model': self.model,
             'feature_names_in_': self.feature_names_in_
-        }, settings.MODEL_DIR / "pca_fraud_detector.joblib")
+        }, model_path)
+
+    def export_for_serving(self) -> 'PCAFraudDetector':
+        """Copy whose ensemble needs no TensorFlow (see ``FraudDetectionModel.export_for_serving``)"""
+        exported = PCAFraudDetector()
+        exported.pca_transformer = self.pca_transformer
+        exported.model = self.model.export_for_serving()
+        exported.feature_names_in_ = self.feature_names_in_
+        return exported
 
     @classmethod
-    def load(self, model_path: str):
+    def load(cls, model_path: str = None) -> 'PCAFraudDetector':
         """Load the trained PCA transformer and model"""
-        import joblib
+        if model_path is None:
+            model_path = settings.PCA_DETECTOR_PATH
         try:
             data = joblib.load(model_path)
-            self.pca_transformer = data['pca_transformer']
-            self.model = data['model']
         except Exception as e:
-            raise RuntimeError(f"Failed to load model from {model_path}: {str(e)}")
\ No newline at end of file
+            raise RuntimeError(f"Failed to load model from {model_path}: {str(e)}")
+        
+        detector = cls()
+        detector.pca_transformer = data['pca_transformer']
+        if settings.COMPILE_PCA_TRANSFORM:
+            detector.pca_transformer.compile()
+        detector.model = data['model']
+        detector.model.compile_members()
+        detector.model.apply_thread_budgets()
+        detector.feature_names_in_ = data['feature_names_in_']
+        return detector
\ No newline at end of file
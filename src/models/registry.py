@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Tuple
+from config.settings import settings
+
+# Artifacts used when a model has never been published to the registry
+LEGACY_PATHS = {
+    "fraud_model": settings.MODEL_PATH,
+    "pca_detector": settings.PCA_DETECTOR_PATH,
+}
+
+CURRENT_FILE = "CURRENT"
+
+
+class ModelRegistry:
+    """Versioned model artifacts on disk.
+
+    Layout under ``settings.MODEL_REGISTRY_DIR``::
+
+        <name>/<version>/model.<ext>   one immutable artifact per version
+        <name>/CURRENT                 the version that should be served
+
+    Versions are published by copying into a temporary directory and renaming
+    it into place, and ``CURRENT`` is replaced atomically, so a reader never
+    sees a half-written artifact.
+    """
+
+    def __init__(self, root: Path = None):
+        self.root = Path(root or settings.MODEL_REGISTRY_DIR)
+
+    def _model_dir(self, name: str) -> Path:
+        # Names come from URLs, so anything but a plain directory name is refused
+        if not name or Path(name).name != name or name.startswith("."):
+            raise ValueError(f"Invalid model name '{name}'")
+        return self.root / name
+
+    def versions(self, name: str) -> List[str]:
+        """Published versions of ``name``, oldest first"""
+        model_dir = self._model_dir(name)
+        if not model_dir.is_dir():
+            return []
+        return sorted(
+            entry.name for entry in model_dir.iterdir()
+            if entry.is_dir() and not entry.name.startswith(".")
+        )
+
+    def current_version(self, name: str) -> Optional[str]:
+        """Version named by CURRENT, or None if no version was ever activated.
+
+        Published but unactivated versions are never served by default.
+        """
+        try:
+            version = (self._model_dir(name) / CURRENT_FILE).read_text().strip()
+        except FileNotFoundError:
+            return None
+        return version or None
+
+    def path(self, name: str, version: str) -> Path:
+        """Artifact file of one published version.
+
+        ``version`` must be one of ``versions(name)``, so it cannot reach
+        outside the model's directory.
+        """
+        if version not in self.versions(name):
+            raise FileNotFoundError(f"Model '{name}' has no published version '{version}'")
+        version_dir = self._model_dir(name) / version
+        artifacts = sorted(version_dir.glob("model.*"))
+        if not artifacts:
+            raise FileNotFoundError(f"No artifact for {name} version {version} in {version_dir}")
+        return artifacts[0]
+
+    def resolve(self, name: str, version: str = None) -> Tuple[str, Path]:
+        """(version, artifact path) to serve, falling back to the legacy artifact"""
+        version = version or self.current_version(name)
+        if version is not None:
+            return version, self.path(name, version)
+        if name not in LEGACY_PATHS:
+            raise FileNotFoundError(f"Model '{name}' has no activated version")
+        path = Path(LEGACY_PATHS[name])
+        stat = path.stat()
+        return f"legacy-{stat.st_mtime_ns:x}-{stat.st_size:x}", path
+
+    def publish(self, name: str, artifact: Path, version: str = None, activate: bool = True) -> str:
+        """Copy ``artifact`` in as a new version and optionally make it current"""
+        artifact = Path(artifact)
+        version = version or datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+        model_dir = self._model_dir(name)
+        if Path(version).name != version or version.startswith("."):
+            raise ValueError(f"Invalid version '{version}'")
+        target = model_dir / version
+        if target.exists():
+            raise FileExistsError(f"{name} version {version} already exists")
+
+        model_dir.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".publish-", dir=model_dir))
+        try:
+            shutil.copy2(artifact, staging / f"model{artifact.suffix}")
+            os.rename(staging, target)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(name, version)
+        return version
+
+    def activate(self, name: str, version: str) -> None:
+        """Point CURRENT at ``version``"""
+        self.path(name, version)  # Refuse versions that do not exist
+        model_dir = self._model_dir(name)
+        fd, tmp = tempfile.mkstemp(prefix=".current-", dir=model_dir)
+        with os.fdopen(fd, "w") as f:
+            f.write(version + "\n")
+        os.replace(tmp, model_dir / CURRENT_FILE)
+
+
+class VersionedLoader:
+    """Picklable zero-argument loader pinned to one artifact version"""
+
+    def __init__(self, load_fn: Callable[[Path], Any], path: Path, version: str):
+        self.load_fn = load_fn
+        self.path = path
+        self.version = version
+
+    def __call__(self) -> Any:
+        return self.load_fn(self.path)
+
+    def __repr__(self) -> str:
+        return f"VersionedLoader({self.path}, version={self.version})"
+
+
+registry = ModelRegistry()
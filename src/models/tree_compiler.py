@@ -0,0 +1,304 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+import numpy as np
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TreeCompileError(ValueError):
+    """Raised for a tree model the compiler cannot represent exactly"""
+
+
+def _floor_float32(thresholds: np.ndarray) -> np.ndarray:
+    """Largest float32 <= each threshold.
+
+    For float32 inputs ``x <= t`` then gives the same answer as comparing
+    against the original float64 threshold.
+    """
+    t32 = thresholds.astype(np.float32)
+    above = t32.astype(np.float64) > thresholds
+    t32[above] = np.nextafter(t32[above], np.float32(-np.inf))
+    return t32
+
+
+class CompiledTrees:
+    """A tree ensemble flattened into struct-of-arrays node tables.
+
+    All trees share one set of arrays, indexed by global node id: split
+    feature (-1 at leaves), float32 threshold, left/right child, the branch
+    taken by missing values, and the float32 leaf value. Every split is
+    normalised to ``x <= threshold`` goes left, and leaves point at
+    themselves so a batch can step all trees together for ``max_depth``
+    rounds. Inputs are cast to float32, as scikit-learn and XGBoost do, so
+    decisions match the original libraries exactly. Outputs differ only by
+    float rounding in the final sum.
+
+    ``aggregation`` is ``"mean"`` (random forest probabilities) or
+    ``"logistic"`` (boosted margins plus ``base_margin``, through a sigmoid).
+    """
+
+    def __init__(self, trees: List[Dict[str, np.ndarray]], aggregation: str,
+                 n_features: int, base_margin: float = 0.0, scale: float = 1.0, source: str = None):
+        offsets = np.cumsum([0] + [len(t["feature"]) for t in trees])[:-1]
+        self.roots = offsets.astype(np.int32)
+        self.feature = np.concatenate([t["feature"] for t in trees]).astype(np.int32)
+        self.threshold = np.concatenate([t["threshold"] for t in trees]).astype(np.float32)
+        self.left = np.concatenate([t["left"] + o for t, o in zip(trees, offsets)]).astype(np.int32)
+        self.right = np.concatenate([t["right"] + o for t, o in zip(trees, offsets)]).astype(np.int32)
+        self.default_left = np.concatenate([t["default_left"] for t in trees]).astype(bool)
+        self.value = np.concatenate([t["value"] for t in trees]).astype(np.float32)
+        self.max_depth = max(int(t["depth"]) for t in trees)
+        self.aggregation = aggregation
+        self.n_features = n_features
+        self.base_margin = base_margin
+        self.scale = scale
+        self.source = source
+
+        # Leaves loop back to themselves
+        leaves = self.feature < 0
+        node_ids = np.arange(len(self.feature), dtype=np.int32)
+        self.left[leaves] = node_ids[leaves]
+        self.right[leaves] = node_ids[leaves]
+        # Interleaved (left, right) pairs: one gather picks the next node
+        self._children = np.column_stack([self.left, self.right]).ravel()
+        self._numba_leaves = None
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    def leaves(self, X: np.ndarray) -> np.ndarray:
+        """Leaf node id reached in every tree, shape (n_rows, n_trees)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got shape {X.shape}")
+        if settings.TREE_ENGINE == "numba":
+            leaves = self._get_numba_leaves()
+            if leaves is not None:
+                out = np.empty((X.shape[0], self.n_trees), dtype=np.int32)
+                leaves(X, self.roots, self.feature, self.threshold, self.left, self.right, self.default_left, out)
+                return out
+
+        # One flat (row, tree) path per element; finished paths are dropped
+        # once they are the majority, so deep forests stop paying for them
+        n_paths = X.shape[0] * self.n_trees
+        X_flat = X.ravel()
+        nodes = np.tile(self.roots, X.shape[0])
+        offsets = np.repeat(np.arange(X.shape[0], dtype=np.int64) * self.n_features, self.n_trees)
+        positions = np.arange(n_paths)
+        out = np.empty(n_paths, dtype=np.int32)
+        has_missing = np.isnan(X_flat).any()
+        for _ in range(self.max_depth):
+            feature = self.feature.take(nodes)
+            internal = feature >= 0
+            n_internal = np.count_nonzero(internal)
+            if n_internal == 0:
+                break
+            if n_internal <= len(nodes) // 2:
+                out[positions[~internal]] = nodes[~internal]
+                nodes, offsets, positions, feature = (
+                    nodes[internal], offsets[internal], positions[internal], feature[internal]
+                )
+            x = X_flat.take(offsets + feature)
+            go_left = x <= self.threshold.take(nodes)
+            if has_missing:
+                go_left |= np.isnan(x) & self.default_left.take(nodes)
+            nodes = self._children.take(2 * nodes + ~go_left)
+        out[positions] = nodes
+        return out.reshape(X.shape[0], self.n_trees)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities, shape (n_rows, 2), like the library's ``predict_proba``"""
+        values = self.value[self.leaves(X)].astype(np.float64)
+        if self.aggregation == "mean":
+            proba = values.mean(axis=1)
+        else:
+            margin = self.base_margin + values.sum(axis=1)
+            proba = 1.0 / (1.0 + np.exp(-self.scale * margin))
+        return np.column_stack([1.0 - proba, proba])
+
+    def _get_numba_leaves(self):
+        if self._numba_leaves is None:
+            try:
+                self._numba_leaves = _compile_numba_leaves()
+            except ImportError:
+                logger.warning("TREE_ENGINE=numba but numba is not installed; using NumPy")
+                self._numba_leaves = False
+        return self._numba_leaves or None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_numba_leaves"] = None  # Jitted functions are rebuilt in each process
+        return state
+
+    def __repr__(self) -> str:
+        return (
+            f"CompiledTrees({self.source}, trees={self.n_trees}, nodes={self.n_nodes}, "
+            f"max_depth={self.max_depth}, aggregation={self.aggregation})"
+        )
+
+
+def _compile_numba_leaves():
+    import numba
+
+    @numba.njit(nogil=True)
+    def leaves(X, roots, feature, threshold, left, right, default_left, out):
+        for i in range(X.shape[0]):
+            for t in range(roots.shape[0]):
+                node = roots[t]
+                while feature[node] >= 0:
+                    x = X[i, feature[node]]
+                    if np.isnan(x):
+                        go_left = default_left[node]
+                    else:
+                        go_left = x <= threshold[node]
+                    node = left[node] if go_left else right[node]
+                out[i, t] = node
+
+    return leaves
+
+
+def compile_sklearn_forest(forest) -> CompiledTrees:
+    """Compile a fitted binary ``RandomForestClassifier`` (or other sklearn forest)"""
+    if len(forest.classes_) != 2:
+        raise TreeCompileError("Only binary classifiers are supported")
+    trees = []
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        leaf = tree.children_left < 0
+        value = tree.value[:, 0, :].astype(np.float64)
+        proba = value[:, 1] / value.sum(axis=1)
+        missing_left = getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=np.uint8))
+        trees.append({
+            "feature": np.where(leaf, -1, tree.feature),
+            "threshold": _floor_float32(tree.threshold),
+            "left": np.where(leaf, 0, tree.children_left),
+            "right": np.where(leaf, 0, tree.children_right),
+            "default_left": missing_left.astype(bool),
+            "value": np.where(leaf, proba, 0.0),
+            "depth": tree.max_depth,
+        })
+    return CompiledTrees(trees, "mean", forest.n_features_in_, source=type(forest).__name__)
+
+
+def compile_xgboost(model) -> CompiledTrees:
+    """Compile a fitted binary:logistic ``XGBClassifier``"""
+    booster = model.get_booster()
+    config = json.loads(booster.save_config())
+    objective = config["learner"]["objective"]["name"]
+    if objective != "binary:logistic":
+        raise TreeCompileError(f"Unsupported XGBoost objective '{objective}'")
+    base_score = float(config["learner"]["learner_model_param"]["base_score"].strip("[]"))
+    feature_index = {name: i for i, name in enumerate(booster.feature_names or [])}
+
+    def index_of(split: str) -> int:
+        return feature_index[split] if split in feature_index else int(split.lstrip("f"))
+
+    trees = []
+    for dump in booster.get_dump(dump_format="json"):
+        nodes = {}
+        stack = [(json.loads(dump), 0)]
+        depth = 0
+        while stack:
+            node, node_depth = stack.pop()
+            nodes[node["nodeid"]] = node
+            depth = max(depth, node_depth)
+            stack.extend((child, node_depth + 1) for child in node.get("children", []))
+
+        n_nodes = max(nodes) + 1
+        tree = {
+            "feature": np.full(n_nodes, -1, dtype=np.int32),
+            "threshold": np.zeros(n_nodes, dtype=np.float32),
+            "left": np.zeros(n_nodes, dtype=np.int32),
+            "right": np.zeros(n_nodes, dtype=np.int32),
+            "default_left": np.zeros(n_nodes, dtype=bool),
+            "value": np.zeros(n_nodes, dtype=np.float32),
+            "depth": depth,
+        }
+        for node_id, node in nodes.items():
+            if "leaf" in node:
+                tree["value"][node_id] = np.float32(node["leaf"])
+                continue
+            # XGBoost sends x < t left; for float32 x that is x <= the next float32 below t
+            threshold = np.float32(node["split_condition"])
+            tree["feature"][node_id] = index_of(node["split"])
+            tree["threshold"][node_id] = np.nextafter(threshold, np.float32(-np.inf))
+            tree["left"][node_id] = node["yes"]
+            tree["right"][node_id] = node["no"]
+            tree["default_left"][node_id] = node["missing"] == node["yes"]
+        trees.append(tree)
+
+    base_margin = float(np.log(base_score / (1.0 - base_score)))
+    return CompiledTrees(trees, "logistic", model.n_features_in_, base_margin=base_margin, source="XGBClassifier")
+
+
+def compile_lightgbm(model) -> CompiledTrees:
+    """Compile a fitted binary ``LGBMClassifier`` without categorical splits"""
+    dump = model.booster_.dump_model()
+    objective = dump["objective"].split()
+    if objective[0] != "binary" or dump["num_class"] != 1:
+        raise TreeCompileError(f"Unsupported LightGBM objective '{dump['objective']}'")
+    scale = 1.0
+    for option in objective[1:]:
+        if option.startswith("sigmoid:"):
+            scale = float(option.split(":", 1)[1])
+
+    trees = []
+    for info in dump["tree_info"]:
+        feature, threshold, left, right, default_left, value = [], [], [], [], [], []
+        depth = 0
+        # Node ids are assigned in visiting order; children are patched in afterwards
+        stack = [(info["tree_structure"], None, None, 0)]
+        while stack:
+            node, parent, is_left, node_depth = stack.pop()
+            node_id = len(feature)
+            depth = max(depth, node_depth)
+            if parent is not None:
+                (left if is_left else right)[parent] = node_id
+            left.append(0)
+            right.append(0)
+            if "leaf_value" in node or "split_feature" not in node:
+                feature.append(-1)
+                threshold.append(0.0)
+                default_left.append(False)
+                value.append(node.get("leaf_value", 0.0))
+                continue
+            if node["decision_type"] != "<=":
+                raise TreeCompileError("Categorical LightGBM splits are not supported")
+            if node["missing_type"] == "Zero":
+                raise TreeCompileError("LightGBM zero-as-missing splits are not supported")
+            feature.append(node["split_feature"])
+            threshold.append(node["threshold"])
+            # missing_type None scores NaN as 0.0
+            default_left.append(node["default_left"] if node["missing_type"] == "NaN" else 0.0 <= node["threshold"])
+            value.append(0.0)
+            stack.append((node["right_child"], node_id, False, node_depth + 1))
+            stack.append((node["left_child"], node_id, True, node_depth + 1))
+
+        trees.append({
+            "feature": np.array(feature, dtype=np.int32),
+            "threshold": _floor_float32(np.array(threshold, dtype=np.float64)),
+            "left": np.array(left, dtype=np.int32),
+            "right": np.array(right, dtype=np.int32),
+            "default_left": np.array(default_left, dtype=bool),
+            "value": np.array(value, dtype=np.float64),
+            "depth": depth,
+        })
+    return CompiledTrees(trees, "logistic", model.n_features_in_, scale=scale, source="LGBMClassifier")
+
+
+def compile_tree_model(model: Any) -> Optional[CompiledTrees]:
+    """Compiled form of a supported tree model, or None for anything else"""
+    if hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_"):
+        return compile_sklearn_forest(model)
+    if hasattr(model, "get_booster"):
+        return compile_xgboost(model)
+    if hasattr(model, "booster_") and hasattr(model.booster_, "dump_model"):
+        return compile_lightgbm(model)
+    return None
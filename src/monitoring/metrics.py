@@ -0,0 +1,220 @@
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Latency buckets in seconds, 100us to 2.5s
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+
+# Observations kept for ``MetricsRegistry.drain`` once recording is switched on
+_records: List[tuple] = None
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Fixed-bucket histogram, cheap enough to observe on every request.
+
+    An observation is one bisect plus three increments under an uncontended
+    lock. Buckets are stored per bucket and summed into Prometheus'
+    cumulative ``le`` form only when scraped.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        if _records is not None:
+            _records.append((self.name, labels, value))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def observe_since(self, start: float, *labels: str) -> None:
+        """Observe the seconds elapsed since a ``time.perf_counter()`` reading"""
+        self.observe(time.perf_counter() - start, *labels)
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(s[0]), s[1], s[2]) for labels, s in sorted(self._series.items())]
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic count per label set, incremented where the event happens"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        if _records is not None:
+            _records.append((self.name, labels, amount))
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for labels, value in snapshot:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {float(value)}")
+        return lines
+
+
+class Gauge:
+    """Value read at scrape time from a callback.
+
+    The callback returns either a number or an iterable of
+    ``(label values, number)`` pairs.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable,
+                 labelnames: Sequence[str] = (), kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        value = self.callback()
+        samples: Iterable = [((), value)] if not self.labelnames else value
+        for labels, sample in samples:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {float(sample)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, documentation, labelnames, buckets)
+        return self._metrics[name]
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        if name not in self._metrics:
+            self._metrics[name] = Counter(name, documentation, labelnames)
+        return self._metrics[name]
+
+    def gauge(self, name: str, documentation: str, callback: Callable,
+              labelnames: Sequence[str] = (), kind: str = "gauge") -> Gauge:
+        """Register (or replace) a callback gauge; ``kind="counter"`` for monotonic values"""
+        self._metrics[name] = Gauge(name, documentation, callback, labelnames, kind)
+        return self._metrics[name]
+
+    def record(self) -> None:
+        """Also keep every histogram observation and counter increment from now on.
+
+        Used in process-pool workers, whose metrics are never scraped: the
+        kept records go back to the parent with each result and are replayed
+        into its metrics there.
+        """
+        global _records
+        if _records is None:
+            _records = []
+
+    def drain(self) -> List[tuple]:
+        """Records kept since the last drain, as ``(name, labels, value)``"""
+        global _records
+        if _records is None:
+            return []
+        records, _records = _records, []
+        return records
+
+    def replay(self, records: Iterable[tuple]) -> None:
+        """Apply records drained in another process to the metrics here"""
+        for name, labels, value in records:
+            metric = self._metrics.get(name)
+            if isinstance(metric, Histogram):
+                metric.observe(value, *labels)
+            elif isinstance(metric, Counter):
+                metric.inc(*labels, amount=value)
+
+    def expose(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.expose())
+            except Exception:
+                # A broken callback must not take the whole scrape down
+                continue
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# Time spent in each stage of scoring one request
+STAGE_LATENCY = metrics.histogram(
+    "fraud_stage_latency_seconds",
+    "Latency of each scoring stage",
+    ["stage"]
+)
+
+# Time spent in each ensemble member, per scored batch
+MEMBER_LATENCY = metrics.histogram(
+    "fraud_member_latency_seconds",
+    "Latency of each ensemble member per predict call",
+    ["member"]
+)
+
+# Wall time of evaluating all requested members, sequentially or on the member pool
+ENSEMBLE_LATENCY = metrics.histogram(
+    "fraud_ensemble_latency_seconds",
+    "Latency of evaluating the ensemble members per predict call, by evaluation mode",
+    ["mode"]
+)
+
+# Rows leaving the cascaded ensemble after each stage
+CASCADE_EXITS = metrics.counter(
+    "fraud_cascade_exits_total",
+    "Rows scored by the cascade, by the member after which they exited",
+    ["stage"]
+)
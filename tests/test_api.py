@@ -0,0 +1,173 @@
+import asyncio
+import gzip
+import io
+import threading
+
+import numpy as np
+import pytest
+
+from src.api.columnar import (
+    BodyTooLargeError, ColumnarFormatError, CONTENT_TYPE_NPY, decompress, read_matrix
+)
+from starlette.requests import Request
+
+from src.api import admission, executor as executor_module, streaming
+from src.api.executor import DeadlineExceededError, InferenceExecutor, register_model
+
+
+def _npy(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=True)
+    return buffer.getvalue()
+
+
+def test_cancelled_call_stays_pending_until_its_work_finishes():
+    executor = InferenceExecutor(kind="thread", max_workers=1, max_queue=0)
+    started, release = threading.Event(), threading.Event()
+
+    def work():
+        started.set()
+        release.wait(5)
+
+    async def scenario():
+        task = asyncio.ensure_future(executor.run(work))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # The caller gave up but the worker thread is still busy
+        assert executor.pending == 1
+        release.set()
+        await asyncio.sleep(0.1)
+        assert executor.pending == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+class _Probe:
+    def predict(self, X):
+        return np.zeros(len(X)), np.zeros(len(X))
+
+
+@pytest.fixture
+def probe_executor(monkeypatch):
+    """A fresh thread executor, used by streaming and admission, with a dummy model"""
+    monkeypatch.setattr(executor_module, "_model_loaders", {})
+    monkeypatch.setattr(executor_module, "_models", {})
+    register_model("probe", _Probe, instance=_Probe())
+    executor = InferenceExecutor(kind="thread", max_workers=1, max_queue=4)
+    monkeypatch.setattr(streaming, "inference_executor", executor)
+    monkeypatch.setattr(admission, "inference_executor", executor)
+    yield executor
+    executor.shutdown()
+
+
+def test_stream_traffic_leaves_single_row_average_alone(probe_executor):
+    async def scenario():
+        await probe_executor.predict("probe", np.zeros((1, 3)))
+        single = probe_executor.service_time("probe.predict")
+        for _ in range(3):
+            await streaming._predict_with_backpressure("probe", np.zeros((500, 3)))
+        await probe_executor.predict("probe", np.zeros((1, 3)), record=False)
+        return single
+
+    single = asyncio.run(scenario())
+    assert probe_executor.service_time("probe.predict") == single
+    assert probe_executor.service_time("probe.stream") is not None
+    assert probe_executor.row_time("probe.stream") is not None
+
+
+def test_batch_admission_is_costed_per_row(probe_executor):
+    request = Request({"type": "http", "headers": [(b"x-request-deadline-ms", b"100")]})
+    # A 1000-row batch took 500 ms: 0.5 ms per row
+    probe_executor._record_service_time("probe.batch", 0.5, rows=1000)
+
+    assert not admission.admission_control.admit(request, "probe.batch", rows=10).degraded
+    with pytest.raises(DeadlineExceededError):
+        admission.admission_control.admit(request, "probe.batch", rows=1000)
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_decompress_round_trips_within_the_cap(encoding):
+    body = _npy(np.arange(12, dtype=np.float32).reshape(4, 3))
+    if encoding == "gzip":
+        compressed = gzip.compress(body) + gzip.compress(b"")
+    else:
+        zstandard = pytest.importorskip("zstandard")
+        compressed = zstandard.ZstdCompressor().compress(body)
+    assert decompress(compressed, encoding) == body
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_decompress_rejects_bombs(encoding):
+    payload = b"\0" * (50 * 1024 * 1024)
+    if encoding == "gzip":
+        compressed = gzip.compress(payload)
+    else:
+        zstandard = pytest.importorskip("zstandard")
+        # The frame declares its content size, which max_output_size alone does not cap
+        compressed = zstandard.ZstdCompressor(write_content_size=True).compress(payload)
+    with pytest.raises(BodyTooLargeError):
+        decompress(compressed, encoding)
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_decompress_rejects_truncated_bodies(encoding):
+    payload = np.random.default_rng(0).bytes(100_000)
+    if encoding == "gzip":
+        compressed = gzip.compress(payload)
+    else:
+        zstandard = pytest.importorskip("zstandard")
+        compressed = zstandard.ZstdCompressor().compress(payload)
+    with pytest.raises(ColumnarFormatError):
+        decompress(compressed[:-100], encoding)
+
+
+@pytest.mark.parametrize("array", [
+    np.array([["a", "b", "c"]], dtype="<U3"),
+    np.array([[1, "b", None]], dtype=object),
+    np.zeros((1, 3), dtype=[("x", "<f4")]),
+])
+def test_read_matrix_rejects_non_numeric_npy(array):
+    with pytest.raises(ColumnarFormatError):
+        read_matrix(_npy(array), CONTENT_TYPE_NPY, ["a", "b", "c"])
+
+
+def test_read_matrix_accepts_numeric_npy():
+    X = read_matrix(_npy(np.arange(6, dtype=np.int64).reshape(2, 3)), CONTENT_TYPE_NPY, ["a", "b", "c"])
+    assert X.dtype == np.float32 and X.tolist() == [[0, 1, 2], [3, 4, 5]]
+
+
+@pytest.fixture
+def api_client():
+    from fastapi.testclient import TestClient
+    from src.api.app import app
+
+    # No lifespan: these requests are rejected before any model is needed
+    return TestClient(app)
+
+
+def test_model_reload_requires_admin_token(api_client, monkeypatch):
+    from config.settings import settings
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+    assert api_client.post("/api/models/fraud_model/reload").status_code == 403
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    assert api_client.post("/api/models/fraud_model/reload").status_code == 401
+    response = api_client.post("/api/models/fraud_model/reload", headers={"X-Admin-Token": "wrong"})
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize("version", ["../../../../etc/passwd", "..", "never-published"])
+def test_model_reload_rejects_unpublished_versions(api_client, monkeypatch, version):
+    from config.settings import settings
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    response = api_client.post(
+        "/api/models/fraud_model/reload", params={"version": version}, headers={"X-Admin-Token": "secret"}
+    )
+    assert response.status_code == 404
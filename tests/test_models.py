@@ -0,0 +1,54 @@
+import pytest
+
+from src.models import registry as registry_module
+from src.models.registry import ModelRegistry
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    legacy = tmp_path / "legacy.joblib"
+    legacy.write_bytes(b"legacy")
+    monkeypatch.setitem(registry_module.LEGACY_PATHS, "fraud_model", legacy)
+    return ModelRegistry(tmp_path / "registry")
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / "model.joblib"
+    path.write_bytes(b"model")
+    return path
+
+
+def test_unactivated_version_is_not_served(registry, artifact):
+    registry.publish("fraud_model", artifact, "v1", activate=False)
+
+    assert registry.versions("fraud_model") == ["v1"]
+    assert registry.current_version("fraud_model") is None
+    version, path = registry.resolve("fraud_model")
+    assert version.startswith("legacy-") and path.name == "legacy.joblib"
+
+    registry.activate("fraud_model", "v1")
+    assert registry.resolve("fraud_model") == ("v1", registry.root / "fraud_model" / "v1" / "model.joblib")
+
+
+def test_publishing_without_activation_keeps_the_current_version(registry, artifact):
+    registry.publish("fraud_model", artifact, "v1")
+    registry.publish("fraud_model", artifact, "v2", activate=False)
+
+    assert registry.resolve("fraud_model")[0] == "v1"
+
+
+@pytest.mark.parametrize("version", ["../../etc", "..", "v1/../v1", "missing", ""])
+def test_only_published_versions_resolve(registry, artifact, version):
+    registry.publish("fraud_model", artifact, "v1")
+
+    with pytest.raises(FileNotFoundError):
+        registry.path("fraud_model", version)
+    with pytest.raises(FileNotFoundError):
+        registry.activate("fraud_model", version)
+
+
+@pytest.mark.parametrize("name", ["..", "../registry", "a/b", ".hidden"])
+def test_model_names_cannot_leave_the_registry(registry, name):
+    with pytest.raises(ValueError):
+        registry.versions(name)
@@ -0,0 +1,55 @@
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+STARTED = re.compile(r"worker 0 started \(pid (\d+)\)")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_worker(launcher: subprocess.Popen, timeout_s: float = 60) -> int:
+    """Pid of the next worker the launcher reports starting"""
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        line = launcher.stdout.readline()
+        if not line:
+            pytest.fail(f"launcher exited with {launcher.wait()} before starting a worker")
+        match = STARTED.search(line)
+        if match:
+            return int(match.group(1))
+    pytest.fail("no worker started in time")
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="the launcher forks its workers")
+def test_launcher_restarts_a_killed_worker():
+    env = dict(os.environ, PYTHONPATH=str(ROOT), WORKER_RESTART_BACKOFF_S="0.5")
+    launcher = subprocess.Popen(
+        [sys.executable, str(ROOT / "scripts" / "serve_model.py"), "--workers", "1", "--no-preload",
+         "--host", "127.0.0.1", "--port", str(_free_port()), "--report-interval", "0"],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env
+    )
+    try:
+        first = _wait_for_worker(launcher)
+        os.kill(first, signal.SIGKILL)
+        second = _wait_for_worker(launcher)
+        assert second != first
+        # With its only worker gone for the backoff, the launcher must have stayed up
+        assert launcher.poll() is None
+    finally:
+        launcher.send_signal(signal.SIGTERM)
+        try:
+            launcher.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            launcher.kill()